@@ -0,0 +1,37 @@
+"""
+Microbenchmark: lxml vs html.parser backends on stored Otomoto pages
+Run with: python benchmarks/bench_html_backends.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from html_dom import available_backends  # noqa: E402
+from otomoto_extractor import _from_html  # noqa: E402
+from otomoto_sync import parse_dealer_cards  # noqa: E402
+from benchmarks.bench_otomoto_extractor import load_fixture  # noqa: E402
+from benchmarks.timing import best_of  # noqa: E402
+
+CASES = (
+    ('offer_state.html', _from_html),
+    ('offer_legacy.html', _from_html),
+    ('dealer_page_1.html', parse_dealer_cards),
+)
+
+
+def main():
+    backends = available_backends()
+    for name, parse in CASES:
+        html = load_fixture(name)
+        results = {backend: parse(html, backend) for backend in backends}
+        identical = all(result == results[backends[-1]] for result in results.values())
+        timings = {backend: best_of(lambda: parse(html, backend)) for backend in backends}
+        line = "  ".join(f"{backend} {t * 1e3:7.2f} ms" for backend, t in timings.items())
+        if 'lxml' in timings:
+            line += f"  ({timings['html.parser'] / timings['lxml']:.1f}x)"
+        print(f"{name:19} {parse.__name__:18} {line}  identical={identical}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Microbenchmark: compact and card listing views vs the original map_bus_db_to_listing
+Run with: python benchmarks/bench_listing_mapping.py
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.timing import best_of  # noqa: E402
+from listing_mapping import CARD_COLUMNS, map_buses_db_to_listings  # noqa: E402
+
+
+def legacy_map_bus_db_to_listing(bus_data: dict) -> dict:
+    """Map database fields to new listing model while preserving legacy frontend keys"""
+    result = dict(bus_data)
+
+    result['cenaBrutto'] = bus_data.get('cenaBrutto') or bus_data.get('price_pln')
+    result['rok'] = bus_data.get('rok') or bus_data.get('production_year')
+    result['przebieg'] = bus_data.get('przebieg') or bus_data.get('mileage_km')
+    result['marka'] = bus_data.get('marka') or bus_data.get('make')
+    result['paliwo'] = bus_data.get('paliwo') or bus_data.get('fuel_type')
+    result['skrzynia'] = bus_data.get('skrzynia') or bus_data.get('gearbox')
+    result['moc'] = bus_data.get('moc') or bus_data.get('power_hp')
+    result['kubatura'] = bus_data.get('kubatura') or bus_data.get('engine_displacement_cc')
+    result['typNadwozia'] = bus_data.get('typNadwozia') or bus_data.get('body_type')
+    result['opis'] = bus_data.get('opis') or bus_data.get('description_html')
+
+    result['zdjecia'] = bus_data.get('zdjecia') or []
+    result['wyposazenie'] = bus_data.get('wyposazenie') or {}
+
+    result['title'] = bus_data.get('title') or f"{result.get('marka', '')} {bus_data.get('model', '')}".strip()
+    result['price_pln'] = result['cenaBrutto']
+    result['make'] = result['marka']
+    result['production_year'] = result['rok']
+    result['mileage_km'] = result['przebieg']
+    result['fuel_type'] = result['paliwo']
+    result['gearbox'] = result['skrzynia']
+    result['power_hp'] = result['moc']
+    result['engine_displacement_cc'] = result['kubatura']
+    result['body_type'] = result['typNadwozia']
+    result['description_html'] = result['opis']
+
+    result['color'] = bus_data.get('kolor') or bus_data.get('color')
+    result['seats'] = bus_data.get('liczbaMiejsc') or bus_data.get('seats')
+    result['gvw_kg'] = bus_data.get('dmc') or bus_data.get('gvw_kg')
+    result['origin_country'] = bus_data.get('krajPochodzenia') or bus_data.get('origin_country')
+    result['condition_status'] = bus_data.get('stan') or bus_data.get('condition_status') or 'Używany'
+
+    is_sold = bus_data.get("sold") or bus_data.get("gwarancja") or (bus_data.get("status") == "sprzedane") or False
+    is_reserved = bus_data.get("reserved") or bus_data.get("hak") or False
+
+    result["sold"] = is_sold
+    result["isSold"] = is_sold
+    result["reserved"] = is_reserved
+    result["isReserved"] = is_reserved
+
+    # DODANE MAPOWANIE YOUTUBE DO FRONTENDU
+    yt_link = bus_data.get('youtube_url') or bus_data.get('youtubeUrl') or bus_data.get('video')
+    result['video'] = yt_link
+    result['youtube_url'] = yt_link
+    result['youtubeUrl'] = yt_link
+
+    return result
+
+
+def sample_rows(count: int = 200) -> list:
+    """Rows shaped like the `buses` table, including a long HTML description"""
+    base = {
+        'marka': 'Renault', 'model': 'Master', 'rok': 2019, 'przebieg': 185000,
+        'cenaBrutto': 65900, 'paliwo': 'Diesel', 'skrzynia': 'Manualna',
+        'typNadwozia': 'Furgon (blaszak)', 'moc': 130, 'kubatura': 2298, 'kolor': 'Biały',
+        'opis': '<p>Bus w bardzo dobrym stanie technicznym.</p>' * 40,
+        'zdjecia': [f'https://example.com/buses/{i}.jpg' for i in range(10)],
+        'zdjecieGlowne': 'https://example.com/buses/0.jpg',
+        'wyrozniowane': True, 'nowosc': False, 'flotowy': False,
+        'sold': False, 'gwarancja': False, 'reserved': False, 'hak': False,
+        'status': 'aktywne', 'miasto': 'Smyków', 'vin': 'WF0XXXTTGXKY12345',
+        'youtube_url': None, 'normaEmisji': 'Euro 6', 'dmcKategoria': 'do 3.5t',
+        'ladownosc': 1000, 'vat': True, 'naped': 'Renault Master L3H2',
+        'numerOgloszenia': 'FKBUS123456', 'dataPublikacji': '2025-01-01T10:00:00',
+    }
+    return [dict(base, id=f'bus-{i}', przebieg=100000 + i) for i in range(count)]
+
+
+def main():
+    rows = sample_rows()
+
+    card_rows = [{c: r.get(c) for c in CARD_COLUMNS} for r in rows]
+
+    legacy = best_of(lambda: [legacy_map_bus_db_to_listing(r) for r in rows], number=10, repeat=50)
+    compact = best_of(lambda: map_buses_db_to_listings(rows, compact=True), number=10, repeat=50)
+    card = best_of(lambda: map_buses_db_to_listings(card_rows, view='card'), number=10, repeat=50)
+
+    per_row = 1e6 / len(rows)
+    print(f"full     {legacy * per_row:6.2f} us/row")
+    print(f"compact  {compact * per_row:6.2f} us/row  ({legacy / compact:.2f}x)")
+    print(f"card     {card * per_row:6.2f} us/row  ({legacy / card:.2f}x)")
+
+    full_bytes = len(json.dumps(map_buses_db_to_listings(rows), ensure_ascii=False))
+    for name, listings in (('compact', map_buses_db_to_listings(rows, compact=True)),
+                           ('card', map_buses_db_to_listings(card_rows, view='card'))):
+        size = len(json.dumps(listings, ensure_ascii=False))
+        print(f"payload  {name:8} {size} B of {full_bytes} B ({size / full_bytes:.0%})")
+
+
+if __name__ == '__main__':
+    main()
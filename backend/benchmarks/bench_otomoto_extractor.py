@@ -0,0 +1,223 @@
+"""
+Microbenchmarks: shared Otomoto extractor vs the original scrape endpoint parsing,
+and the combined regex pass vs per-field regex lookups
+Run with: python benchmarks/bench_otomoto_extractor.py
+"""
+import json
+import re
+import sys
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.timing import best_of  # noqa: E402
+from otomoto_extractor import FIELDS, extract_offer, offer_form_data, scan_parameters  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'otomoto'
+
+
+def load_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding='utf-8')
+
+
+def legacy_extract_oto_value(html, key, label):
+    """Original per-field lookup: four patterns built and run on every call"""
+    m = re.search(r'"key"[\s:]*"' + key + r'"[^}]*?"displayValue"[\s:]*"([^"]+)"', html)
+    if m:
+        return m.group(1)
+    m = re.search(r'"key"[\s:]*"' + key + r'"[^}]*?"value"[\s:]*"([^"]+)"', html)
+    if m:
+        return m.group(1)
+    m = re.search(r'"label"[\s:]*"' + label + r'"[^}]*?"value"[\s:]*"([^"]+)"', html)
+    if m:
+        return m.group(1)
+    m2 = re.search(label + r'[^>]*?>([a-zA-Z0-9\sęóąśłżźćńĘÓĄŚŁŻŹĆŃ]+)<', html)
+    if m2:
+        val = m2.group(1).strip()
+        if len(val) < 40 and val != label:
+            return val
+    return None
+
+
+def legacy_scan_parameters(html: str) -> dict:
+    return {field: legacy_extract_oto_value(html, key, label) for field, key, label in FIELDS}
+
+
+def legacy_scrape_offer(html: str) -> dict:
+    """Extraction part of the original scrape_otomoto_endpoint"""
+    soup = BeautifulSoup(html, "html.parser")
+    data = {}
+
+    def extract_value(key, label):
+        m = re.search(r'"key"[\s:]*"' + key + r'"[^}]*?"displayValue"[\s:]*"([^"]+)"', html)
+        if m:
+            return m.group(1)
+        m = re.search(r'"key"[\s:]*"' + key + r'"[^}]*?"value"[\s:]*"([^"]+)"', html)
+        if m:
+            return m.group(1)
+        m = re.search(r'"label"[\s:]*"' + label + r'"[^}]*?"value"[\s:]*"([^"]+)"', html)
+        if m:
+            return m.group(1)
+        m2 = re.search(label + r'[^>]*?>([a-zA-Z0-9\sęóąśłżźćńĘÓĄŚŁŻŹĆŃ]+)<', html)
+        if m2:
+            val = m2.group(1).strip()
+            if len(val) < 40 and val != label:
+                return val
+        return None
+
+    data["rok"] = extract_value("year", "Rok produkcji")
+    data["przebieg"] = extract_value("mileage", "Przebieg")
+    data["moc"] = extract_value("engine_power", "Moc")
+    data["kubatura"] = extract_value("engine_capacity", "Pojemność skokowa")
+    data["vin"] = extract_value("vin", "VIN")
+    
+    if data.get("vin") and ("Zgadzam" in str(data["vin"]) or len(str(data["vin"])) > 20):
+        data["vin"] = ""
+        
+    for div in soup.find_all('div', attrs={"data-testid": "advert-details-item"}):
+        p_tags = div.find_all('p')
+        if len(p_tags) >= 2 and "VIN" in p_tags[0].text:
+            data["vin"] = p_tags[1].text.strip()
+
+    data["marka"] = extract_value("make", "Marka pojazdu")
+    data["model"] = extract_value("model", "Model pojazdu")
+    data["wersja"] = extract_value("version", "Wersja")
+    data["paliwo"] = extract_value("fuel_type", "Rodzaj paliwa")
+    data["skrzynia"] = extract_value("gearbox", "Skrzynia biegów")
+    data["typNadwozia"] = extract_value("body_type", "Typ nadwozia")
+    data["kolor"] = extract_value("color", "Kolor")
+    data["krajPochodzenia"] = extract_value("country_origin", "Kraj pochodzenia")
+
+    data["bezwypadkowy"] = extract_value("no_accident", "Bezwypadkowy") == "Tak"
+    data["serwisowanyWAso"] = extract_value("service_record", "Serwisowany w ASO") == "Tak"
+    data["maNumerRejestracyjny"] = extract_value("registered", "Zarejestrowany w Polsce") == "Tak"
+
+    title_elem = soup.select_one("h1")
+    if title_elem:
+        data["title"] = (title_elem.text if title_elem else " ")
+    else:
+        m_title = re.search(r'"title"[\s:]*"([^"]+)"', html)
+        if m_title:
+            data["title"] = m_title.group(1)
+
+    m_price = re.search(r'"price"[\s:]*\{[^}]*?"value"[\s:]*(\d+)', html)
+    if m_price:
+        data["cenaBrutto"] = int(m_price.group(1))
+
+    # --- POBIERANIE LINKU YOUTUBE ---
+    try:
+        import re as regex_yt
+        yt_link = ""
+
+        # Opcja 1: Szukanie wprost iframe z YouTube
+        iframe = soup.find('iframe', src=regex_yt.compile(r'youtube\.com|youtu\.be'))
+        if iframe:
+            yt_link = iframe.get('src', '')
+
+        # Opcja 2: Przeszukanie ukrytych stanów strony
+        if not yt_link:
+            yt_match = regex_yt.search(r'(https://www\.youtube\.com/watch\?v=[\w-]+|https://youtu\.be/[\w-]+)', str(soup))
+            if yt_match:
+                yt_link = yt_match.group(0)
+
+        if yt_link:
+            yt_link = yt_link.replace('embed/', 'watch?v=')
+            data['youtube'] = yt_link
+            data['youtubeLink'] = yt_link
+            data['video'] = yt_link
+    except Exception as e:
+        print("Błąd pobierania YT:", e)
+    else:
+        p_elem = soup.select_one('[data-testid="ad-price-container"] h3') or soup.find('h3', class_=lambda c: c and 'price' in str(c).lower())
+        if not p_elem:
+            p_elem = soup.find(attrs={"data-testid": "ad-price-container"})
+        if p_elem:
+            data["cenaBrutto"] = int(re.sub(r'[^\d]', '', (p_elem.text if p_elem else " ")))
+
+    raw_images = re.findall(r'"(https://[^"]+\.olxcdn\.com/[^"]+)"', html)
+    hq_images = []
+    for img in raw_images:
+        if "image" in img:
+            base = img.split(';')[0]
+            hq_images.append(base + ";s=1080x720")
+
+    unique_images = list(dict.fromkeys(hq_images))
+    if unique_images:
+        data["zdjecia"] = unique_images
+        data["zdjecieGlowne"] = unique_images[0]
+
+    # 5. OPIS - Wymuszanie przerw między liniami
+    desc_elem = soup.select_one('[data-testid="ad-description"]') or soup.select_one('.offer-description__description')
+    if desc_elem:
+        for br in desc_elem.find_all("br"):
+            br.replace_with("\n")
+        for p in desc_elem.find_all("p"):
+            p.append("\n")
+
+        clean_text = (desc_elem.text if desc_elem else " ")
+        clean_text = re.sub(r' {2,}', ' ', clean_text)
+        clean_text = re.sub(r'\n\s*\n\s*\n+', '\n\n', clean_text)
+        data["opis"] = clean_text.strip()
+    else:
+        m_desc = re.search(r'"description"[\s:]*"(.*?)"(?:,|})', html)
+        if m_desc:
+            try:
+                data["opis"] = json.loads('"' + m_desc.group(1) + '"')
+            except BaseException:
+                data["opis"] = m_desc.group(1)
+
+    for k in ["rok", "przebieg", "moc", "kubatura"]:
+        if data.get(k):
+            try:
+                v = str(data[k]).lower().replace('cm3', '').replace('cm³', '')
+                data[k] = int(re.sub(r'[^\d]', '', v))
+            except BaseException:
+                pass
+
+    fuel = str(data.get("paliwo", "")).lower()
+    if "diesel" in fuel:
+        data["paliwo"] = "Diesel"
+    elif "benz" in fuel or "petrol" in fuel:
+        data["paliwo"] = "Benzyna"
+    elif "elektry" in fuel or "electric" in fuel:
+        data["paliwo"] = "Elektryczny"
+    elif "hybry" in fuel:
+        data["paliwo"] = "Hybryda"
+
+    gb = str(data.get("skrzynia", "")).lower()
+    if "auto" in gb:
+        data["skrzynia"] = "Automatyczna"
+    elif "man" in gb:
+        data["skrzynia"] = "Manualna"
+
+    if not data.get("marka") and data.get("title"):
+        parts = data["title"].split()
+        data["marka"] = parts[0]
+        data["model"] = " ".join(parts[1:3])
+
+    return data
+
+
+def main():
+    for name in ('offer_state.html', 'offer_legacy.html'):
+        html = load_fixture(name)
+        legacy = best_of(lambda: legacy_scrape_offer(html))
+        shared = best_of(lambda: offer_form_data(extract_offer(html)))
+        source = extract_offer(html).source
+        print(f"{name:18} {len(html) // 1024:4d} KiB  legacy {legacy * 1e3:7.2f} ms  "
+              f"extractor[{source}] {shared * 1e3:7.2f} ms  ({legacy / shared:.1f}x)")
+
+    print()
+    for name in ('offer_state.html', 'offer_legacy.html'):
+        html = load_fixture(name)
+        legacy = best_of(lambda: legacy_scan_parameters(html))
+        combined = best_of(lambda: scan_parameters(html))
+        mib_s = len(html.encode('utf-8')) / 2 ** 20
+        print(f"{name:18} {len(FIELDS)} fields  per-field regex {legacy * 1e3:7.2f} ms ({mib_s / legacy:6.1f} MiB/s)  "
+              f"combined pass {combined * 1e3:7.2f} ms ({mib_s / combined:6.1f} MiB/s)  ({legacy / combined:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""
+Timing helper shared by the benchmark scripts
+"""
+import timeit
+
+
+def best_of(fn, number: int = 3, repeat: int = 7) -> float:
+    """Best time per call in seconds (min over repeats filters scheduler noise)"""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
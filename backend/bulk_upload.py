@@ -0,0 +1,110 @@
+"""
+Concurrent bulk image upload with progress events.
+
+Files are stored while the request is still arriving: as soon as the
+streaming parser finishes a file part, an upload task starts, and at most
+UPLOAD_CONCURRENCY of them talk to storage at once. Progress is reported
+as a sequence of events (in completion order):
+- {"event": "received", "index", "filename", "size"}   file part read
+- {"event": "stored",   "index", "filename", "url", "variants"}  saved
+- {"event": "failed",   "index", "filename", "error"}  rejected / failed
+- {"event": "done", "success", "urls", "variants", "errors", "results"}
+The final event lists the per-file results in input order.
+
+The body is fully received before the response starts, so the streamed
+part covers the storage uploads still in flight. Starlette's
+StreamingResponse reads `receive` to watch for a client disconnect while it
+streams, which would take body chunks away from the parser, and a malformed
+body must still be answered with a 400 rather than a started stream.
+"""
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Union
+
+from upload_stream import SpooledUpload, StreamingUploadParser, UploadError
+
+UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', '4'))
+
+NDJSON = 'application/x-ndjson'
+
+
+def summarize(results: List[dict]) -> dict:
+    """Final event: URLs and error messages in input order"""
+    urls = [r['url'] for r in results if 'url' in r]
+    return {
+        "event": "done",
+        "success": len(urls) > 0,
+        "urls": urls,
+        "variants": {r['url']: r['variants'] for r in results if r.get('variants')},
+        "errors": [f"{r['filename']}: {r['error']}" for r in results if 'error' in r],
+        "results": results,
+    }
+
+
+class BulkUpload:
+    """One bulk upload request: receive() parses and starts uploads, events() reports them"""
+
+    def __init__(self, request, store: Callable[[SpooledUpload], Awaitable[Union[str, dict]]], concurrency: Optional[int] = None):
+        self.request = request
+        self.store = store
+        self.results: List[Optional[dict]] = []
+        self._slots = asyncio.Semaphore(concurrency or UPLOAD_CONCURRENCY)
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def receive(self) -> None:
+        """Parse the whole body; storing starts for each file as soon as it is complete"""
+        content_type = self.request.headers.get('content-type', '')
+        if not content_type.startswith('multipart/form-data'):
+            raise UploadError("Expected multipart/form-data.")
+        parser = StreamingUploadParser(content_type, on_file=self._on_file)
+        try:
+            await parser.parse(self.request.stream())
+        except UploadError:
+            # Pliki już przekazane są wgrywane do końca, potem zgłaszamy błąd
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            raise
+
+    def _on_file(self, upload: SpooledUpload) -> None:
+        index = len(self.results)
+        self.results.append(None)
+        self._events.put_nowait({"event": "received", "index": index, "filename": upload.filename, "size": upload.size})
+        self._tasks.append(asyncio.create_task(self._store_one(index, upload)))
+
+    async def _store_one(self, index: int, upload: SpooledUpload) -> None:
+        result = {"index": index, "filename": upload.filename}
+        try:
+            if not upload.ok:
+                result["error"] = upload.error or "Niekompletny plik"
+            else:
+                async with self._slots:
+                    try:
+                        stored = await self.store(upload)
+                        # store() zwraca URL albo {"url", "variants"}
+                        result.update(stored if isinstance(stored, dict) else {"url": stored})
+                    except Exception as e:
+                        result["error"] = f"Błąd uploadu ({e})"
+        finally:
+            upload.close()
+        self.results[index] = result
+        self._events.put_nowait({"event": "stored" if "url" in result else "failed", **result})
+
+    async def events(self) -> AsyncIterator[dict]:
+        """Progress events in completion order, then the ordered summary"""
+        pending = len(self._tasks) * 2  # received + stored/failed na plik
+        for _ in range(pending):
+            yield await self._events.get()
+        yield summarize(self.results)
+
+    async def summary(self) -> dict:
+        await asyncio.gather(*self._tasks)
+        summary = summarize(self.results)
+        summary.pop("event")
+        return summary
+
+
+async def ndjson_events(events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """One JSON object per line"""
+    async for event in events:
+        yield (json.dumps(event, ensure_ascii=False) + "\n").encode('utf-8')
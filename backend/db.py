@@ -0,0 +1,76 @@
+"""
+Non-blocking access layer for the synchronous Supabase client.
+
+supabase-py's sync client performs blocking HTTP in `.execute()` and in
+storage calls. Everything here is run in a bounded thread pool, so a slow
+Supabase round trip never stalls the event loop, and a semaphore caps how
+many database calls are in flight at once.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional
+
+DB_MAX_CONCURRENCY = int(os.environ.get('DB_MAX_CONCURRENCY', '10'))
+DB_PAGE_SIZE = int(os.environ.get('DB_PAGE_SIZE', '1000'))
+
+# Kody PostgREST: brak funkcji RPC (JSON-owy PGRST202 albo gołe 404)
+MISSING_FUNCTION_CODES = frozenset({'PGRST202', '404'})
+# Nieistniejąca kolumna: Postgres undefined_column albo brak w cache schematu PostgREST
+MISSING_COLUMN_CODES = frozenset({'42703', 'PGRST204'})
+
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_MAX_CONCURRENCY, thread_name_prefix="supabase")
+    return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(DB_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def db_call(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking Supabase call (query or storage) in the DB worker pool"""
+    loop = asyncio.get_running_loop()
+    async with _get_semaphore():
+        return await loop.run_in_executor(_get_executor(), partial(fn, *args, **kwargs))
+
+
+async def db_execute(builder) -> Any:
+    """Await `builder.execute()` of a PostgREST query builder without blocking the loop"""
+    return await db_call(builder.execute)
+
+
+async def db_select_all(select: Callable[[], Any], page_size: int = DB_PAGE_SIZE) -> List[dict]:
+    """Every row of `select()` (a fresh select builder per page), fetched page by page in id order"""
+    rows: List[dict] = []
+    while True:
+        response = await db_execute(select().order('id').range(len(rows), len(rows) + page_size - 1))
+        page = response.data or []
+        if not page:
+            return rows
+        # PostgREST przycina strony do max_rows, więc kończymy dopiero na pustej stronie
+        rows.extend(page)
+
+
+def error_code(error: Exception) -> str:
+    """PostgREST / Postgres code of a failed call ('' for network errors and the like)"""
+    return str(getattr(error, 'code', None) or '')
+
+
+def shutdown_db_pool() -> None:
+    """Wait for in-flight calls and release the worker threads"""
+    global _executor, _semaphore
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+    _executor = None
+    _semaphore = None
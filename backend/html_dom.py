@@ -0,0 +1,188 @@
+"""
+HTML parser backends for Otomoto pages (offer fallback path and dealer pages).
+
+Both backends expose the same handful of lookups and return identical
+values, so callers never touch BeautifulSoup or lxml directly:
+- lxml:        libxml2 parser + XPath, several times faster (default when installed)
+- html.parser: BeautifulSoup with the pure-Python parser (fallback)
+
+The backend is chosen with the HTML_PARSER environment variable.
+"""
+import os
+from typing import Iterator, List, Optional, Pattern, Tuple
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml jest w requirements.txt
+    lxml = None
+
+HTML_PARSER = os.environ.get('HTML_PARSER', 'lxml')
+
+DETAILS_ITEM = 'advert-details-item'
+PRICE_CONTAINER = 'ad-price-container'
+DESCRIPTION = 'ad-description'
+DESCRIPTION_LEGACY_CLASS = 'offer-description__description'
+
+# Treść tych elementów nie wchodzi do .text w BeautifulSoup
+_NON_TEXT_TAGS = ('script', 'style', 'template')
+
+
+def available_backends() -> List[str]:
+    return ['lxml', 'html.parser'] if lxml is not None else ['html.parser']
+
+
+def _decode(content) -> str:
+    if isinstance(content, bytes):
+        return content.decode('utf-8', errors='ignore')
+    return content
+
+
+class SoupDocument:
+    """BeautifulSoup (html.parser) backend"""
+    backend = 'html.parser'
+
+    def __init__(self, content):
+        self.soup = BeautifulSoup(_decode(content), "html.parser")
+
+    def heading(self) -> Optional[str]:
+        h1 = self.soup.select_one("h1")
+        return h1.text if h1 else None
+
+    def details_vin(self) -> Optional[str]:
+        vin = None
+        for div in self.soup.find_all('div', attrs={"data-testid": DETAILS_ITEM}):
+            p_tags = div.find_all('p')
+            if len(p_tags) >= 2 and "VIN" in p_tags[0].text:
+                vin = p_tags[1].text.strip()
+        return vin
+
+    def price_text(self) -> Optional[str]:
+        p_elem = self.soup.select_one(f'[data-testid="{PRICE_CONTAINER}"] h3') or self.soup.find('h3', class_=lambda c: c and 'price' in str(c).lower())
+        if not p_elem:
+            p_elem = self.soup.find(attrs={"data-testid": PRICE_CONTAINER})
+        return p_elem.text if p_elem else None
+
+    def description(self) -> Optional[str]:
+        desc_elem = self.soup.select_one(f'[data-testid="{DESCRIPTION}"]') or self.soup.select_one(f'.{DESCRIPTION_LEGACY_CLASS}')
+        if not desc_elem:
+            return None
+        for br in desc_elem.find_all("br"):
+            br.replace_with("\n")
+        for p in desc_elem.find_all("p"):
+            p.append("\n")
+        return desc_elem.text
+
+    def iframe_src(self, pattern: Pattern) -> Optional[str]:
+        iframe = self.soup.find('iframe', src=pattern)
+        return iframe.get('src', '') if iframe else None
+
+    def links(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """(href, text of the enclosing <article> or None) for every <a href>"""
+        for a in self.soup.find_all('a', href=True):
+            card = a.find_parent('article')
+            yield a['href'], (card.get_text(' ', strip=True) if card else None)
+
+
+class LxmlDocument:
+    """lxml backend; text is assembled the same way BeautifulSoup does it"""
+    backend = 'lxml'
+
+    def __init__(self, content):
+        content = _decode(content)
+        try:
+            self.root = lxml.html.document_fromstring(content) if content.strip() else None
+        except ValueError:
+            # np. deklaracja <?xml encoding=...> w napisie str
+            self.root = lxml.html.document_fromstring(content.encode('utf-8'))
+        except etree.ParserError:
+            self.root = None
+
+    def _xpath(self, query: str) -> list:
+        return self.root.xpath(query) if self.root is not None else []
+
+    def _first(self, query: str):
+        found = self._xpath(query)
+        return found[0] if found else None
+
+    @staticmethod
+    def _strings(el, breaks: bool = False) -> Iterator[str]:
+        """Text nodes in document order, skipping comments and script/style like BeautifulSoup.
+
+        With breaks=True <br> becomes "\n" and every <p> ends with "\n"
+        (what the description cleanup does to the soup).
+        """
+        if not isinstance(el.tag, str) or el.tag in _NON_TEXT_TAGS:
+            return
+        if el.tag == 'br':
+            if breaks:
+                yield '\n'
+            return
+        if el.text:
+            yield el.text
+        for child in el:
+            yield from LxmlDocument._strings(child, breaks)
+            if child.tail:
+                yield child.tail
+        if breaks and el.tag == 'p':
+            yield '\n'
+
+    def _text(self, el, breaks: bool = False) -> str:
+        return ''.join(self._strings(el, breaks))
+
+    def heading(self) -> Optional[str]:
+        h1 = self._first('//h1')
+        return self._text(h1) if h1 is not None else None
+
+    def details_vin(self) -> Optional[str]:
+        vin = None
+        for div in self._xpath(f'//div[@data-testid="{DETAILS_ITEM}"]'):
+            p_tags = div.xpath('.//p')
+            if len(p_tags) >= 2 and "VIN" in self._text(p_tags[0]):
+                vin = self._text(p_tags[1]).strip()
+        return vin
+
+    def price_text(self) -> Optional[str]:
+        p_elem = self._first(f'//*[@data-testid="{PRICE_CONTAINER}"]//h3')
+        if p_elem is None:
+            p_elem = self._first('//h3[contains(translate(@class, "PRICE", "price"), "price")]')
+        if p_elem is None:
+            p_elem = self._first(f'//*[@data-testid="{PRICE_CONTAINER}"]')
+        return self._text(p_elem) if p_elem is not None else None
+
+    def description(self) -> Optional[str]:
+        desc_elem = self._first(f'//*[@data-testid="{DESCRIPTION}"]')
+        if desc_elem is None:
+            desc_elem = self._first(f'//*[contains(concat(" ", normalize-space(@class), " "), " {DESCRIPTION_LEGACY_CLASS} ")]')
+        return self._text(desc_elem, breaks=True) if desc_elem is not None else None
+
+    def iframe_src(self, pattern: Pattern) -> Optional[str]:
+        for iframe in self._xpath('//iframe[@src]'):
+            if pattern.search(iframe.get('src')):
+                return iframe.get('src')
+        return None
+
+    def links(self) -> Iterator[Tuple[str, Optional[str]]]:
+        for a in self._xpath('//a[@href]'):
+            card = self._first_ancestor(a, 'article')
+            if card is None:
+                yield a.get('href'), None
+            else:
+                pieces = (s.strip() for s in self._strings(card))
+                yield a.get('href'), ' '.join(s for s in pieces if s)
+
+    @staticmethod
+    def _first_ancestor(el, tag: str):
+        for ancestor in el.iterancestors(tag):
+            return ancestor
+        return None
+
+
+def parse_html(content, backend: Optional[str] = None):
+    """Parse a page with the configured (or given) backend"""
+    backend = backend or HTML_PARSER
+    if backend == 'lxml' and lxml is not None:
+        return LxmlDocument(content)
+    return SoupDocument(content)
@@ -0,0 +1,89 @@
+"""
+HTTP conditional responses (ETag / Last-Modified / Cache-Control) for public reads
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# Przeglądarka i CDN mogą trzymać odpowiedź, ale zawsze ją rewalidują (tanie 304)
+PUBLIC_CACHE_CONTROL = os.environ.get('PUBLIC_CACHE_CONTROL', 'public, max-age=0, must-revalidate')
+
+
+class RenderedJSON:
+    """JSON body serialized once, with a content-hash ETag.
+
+    `last_modified` comes from the data source (for listings the listing
+    cache's last invalidation); without it no Last-Modified is sent.
+    """
+    __slots__ = ('body', 'etag', 'last_modified')
+
+    def __init__(self, content: Any, last_modified: Optional[datetime] = None):
+        # Ten sam format co starlette.responses.JSONResponse.render
+        self.body = json.dumps(
+            jsonable_encoder(content),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        self.last_modified = last_modified
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of If-None-Match against our ETag"""
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified <= since
+
+
+def is_not_modified(request: Request, rendered: RenderedJSON) -> bool:
+    """If-None-Match takes precedence; If-Modified-Since only when it is absent"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, rendered.etag)
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and rendered.last_modified is not None:
+        return _not_modified_since(if_modified_since, rendered.last_modified)
+    return False
+
+
+def conditional_response(
+    request: Request,
+    rendered: RenderedJSON,
+    cache_control: Optional[str] = None,
+) -> Response:
+    """200 with the rendered body, or an empty 304 when the client copy is current"""
+    headers = {
+        'ETag': rendered.etag,
+        'Cache-Control': cache_control or PUBLIC_CACHE_CONTROL,
+    }
+    if rendered.last_modified is not None:
+        headers['Last-Modified'] = format_datetime(rendered.last_modified, usegmt=True)
+    if is_not_modified(request, rendered):
+        return Response(status_code=304, headers=headers)
+    return Response(content=rendered.body, media_type='application/json', headers=headers)
@@ -0,0 +1,154 @@
+"""
+Shared outbound HTTP client for scraping (Otomoto endpoint and sync).
+
+One process-wide client owns the connection pools, so TCP/TLS connections
+stay alive across requests and cron runs instead of being opened per call:
+- plain:   requests session for dealer pages and photos
+- browser: cloudscraper session for offer pages; its Cloudflare clearance
+           cookie, User-Agent and TLS cipher suite are created once and
+           shared by all threads
+
+Sessions are per thread (cloudscraper keeps challenge state on the
+instance), but every thread mounts the same adapters and cookie jar, so
+the pools and cookies are shared. Each adapter retries connection errors
+and transient statuses with exponential backoff (honouring Retry-After)
+and caps open connections per host.
+"""
+import os
+import threading
+from typing import Optional, Tuple, Union
+
+import cloudscraper
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from urllib3.util.retry import Retry
+
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '15'))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '3'))
+# Odstępy między ponowieniami: backoff * 2^(n-1) sekund
+HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF', '0.5'))
+# Maksymalna liczba otwartych połączeń do jednego hosta (kolejne zapytania czekają)
+HTTP_MAX_PER_HOST = int(os.environ.get('HTTP_MAX_PER_HOST', '8'))
+# Ilu hostów pule trzymamy naraz
+HTTP_MAX_HOSTS = int(os.environ.get('HTTP_MAX_HOSTS', '16'))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# 403/503 od Cloudflare rozwiązuje cloudscraper - nie ponawiamy ich na poziomie połączenia
+BROWSER_RETRY_STATUSES = (429, 500, 502, 504)
+BROWSER = {'browser': 'chrome', 'platform': 'windows', 'mobile': False}
+
+Timeout = Union[float, Tuple[float, float], None]
+
+
+def _retry(statuses) -> Retry:
+    return Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        status_forcelist=statuses,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        backoff_factor=HTTP_BACKOFF,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class HttpClient:
+    """Pooled keep-alive sessions shared by all scraping code"""
+
+    def __init__(self, max_per_host: int = HTTP_MAX_PER_HOST, max_hosts: int = HTTP_MAX_HOSTS,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.cookies = RequestsCookieJar()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        pool = {'pool_connections': max_hosts, 'pool_maxsize': max_per_host, 'pool_block': True}
+
+        self._plain_adapter = HTTPAdapter(max_retries=_retry(RETRY_STATUSES), **pool)
+        # Wzorcowy scraper ustala User-Agent i zestaw szyfrów TLS dla wszystkich wątków
+        self._template = cloudscraper.create_scraper(browser=BROWSER)
+        self._browser_headers = dict(self._template.headers)
+        self._browser_adapters = {
+            'https://': cloudscraper.CipherSuiteAdapter(
+                cipherSuite=self._template.cipherSuite,
+                ecdhCurve=self._template.ecdhCurve,
+                server_hostname=self._template.server_hostname,
+                source_address=self._template.source_address,
+                max_retries=_retry(BROWSER_RETRY_STATUSES),
+                **pool,
+            ),
+            'http://': HTTPAdapter(max_retries=_retry(BROWSER_RETRY_STATUSES), **pool),
+        }
+        self._closed = False
+
+    def _mount(self, session: requests.Session, adapters: dict) -> requests.Session:
+        for prefix, adapter in adapters.items():
+            session.mount(prefix, adapter)
+        session.cookies = self.cookies
+        return session
+
+    def session(self, browser: bool = False) -> requests.Session:
+        """This thread's session (created on first use) backed by the shared pools"""
+        name = 'browser' if browser else 'plain'
+        session = getattr(self._local, name, None)
+        if session is None:
+            if browser:
+                session = cloudscraper.create_scraper(browser=BROWSER)
+                session.headers.clear()
+                session.headers.update(self._browser_headers)
+                session = self._mount(session, self._browser_adapters)
+            else:
+                session = self._mount(requests.Session(), {'https://': self._plain_adapter, 'http://': self._plain_adapter})
+            setattr(self._local, name, session)
+        return session
+
+    def timeout(self, read: Timeout = None) -> Tuple[float, float]:
+        """(connect, read) timeout; a bare number only overrides the read timeout"""
+        if isinstance(read, tuple):
+            return read
+        return (self.connect_timeout, read if read is not None else self.read_timeout)
+
+    def get(self, url: str, headers: Optional[dict] = None, timeout: Timeout = None, browser: bool = False,
+            stream: bool = False) -> requests.Response:
+        """Blocking GET; call it from a worker thread, never on the event loop.
+
+        With stream=True close the response (use it as a context manager),
+        otherwise its connection does not go back to the pool.
+        """
+        if self._closed:
+            raise RuntimeError("HttpClient is closed")
+        return self.session(browser).get(url, headers=headers, timeout=self.timeout(timeout), stream=stream)
+
+    def close(self) -> None:
+        """Drop all pooled connections"""
+        with self._lock:
+            self._closed = True
+            self._plain_adapter.close()
+            for adapter in self._browser_adapters.values():
+                adapter.close()
+            self._template.close()
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """The process-wide client, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def close_http_client() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
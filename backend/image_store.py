@@ -0,0 +1,206 @@
+"""
+Content-addressed image store for listing photos.
+
+Photos are stored under the hash of their bytes (buses/<blake2b>.<ext>), so
+the same photo uploaded twice or re-imported by the Otomoto sync is a single
+object. Listings reference photos by public URL in `zdjecia` /
+`zdjecieGlowne`, and an object (together with its variants directory, see
+image_variants) is deleted only when no listing references it any more.
+
+Deleting a listing only releases its photos. A background collection,
+delayed by IMAGE_GC_DELAY so that several deletes share it, counts the
+references across all listings once and removes the unreferenced objects in
+batches of IMAGE_GC_BATCH. A batch that fails stays queued for the next run.
+Photos uploaded within IMAGE_GC_GRACE are never collected, because the listing
+that will reference them may not be saved yet.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from db import db_select_all
+from image_variants import IMAGE_VARIANT_FORMATS, VARIANT_WIDTHS, variant_path
+from storage import STORAGE_BACKEND, LocalStorage, StorageProvider, SupabaseStorage
+
+IMAGE_GC_DELAY = float(os.environ.get('IMAGE_GC_DELAY', '2'))
+IMAGE_GC_BATCH = int(os.environ.get('IMAGE_GC_BATCH', '100'))
+IMAGE_GC_GRACE = float(os.environ.get('IMAGE_GC_GRACE', '3600'))
+
+IMAGE_PREFIX = "buses"
+
+logger = logging.getLogger(__name__)
+
+
+def image_hasher():
+    return hashlib.blake2b(digest_size=16)
+
+
+def content_path(digest: str, ext: str) -> str:
+    return f"{IMAGE_PREFIX}/{digest}.{ext}"
+
+
+def listing_images(row: dict) -> List[str]:
+    """Photo URLs referenced by one listing row"""
+    images = list(row.get('zdjecia') or [])
+    main = row.get('zdjecieGlowne')
+    if main and main not in images:
+        images.append(main)
+    return [url for url in images if url]
+
+
+class StoredImage(NamedTuple):
+    """Where a photo lives: provider location ('bucket' / 'local') and logical path"""
+    location: str
+    path: str
+
+
+class ImageStore:
+    """Reference-counted photo storage; one instance per Supabase client"""
+
+    def __init__(
+        self,
+        supabase,
+        uploads_dir: Optional[Path] = None,
+        delay: float = IMAGE_GC_DELAY,
+        batch_size: int = IMAGE_GC_BATCH,
+        grace: float = IMAGE_GC_GRACE,
+        backend: str = STORAGE_BACKEND,
+    ):
+        self.supabase = supabase
+        self.providers: Dict[str, StorageProvider] = {}
+        if supabase:
+            self.providers['bucket'] = SupabaseStorage(supabase)
+        if uploads_dir is not None:
+            self.providers['local'] = LocalStorage(uploads_dir)
+        self.backend = backend
+        self.delay = delay
+        self.batch_size = batch_size
+        self.grace = grace
+        self._pending: Set[StoredImage] = set()
+        self._claimed: Dict[StoredImage, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._rerun = False
+        self._lock: Optional[asyncio.Lock] = None
+
+    def upload_providers(self) -> List[StorageProvider]:
+        """Where new photos go, in fallback order (bucket, then local disk)"""
+        order = ('local',) if self.backend == 'local' else ('bucket', 'local')
+        return [self.providers[name] for name in order if name in self.providers]
+
+    def locate(self, url: str) -> Optional[StoredImage]:
+        """The object behind a public URL; None for images hosted elsewhere"""
+        if not url:
+            return None
+        url = url.split('?', 1)[0]
+        for location, provider in self.providers.items():
+            path = provider.locate(url)
+            if path:
+                return StoredImage(location, path)
+        return None
+
+    def claim(self, location: str, path: str) -> None:
+        """A photo was just uploaded (or reused) for a listing being edited"""
+        self._claimed[StoredImage(location, path)] = time.monotonic()
+
+    def claimed(self) -> Set[StoredImage]:
+        """Photos uploaded within the grace period"""
+        now = time.monotonic()
+        self._claimed = {k: t for k, t in self._claimed.items() if now - t < self.grace}
+        return set(self._claimed)
+
+    def reference_counts(self, rows: Iterable[dict]) -> Counter:
+        """How many listings reference each stored photo"""
+        counts: Counter = Counter()
+        for row in rows:
+            counts.update({image for image in map(self.locate, listing_images(row)) if image})
+        return counts
+
+    async def referenced(self) -> Counter:
+        rows = await db_select_all(lambda: self.supabase.table('buses').select('id, zdjecia, zdjecieGlowne'))
+        return self.reference_counts(rows)
+
+    def release(self, urls: Iterable[str], schedule: bool = True) -> None:
+        """Photos of a deleted listing; removed by the next collection if nothing else uses them"""
+        self._pending.update(image for image in map(self.locate, urls) if image)
+        if self._pending and schedule:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._collect_later())
+        else:
+            # Zwolnione w trakcie sprzątania - jeszcze jeden przebieg
+            self._rerun = True
+
+    async def _collect_later(self) -> None:
+        self._rerun = True
+        while self._rerun:
+            self._rerun = False
+            await asyncio.sleep(self.delay)
+            try:
+                await self.collect()
+            except Exception as e:
+                logger.warning(f"Sprzątanie zdjęć nie powiodło się: {e}")
+
+    async def wait(self) -> None:
+        """Wait for a scheduled collection (tests, shutdown)"""
+        if self._task is not None:
+            await self._task
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """Held while objects are being removed (collect / storage_gc)"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def collect(self) -> dict:
+        """Remove released photos that no listing references"""
+        async with self.lock:
+            pending, self._pending = self._pending, set()
+            stats = {"removed": 0, "kept": 0, "failed": 0}
+            if not pending:
+                return stats
+            try:
+                counts = await self.referenced()
+            except Exception:
+                self._pending.update(pending)
+                raise
+            claimed = self.claimed()
+            orphans = [image for image in pending if not counts[image] and image not in claimed]
+            stats["kept"] = len(pending) - len(orphans)
+            removed, failed = await self.remove(orphans)
+            self._pending.update(failed)
+            stats["removed"], stats["failed"] = len(removed), len(failed)
+            return stats
+
+    async def remove(self, images: List[StoredImage], with_variants: bool = True) -> tuple:
+        """Delete objects (and their variants) in batches; returns (removed, failed)"""
+        removed: List[StoredImage] = []
+        failed: List[StoredImage] = []
+        images = sorted(images)
+        for start in range(0, len(images), self.batch_size):
+            batch = images[start:start + self.batch_size]
+            try:
+                for location, provider in self.providers.items():
+                    paths = [image.path for image in batch if image.location == location]
+                    if with_variants:
+                        paths = [p for path in paths for p in (path, *all_variant_paths(path))]
+                    if paths:
+                        await provider.remove(paths)
+            except Exception as e:
+                logger.warning(f"Nie udało się usunąć {len(batch)} zdjęć: {e}")
+                failed.extend(batch)
+                continue
+            removed.extend(batch)
+        return removed, failed
+
+
+def all_variant_paths(path: str) -> List[str]:
+    """Every variant that may exist for a stored photo"""
+    return [variant_path(path, name, fmt) for name in VARIANT_WIDTHS for fmt in IMAGE_VARIANT_FORMATS]
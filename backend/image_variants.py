@@ -0,0 +1,158 @@
+"""
+Responsive image variants for listing photos.
+
+Every uploaded or imported photo is re-encoded into a few widths
+(thumb / card / gallery / full) in AVIF and WebP, with EXIF orientation
+applied and all metadata (EXIF, GPS, ICC, XMP) dropped. Encoding is CPU
+bound, so it runs in a process pool (spawned workers, safe next to the
+server's threads) and never on the event loop or the DB thread pool.
+
+Variants are stored next to the original:
+    buses/<name>.<ext>  ->  buses/<name>/<variant>.<format>
+and recorded on the listing in `zdjeciaWarianty`:
+    {"<original url>": {"card": {"width": 640, "avif": "<url>", "webp": "<url>"}, ...}}
+
+Pillow is optional: without it (or without AVIF support in the installed
+build) the missing formats are simply not produced.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # pragma: no cover - Pillow jest w requirements.txt
+    Image = None
+
+# Maksymalna szerokość każdego wariantu (mniejsze zdjęcia nie są powiększane)
+VARIANT_WIDTHS = {
+    'thumb': 320,
+    'card': 640,
+    'gallery': 1280,
+    'full': 1920,
+}
+IMAGE_VARIANT_FORMATS = [f.strip() for f in os.environ.get('IMAGE_VARIANT_FORMATS', 'avif,webp').split(',') if f.strip()]
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Jakość dobrana tak, by AVIF i WebP dawały podobny efekt wizualny
+QUALITY = {'avif': 55, 'webp': 80}
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+# Zabezpieczenie przed "bombami" dekompresji (~ 50 Mpx)
+MAX_PIXELS = 50_000_000
+
+
+class Variant(NamedTuple):
+    name: str
+    format: str
+    width: int
+    height: int
+    data: bytes
+
+
+def supported_formats() -> List[str]:
+    """Configured formats the installed Pillow can encode"""
+    if Image is None:
+        return []
+    return [fmt for fmt in IMAGE_VARIANT_FORMATS if fmt in QUALITY and features.check(fmt)]
+
+
+def render_variants(data: bytes, formats: Optional[List[str]] = None) -> List[Variant]:
+    """Decode one photo and encode every variant (runs inside a worker process)"""
+    formats = supported_formats() if formats is None else formats
+    if not formats:
+        return []
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = []
+    previous_width = None
+    for name, max_width in VARIANT_WIDTHS.items():
+        width = min(max_width, image.width)
+        if width == previous_width:
+            # Małe zdjęcie - kolejne warianty byłyby identyczne
+            continue
+        previous_width = width
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            out = io.BytesIO()
+            # Bez exif= / icc_profile= - metadane nie trafiają do wyniku
+            resized.save(out, format=fmt.upper(), quality=QUALITY[fmt])
+            variants.append(Variant(name, fmt, width, height, out.getvalue()))
+    return variants
+
+
+def variant_path(original_path: str, name: str, fmt: str) -> str:
+    """buses/abc.jpg -> buses/abc/card.webp"""
+    stem = original_path.rsplit('.', 1)[0]
+    return f"{stem}/{name}.{fmt}"
+
+
+def variant_map(variants: List[Variant], urls: List[str]) -> Dict[str, dict]:
+    """{variant: {"width": w, fmt: url}} for one photo; urls are parallel to variants"""
+    result: Dict[str, dict] = {}
+    for variant, url in zip(variants, urls):
+        entry = result.setdefault(variant.name, {"width": variant.width})
+        entry[variant.format] = url
+    return result
+
+
+def photo_variants_for(variants: Optional[Dict[str, dict]], photos: Optional[List[str]]) -> Dict[str, dict]:
+    """Keep only the variants of photos still on the listing"""
+    if not variants or not photos:
+        return {}
+    return {url: variants[url] for url in photos if url in variants}
+
+
+async def store_variants(
+    data: bytes,
+    original_path: str,
+    put: Callable[[str, bytes, str], Awaitable[str]],
+) -> Dict[str, dict]:
+    """Render the variants of one photo and store them with `put(path, data, content_type) -> url`.
+
+    Best effort: on any error the photo simply has no variants ({}).
+    """
+    try:
+        variants = await render_in_pool(data)
+        urls = await asyncio.gather(*(
+            put(variant_path(original_path, v.name, v.format), v.data, CONTENT_TYPES[v.format])
+            for v in variants
+        ))
+    except Exception as e:
+        logging.warning(f"Nie udało się wygenerować wariantów zdjęcia {original_path}: {e}")
+        return {}
+    return variant_map(variants, urls)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+async def render_in_pool(data: bytes) -> List[Variant]:
+    """render_variants in the image process pool; [] when no format is available"""
+    formats = supported_formats()
+    if not formats:
+        return []
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), render_variants, data, formats)
+
+
+def shutdown_image_pool() -> None:
+    """Wait for running encodes and stop the worker processes"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+    _pool = None
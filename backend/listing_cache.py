@@ -0,0 +1,116 @@
+"""
+In-process TTL + LRU cache for mapped listings
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Hashable, Optional
+
+LISTING_CACHE_TTL = float(os.environ.get('LISTING_CACHE_TTL', '300'))
+LISTING_CACHE_MAX_ENTRIES = int(os.environ.get('LISTING_CACHE_MAX_ENTRIES', '512'))
+
+_MISSING = object()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Every invalidation bumps `generation`; a value computed from data read
+    before an invalidation is dropped by set() instead of being cached stale.
+    `modified_at` is the wall-clock time of the last invalidation, rounded to
+    whole seconds and strictly increasing, so it can serve as Last-Modified.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.modified_at = _now()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """`ttl` overrides the cache-wide lifetime for this entry"""
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove every key matching predicate; returns number removed"""
+        self.generation += 1
+        self.invalidations += 1
+        # Nigdy wstecz i zawsze o pełną sekundę dalej (rozdzielczość nagłówków HTTP)
+        self.modified_at = max(_now(), self.modified_at + timedelta(seconds=1))
+        keys = [k for k in self._data if predicate(k)]
+        for k in keys:
+            del self._data[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        self.invalidate(lambda _: True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "generation": self.generation,
+        }
+
+
+listing_cache = TTLCache(LISTING_CACHE_TTL, LISTING_CACHE_MAX_ENTRIES)
+
+
+# Klucze: ('list', ...) - pełna lista i strony wyszukiwania, ('listing', id, ...) - pojedyncze ogłoszenie
+def list_key(*parts: Hashable) -> tuple:
+    return ('list',) + parts
+
+
+def listing_key(listing_id: str, *parts: Hashable) -> tuple:
+    return ('listing', listing_id) + parts
+
+
+def invalidate_listings(listing_id: Optional[str] = None) -> None:
+    """Drop cached list views and, if given, the single listing.
+
+    Called by every admin endpoint that writes to the `buses` table.
+    Without listing_id (bulk writes such as the Otomoto sync) the whole
+    cache is cleared.
+    """
+    if listing_id is None:
+        listing_cache.clear()
+        return
+    listing_cache.invalidate(lambda k: k[0] == 'list' or k[:2] == ('listing', listing_id))
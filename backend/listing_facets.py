@@ -0,0 +1,109 @@
+"""
+In-memory facet index for SearchForm dropdowns (GET /api/ogloszenia/facets)
+"""
+from typing import Dict, Iterable, Optional
+
+from listing_query import (
+    EQ_FILTERS, FLAG_FILTERS, RANGE_FILTERS, ListingQuery, condition_holds, listing_conditions,
+)
+
+# Pola z listą wartości (dropdowny) i pola z zakresem min/max
+VALUE_FACETS = ('marka', 'model', 'paliwo', 'typNadwozia', 'skrzynia', 'dmcKategoria')
+RANGE_FACETS = ('rok', 'cenaBrutto', 'przebieg', 'ladownosc')
+
+# Kolumny facetów i wszystkich filtrów (inaczej filtr na brakującej kolumnie odrzuca każdy wiersz)
+FACET_COLUMNS = tuple(dict.fromkeys(
+    ('id',) + VALUE_FACETS + RANGE_FACETS
+    + tuple(EQ_FILTERS.values())
+    + tuple(column for column, _ in RANGE_FILTERS.values())
+    + FLAG_FILTERS
+))
+
+
+class FacetIndex:
+    """Narrow copy of the `buses` rows needed for facets.
+
+    Loaded once from the database, then kept current row by row by the
+    admin endpoints (upsert / remove). `generation` changes on every row
+    update, so a full load that raced with an update is discarded.
+    """
+
+    def __init__(self):
+        self.rows: Dict[str, dict] = {}
+        self.loaded = False
+        self.generation = 0
+
+    def load(self, rows: Iterable[dict], generation: Optional[int] = None) -> None:
+        if generation is not None and generation != self.generation:
+            return
+        self.rows = {row['id']: row for row in rows}
+        self.loaded = True
+
+    def upsert(self, row: dict) -> None:
+        self.generation += 1
+        self.rows[row['id']] = row
+
+    def remove(self, listing_id: str) -> None:
+        self.generation += 1
+        self.rows.pop(listing_id, None)
+
+    def reset(self) -> None:
+        """Force a full reload on next use (bulk writes)"""
+        self.generation += 1
+        self.loaded = False
+        self.rows = {}
+
+    def compute(self, query: ListingQuery) -> dict:
+        """Value counts and ranges for rows matching the query.
+
+        Each facet ignores its own filter (a selected marka still shows the
+        other makes with their counts), but respects all the others.
+        Single pass: a row failing exactly one filter counts only towards
+        that filter's facet.
+        """
+        conditions = listing_conditions(query)
+        values = {field: {} for field in VALUE_FACETS}
+        ranges = {field: [None, None] for field in RANGE_FACETS}
+        total = 0
+
+        for row in self.rows.values():
+            failed = None
+            skip = False
+            for column, op, value in conditions:
+                if not condition_holds(row, column, op, value):
+                    if failed is not None and failed != column:
+                        skip = True
+                        break
+                    failed = column
+            if skip:
+                continue
+            if failed is None:
+                total += 1
+
+            for field in VALUE_FACETS:
+                if failed is not None and failed != field:
+                    continue
+                value = row.get(field)
+                if value is not None and value != '':
+                    values[field][value] = values[field].get(value, 0) + 1
+            for field in RANGE_FACETS:
+                if failed is not None and failed != field:
+                    continue
+                value = row.get(field)
+                if value is None:
+                    continue
+                bounds = ranges[field]
+                if bounds[0] is None or value < bounds[0]:
+                    bounds[0] = value
+                if bounds[1] is None or value > bounds[1]:
+                    bounds[1] = value
+
+        return {
+            "total": total,
+            "values": {field: dict(sorted(counts.items(), key=lambda kv: str(kv[0])))
+                       for field, counts in values.items()},
+            "ranges": {field: {"min": lo, "max": hi} for field, (lo, hi) in ranges.items()},
+        }
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,182 @@
+"""
+Mapping of `buses` rows to the listing API shape.
+
+Modes:
+- full:    legacy shape - Polish keys, English aliases, isSold/isReserved
+           and three YouTube aliases. This is the original
+           map_bus_db_to_listing kept as written: table-driven rewrites of it
+           measured no faster (benchmarks/bench_listing_mapping.py)
+- compact: the row's own (Polish) columns with fallbacks resolved, plus
+           title, sold/reserved and youtube_url - no English aliases. Driven
+           by the field tables below; each source column is read once
+- card:    only the columns CarCard.jsx renders (CARD_COLUMNS)
+"""
+from typing import Callable, Iterable, List
+
+# (klucz PL, klucz EN) - wartość = row[PL] or row[EN]
+ALIASED_FIELDS = (
+    ('cenaBrutto', 'price_pln'),
+    ('rok', 'production_year'),
+    ('przebieg', 'mileage_km'),
+    ('marka', 'make'),
+    ('paliwo', 'fuel_type'),
+    ('skrzynia', 'gearbox'),
+    ('moc', 'power_hp'),
+    ('kubatura', 'engine_displacement_cc'),
+    ('typNadwozia', 'body_type'),
+    ('opis', 'description_html'),
+)
+
+# Kolumny z pustym kontenerem jako wartością domyślną
+CONTAINER_FIELDS = (
+    ('zdjecia', list),
+    ('wyposazenie', dict),
+)
+
+YOUTUBE_SOURCES = ('youtube_url', 'youtubeUrl', 'video')
+
+
+def _first(g, sources: Iterable[str]):
+    """row[s1] or row[s2] or ..."""
+    value = None
+    for source in sources:
+        value = g(source)
+        if value:
+            return value
+    return value
+
+
+def main_photo(row: dict):
+    """The listing's main photo: zdjecieGlowne, else the first gallery photo (same rule as CarCard.jsx)"""
+    return row.get('zdjecieGlowne') or (row.get('zdjecia') or [None])[0]
+
+
+def main_photo_variants(row: dict) -> dict:
+    """AVIF/WebP variants of main_photo() (srcset in CarCard.jsx)"""
+    variants = row.get('zdjeciaWarianty')
+    if not variants:
+        return {}
+    return variants.get(main_photo(row)) or {}
+
+
+def map_bus_db_to_listing(bus_data: dict) -> dict:
+    """Map database fields to new listing model while preserving legacy frontend keys"""
+    result = dict(bus_data)
+
+    result['cenaBrutto'] = bus_data.get('cenaBrutto') or bus_data.get('price_pln')
+    result['rok'] = bus_data.get('rok') or bus_data.get('production_year')
+    result['przebieg'] = bus_data.get('przebieg') or bus_data.get('mileage_km')
+    result['marka'] = bus_data.get('marka') or bus_data.get('make')
+    result['paliwo'] = bus_data.get('paliwo') or bus_data.get('fuel_type')
+    result['skrzynia'] = bus_data.get('skrzynia') or bus_data.get('gearbox')
+    result['moc'] = bus_data.get('moc') or bus_data.get('power_hp')
+    result['kubatura'] = bus_data.get('kubatura') or bus_data.get('engine_displacement_cc')
+    result['typNadwozia'] = bus_data.get('typNadwozia') or bus_data.get('body_type')
+    result['opis'] = bus_data.get('opis') or bus_data.get('description_html')
+
+    result['zdjecia'] = bus_data.get('zdjecia') or []
+    result['wyposazenie'] = bus_data.get('wyposazenie') or {}
+    result['zdjecieGlowneWarianty'] = main_photo_variants(bus_data)
+
+    result['title'] = bus_data.get('title') or f"{result.get('marka', '')} {bus_data.get('model', '')}".strip()
+    result['price_pln'] = result['cenaBrutto']
+    result['make'] = result['marka']
+    result['production_year'] = result['rok']
+    result['mileage_km'] = result['przebieg']
+    result['fuel_type'] = result['paliwo']
+    result['gearbox'] = result['skrzynia']
+    result['power_hp'] = result['moc']
+    result['engine_displacement_cc'] = result['kubatura']
+    result['body_type'] = result['typNadwozia']
+    result['description_html'] = result['opis']
+
+    result['color'] = bus_data.get('kolor') or bus_data.get('color')
+    result['seats'] = bus_data.get('liczbaMiejsc') or bus_data.get('seats')
+    result['gvw_kg'] = bus_data.get('dmc') or bus_data.get('gvw_kg')
+    result['origin_country'] = bus_data.get('krajPochodzenia') or bus_data.get('origin_country')
+    result['condition_status'] = bus_data.get('stan') or bus_data.get('condition_status') or 'Używany'
+
+    is_sold = bus_data.get("sold") or bus_data.get("gwarancja") or (bus_data.get("status") == "sprzedane") or False
+    is_reserved = bus_data.get("reserved") or bus_data.get("hak") or False
+
+    result["sold"] = is_sold
+    result["isSold"] = is_sold
+    result["reserved"] = is_reserved
+    result["isReserved"] = is_reserved
+
+    # DODANE MAPOWANIE YOUTUBE DO FRONTENDU
+    yt_link = bus_data.get('youtube_url') or bus_data.get('youtubeUrl') or bus_data.get('video')
+    result['video'] = yt_link
+    result['youtube_url'] = yt_link
+    result['youtubeUrl'] = yt_link
+
+    return result
+
+
+def map_bus_db_to_compact_listing(row: dict) -> dict:
+    """Map database fields to the compact (Polish keys only) listing shape"""
+    g = row.get
+    # Kopia - wiersze bywają współdzielone (MOCK_BUSES, indeks facetów)
+    res = dict(row)
+    for key, empty in CONTAINER_FIELDS:
+        res[key] = g(key) or empty()
+    res['zdjecieGlowneWarianty'] = main_photo_variants(row)
+    res['sold'] = g('sold') or g('gwarancja') or (g('status') == 'sprzedane') or False
+    res['reserved'] = g('reserved') or g('hak') or False
+    for pl, en in ALIASED_FIELDS:
+        res[pl] = g(pl) or g(en)
+    res['title'] = g('title') or f"{res['marka']} {g('model', '')}".strip()
+    res['youtube_url'] = _first(g, YOUTUBE_SOURCES)
+    return res
+
+
+# Widok karty (CarCard.jsx) - tylko te kolumny są pobierane z bazy, bez `opis` i `zdjecia`
+CARD_COLUMNS = (
+    'id', 'marka', 'model', 'typNadwozia', 'rok', 'przebieg', 'cenaBrutto', 'cenaNetto', 'vat',
+    'dmc', 'ladownosc', 'wymiarL', 'wymiarH', 'paliwo', 'skrzynia', 'miasto', 'zdjecieGlowne',
+    'wyrozniowane', 'nowosc', 'flotowy', 'gwarancja', 'winda', 'hak', 'czterykola',
+    'dataPublikacji', 'sold', 'status', 'reserved',
+)
+
+# Kolumny zwracane pod tą samą nazwą
+CARD_PASSTHROUGH = (
+    'id', 'marka', 'model', 'typNadwozia', 'rok', 'przebieg', 'cenaBrutto', 'cenaNetto', 'vat',
+    'dmc', 'ladownosc', 'wymiarL', 'wymiarH', 'paliwo', 'skrzynia', 'zdjecieGlowne', 'dataPublikacji',
+)
+CARD_FLAGS = ('wyrozniowane', 'nowosc', 'flotowy', 'gwarancja', 'winda', 'hak', 'czterykola')
+
+LISTING_VIEWS = ('full', 'card')
+
+
+def map_bus_db_to_card(row: dict) -> dict:
+    """Map a card projection row to the summary shape used by the listing grid"""
+    g = row.get
+    card = {key: g(key) for key in CARD_PASSTHROUGH}
+    for flag in CARD_FLAGS:
+        card[flag] = g(flag) or False
+    card['lokalizacja'] = g('miasto')
+    card['zdjecieGlowneWarianty'] = main_photo_variants(row)
+    card['sold'] = g('sold') or g('gwarancja') or (g('status') == 'sprzedane') or False
+    card['reserved'] = g('reserved') or g('hak') or False
+    return card
+
+
+def listing_select_columns(view: str = 'full', extra: Iterable[str] = ()) -> str:
+    """PostgREST `select` for a view; `extra` adds columns needed for sorting/cursors"""
+    if view != 'card':
+        return '*'
+    columns = list(CARD_COLUMNS)
+    columns.extend(c for c in extra if c not in columns)
+    return ','.join(columns)
+
+
+def get_listing_mapper(compact: bool = False, view: str = 'full') -> Callable[[dict], dict]:
+    if view == 'card':
+        return map_bus_db_to_card
+    return map_bus_db_to_compact_listing if compact else map_bus_db_to_listing
+
+
+def map_buses_db_to_listings(rows: Iterable[dict], compact: bool = False, view: str = 'full') -> List[dict]:
+    """Map a batch of rows in a single pass"""
+    mapper = get_listing_mapper(compact, view)
+    return [mapper(row) for row in rows]
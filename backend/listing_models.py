@@ -2,7 +2,7 @@
 Pydantic models for new listing system
 """
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Any, Dict, List, Optional
 from datetime import datetime, date
 from enum import Enum
 import uuid
@@ -88,6 +88,9 @@ class ListingBase(BaseModel):
     # Additional fields from existing system
     zdjecia: List[str] = Field(default_factory=list, description="Lista URL zdjęć")
     zdjecieGlowne: Optional[str] = Field(None, description="URL głównego zdjęcia")
+    zdjeciaWarianty: Dict[str, Dict[str, Dict[str, Any]]] = Field(
+        default_factory=dict, description="Warianty AVIF/WebP zdjęć: {url: {thumb|card|gallery|full: {width, avif, webp}}}"
+    )
     wyrozniowane: bool = Field(False, description="Ogłoszenie wyróżnione")
     nowosc: bool = Field(False, description="Nowość")
     flotowy: bool = Field(False, description="Pojazd flotowy")
@@ -178,6 +181,7 @@ class ListingUpdate(BaseModel):
     # Additional fields
     zdjecia: Optional[List[str]] = None
     zdjecieGlowne: Optional[str] = None
+    zdjeciaWarianty: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
     wyrozniowane: Optional[bool] = None
     nowosc: Optional[bool] = None
     flotowy: Optional[bool] = None
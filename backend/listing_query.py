@@ -0,0 +1,261 @@
+"""
+Server-side filtering, sorting and cursor pagination for listing queries
+"""
+import base64
+import json
+from typing import Optional, List, Any
+
+from fastapi import Query
+from pydantic import BaseModel
+
+
+# Filtry odpowiadające polom SearchForm.jsx -> kolumny tabeli `buses`
+EQ_FILTERS = {
+    'marka': 'marka',
+    'model': 'model',
+    'paliwo': 'paliwo',
+    'typNadwozia': 'typNadwozia',
+    'skrzynia': 'skrzynia',
+    'dmcKategoria': 'dmcKategoria',
+    'wymiarL': 'wymiarL',
+    'wymiarH': 'wymiarH',
+    'normaEmisji': 'normaEmisji',
+}
+
+RANGE_FILTERS = {
+    'rokOd': ('rok', 'gte'),
+    'rokDo': ('rok', 'lte'),
+    'cenaOd': ('cenaBrutto', 'gte'),
+    'cenaDo': ('cenaBrutto', 'lte'),
+    'przebiegOd': ('przebieg', 'gte'),
+    'przebiegDo': ('przebieg', 'lte'),
+    'ladownoscOd': ('ladownosc', 'gte'),
+    'ladownoscDo': ('ladownosc', 'lte'),
+}
+
+FLAG_FILTERS = ('winda', 'hak', 'czterykola')
+
+# Klucze sortowania zgodne z opcjami `sortBy` w CarListingPage.jsx
+SORT_OPTIONS = {
+    'data-desc': ('dataPublikacji', True),
+    'cena-asc': ('cenaBrutto', False),
+    'cena-desc': ('cenaBrutto', True),
+    'rok-asc': ('rok', False),
+    'rok-desc': ('rok', True),
+    'przebieg-asc': ('przebieg', False),
+    'przebieg-desc': ('przebieg', True),
+    'ladownosc-asc': ('ladownosc', False),
+    'ladownosc-desc': ('ladownosc', True),
+    'kubatura-asc': ('kubatura', False),
+    'kubatura-desc': ('kubatura', True),
+}
+
+DEFAULT_SORT = 'data-desc'
+DEFAULT_LIMIT = 12
+MAX_LIMIT = 100
+
+
+class ListingQuery(BaseModel):
+    """Filter, sort and pagination parameters for GET /api/ogloszenia"""
+    marka: Optional[str] = None
+    model: Optional[str] = None
+    paliwo: Optional[str] = None
+    typNadwozia: Optional[str] = None
+    skrzynia: Optional[str] = None
+    dmcKategoria: Optional[str] = None
+    wymiarL: Optional[str] = None
+    wymiarH: Optional[str] = None
+    normaEmisji: Optional[str] = None
+
+    rokOd: Optional[int] = None
+    rokDo: Optional[int] = None
+    cenaOd: Optional[int] = None
+    cenaDo: Optional[int] = None
+    przebiegOd: Optional[int] = None
+    przebiegDo: Optional[int] = None
+    ladownoscOd: Optional[int] = None
+    ladownoscDo: Optional[int] = None
+
+    winda: Optional[bool] = None
+    hak: Optional[bool] = None
+    czterykola: Optional[bool] = None
+
+    sortBy: Optional[str] = None
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+
+    def is_bare(self) -> bool:
+        """True when no parameter was given (legacy full-list response)"""
+        return all(v is None for v in self.model_dump().values())
+
+    @property
+    def sort_column(self) -> str:
+        return SORT_OPTIONS[self.sortBy or DEFAULT_SORT][0]
+
+    @property
+    def sort_desc(self) -> bool:
+        return SORT_OPTIONS[self.sortBy or DEFAULT_SORT][1]
+
+    @property
+    def page_size(self) -> int:
+        return self.limit or DEFAULT_LIMIT
+
+
+def listing_query_params(
+    marka: Optional[str] = Query(None),
+    model: Optional[str] = Query(None),
+    paliwo: Optional[str] = Query(None),
+    typNadwozia: Optional[str] = Query(None),
+    skrzynia: Optional[str] = Query(None),
+    dmcKategoria: Optional[str] = Query(None),
+    wymiarL: Optional[str] = Query(None),
+    wymiarH: Optional[str] = Query(None),
+    normaEmisji: Optional[str] = Query(None),
+    rokOd: Optional[int] = Query(None, ge=0),
+    rokDo: Optional[int] = Query(None, ge=0),
+    cenaOd: Optional[int] = Query(None, ge=0),
+    cenaDo: Optional[int] = Query(None, ge=0),
+    przebiegOd: Optional[int] = Query(None, ge=0),
+    przebiegDo: Optional[int] = Query(None, ge=0),
+    ladownoscOd: Optional[int] = Query(None, ge=0),
+    ladownoscDo: Optional[int] = Query(None, ge=0),
+    winda: Optional[bool] = Query(None),
+    hak: Optional[bool] = Query(None),
+    czterykola: Optional[bool] = Query(None),
+    sortBy: Optional[str] = Query(None, pattern='^(' + '|'.join(SORT_OPTIONS) + ')$'),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
+) -> ListingQuery:
+    """FastAPI dependency collecting listing query parameters"""
+    return ListingQuery(**{k: v for k, v in locals().items()})
+
+
+def encode_cursor(row: dict, query: ListingQuery) -> str:
+    """Encode keyset position (sort value, id) of the last row on a page"""
+    payload = json.dumps([row.get(query.sort_column), row.get('id')], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode cursor produced by encode_cursor; raises ValueError on garbage"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError("Nieprawidłowy kursor paginacji")
+    if row_id is None:
+        raise ValueError("Nieprawidłowy kursor paginacji")
+    return value, row_id
+
+
+def _pg_literal(value: Any) -> str:
+    """Format a value for a PostgREST logic-tree filter (or=...)"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def apply_listing_query(builder, query: ListingQuery):
+    """Push filters, ordering and keyset pagination down to a PostgREST builder.
+
+    Fetches one row more than the page size so build_page() can tell
+    whether a next page exists.
+    """
+    for column, op, value in listing_conditions(query):
+        builder = builder.filter(column, op, value)
+
+    column, desc = query.sort_column, query.sort_desc
+    if query.cursor:
+        value, row_id = decode_cursor(query.cursor)
+        row_id = _pg_literal(row_id)
+        if value is None:
+            # NULL-e są na końcu - dalej tylko pozostałe NULL-e po id
+            builder = builder.or_(f"and({column}.is.null,id.gt.{row_id})")
+        else:
+            op = 'lt' if desc else 'gt'
+            value = _pg_literal(value)
+            builder = builder.or_(
+                f"{column}.{op}.{value},and({column}.eq.{value},id.gt.{row_id}),{column}.is.null"
+            )
+
+    return (
+        builder
+        .order(column, desc=desc, nullsfirst=False)
+        .order('id')
+        .limit(query.page_size + 1)
+    )
+
+
+def listing_conditions(query: ListingQuery) -> List[tuple]:
+    """Active filters as (column, op, value) triples"""
+    params = query.model_dump()
+    conditions = []
+    for param, column in EQ_FILTERS.items():
+        if params[param] is not None:
+            conditions.append((column, 'eq', params[param]))
+    for param, (column, op) in RANGE_FILTERS.items():
+        if params[param] is not None:
+            conditions.append((column, op, params[param]))
+    for flag in FLAG_FILTERS:
+        if params[flag]:
+            conditions.append((flag, 'eq', True))
+    return conditions
+
+
+def condition_holds(bus: dict, column: str, op: str, value: Any) -> bool:
+    """In-memory equivalent of one PostgREST filter; NULL never matches a range"""
+    current = bus.get(column)
+    if op == 'eq':
+        return current == value
+    if current is None:
+        return False
+    return current >= value if op == 'gte' else current <= value
+
+
+def matches_listing_query(bus: dict, query: ListingQuery) -> bool:
+    """In-memory equivalent of the filters applied by apply_listing_query"""
+    return all(condition_holds(bus, *condition) for condition in listing_conditions(query))
+
+
+def query_listings_in_memory(buses: List[dict], query: ListingQuery) -> List[dict]:
+    """Filter, sort and cut one page (+1 lookahead row) from raw bus rows"""
+    column, desc = query.sort_column, query.sort_desc
+    rows = [b for b in buses if matches_listing_query(b, query)]
+
+    non_null = sorted((b for b in rows if b.get(column) is not None),
+                      key=lambda b: str(b.get('id', '')))
+    non_null.sort(key=lambda b: b.get(column), reverse=desc)
+    nulls = sorted((b for b in rows if b.get(column) is None), key=lambda b: str(b.get('id', '')))
+    ordered = non_null + nulls
+
+    if query.cursor:
+        value, row_id = decode_cursor(query.cursor)
+        ordered = [b for b in ordered if _after_cursor(b, column, desc, value, row_id)]
+
+    return ordered[:query.page_size + 1]
+
+
+def _after_cursor(bus: dict, column: str, desc: bool, value, row_id) -> bool:
+    current = bus.get(column)
+    if value is None:
+        return current is None and str(bus.get('id')) > str(row_id)
+    if current is None:
+        return True
+    if current == value:
+        return str(bus.get('id')) > str(row_id)
+    return current < value if desc else current > value
+
+
+def build_page(rows: List[dict], query: ListingQuery, mapper, total: Optional[int] = None) -> dict:
+    """Trim the lookahead row and wrap a page of mapped listings"""
+    has_more = len(rows) > query.page_size
+    rows = rows[:query.page_size]
+    return {
+        "items": [mapper(row) for row in rows],
+        "next_cursor": encode_cursor(rows[-1], query) if has_more and rows else None,
+        "limit": query.page_size,
+        "sortBy": query.sortBy or DEFAULT_SORT,
+        "total": total,
+    }
@@ -0,0 +1,61 @@
+"""
+Listing statistics for the admin dashboard
+"""
+from typing import Iterable, Optional
+
+# Progi przedziałów cenowych (PLN) - muszą odpowiadać sql/bus_stats.sql
+PRICE_BUCKET_EDGES = (50_000, 100_000, 150_000, 200_000)
+
+# Kolumny potrzebne do policzenia statystyk, gdy funkcja bus_stats() nie jest zainstalowana
+STATS_COLUMNS = (
+    'marka', 'paliwo', 'typNadwozia', 'cenaBrutto', 'sold', 'gwarancja', 'status',
+    'reserved', 'hak', 'wyrozniowane', 'nowosc', 'flotowy',
+)
+
+FACET_FIELDS = ('marka', 'paliwo', 'typNadwozia')
+MISSING = 'brak'
+
+
+def price_bucket(price: Optional[int]) -> str:
+    """Label of the price bucket containing `price`"""
+    if price is None:
+        return MISSING
+    lower = 0
+    for edge in PRICE_BUCKET_EDGES:
+        if price < edge:
+            return f"{lower}-{edge - 1}"
+        lower = edge
+    return f"{lower}+"
+
+
+def is_sold(bus: dict) -> bool:
+    return bool(bus.get('sold') or bus.get('gwarancja') or bus.get('status') == 'sprzedane')
+
+
+def is_reserved(bus: dict) -> bool:
+    return bool(bus.get('reserved') or bus.get('hak'))
+
+
+def aggregate_stats(buses: Iterable[dict]) -> dict:
+    """Same result as the bus_stats() SQL function, computed in Python"""
+    stats = {
+        "total": 0, "wyrozniowane": 0, "nowe": 0, "flotowe": 0,
+        "sold": 0, "reserved": 0, "active": 0,
+        "facets": {field: {} for field in FACET_FIELDS + ('cena',)},
+    }
+    facets = stats["facets"]
+    for bus in buses:
+        sold = is_sold(bus)
+        stats["total"] += 1
+        stats["wyrozniowane"] += bool(bus.get('wyrozniowane'))
+        stats["nowe"] += bool(bus.get('nowosc'))
+        stats["flotowe"] += bool(bus.get('flotowy'))
+        stats["sold"] += sold
+        stats["reserved"] += is_reserved(bus) and not sold
+        stats["active"] += not sold
+        for field in FACET_FIELDS:
+            value = bus.get(field) or MISSING
+            facets[field][value] = facets[field].get(value, 0) + 1
+        bucket = price_bucket(bus.get('cenaBrutto'))
+        facets['cena'][bucket] = facets['cena'].get(bucket, 0) + 1
+    return stats
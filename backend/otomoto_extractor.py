@@ -0,0 +1,369 @@
+"""
+Otomoto offer page extractor shared by /api/scrape-otomoto and the sync.
+
+Each page is parsed once:
+1. embedded Next.js state (<script id="__NEXT_DATA__">) - a single
+   json.loads; the advert object carries title, price, description,
+   parameters and photos, so no DOM is built at all
+2. fallback for pages without usable state: one DOM parse (lxml, or
+   html.parser - see html_dom) for the data-testid elements plus one combined regex pass over the raw
+   HTML that collects every key -> displayValue/value pair
+
+Both paths return the same typed OtomotoOffer record; callers map it to
+their own shape (form data for the admin panel, a `buses` row for the sync).
+"""
+import html as html_lib
+import json
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Pattern
+
+from pydantic import BaseModel
+
+from html_dom import parse_html
+
+# (pole rekordu, klucz parametru Otomoto, etykieta na stronie)
+FIELDS = (
+    ('rok', 'year', 'Rok produkcji'),
+    ('przebieg', 'mileage', 'Przebieg'),
+    ('moc', 'engine_power', 'Moc'),
+    ('kubatura', 'engine_capacity', 'Pojemność skokowa'),
+    ('vin', 'vin', 'VIN'),
+    ('marka', 'make', 'Marka pojazdu'),
+    ('model', 'model', 'Model pojazdu'),
+    ('wersja', 'version', 'Wersja'),
+    ('paliwo', 'fuel_type', 'Rodzaj paliwa'),
+    ('skrzynia', 'gearbox', 'Skrzynia biegów'),
+    ('typNadwozia', 'body_type', 'Typ nadwozia'),
+    ('kolor', 'color', 'Kolor'),
+    ('krajPochodzenia', 'country_origin', 'Kraj pochodzenia'),
+    ('bezwypadkowy', 'no_accident', 'Bezwypadkowy'),
+    ('serwisowanyWAso', 'service_record', 'Serwisowany w ASO'),
+    ('maNumerRejestracyjny', 'registered', 'Zarejestrowany w Polsce'),
+)
+INT_FIELDS = ('rok', 'przebieg', 'moc', 'kubatura')
+FLAG_FIELDS = ('bezwypadkowy', 'serwisowanyWAso', 'maNumerRejestracyjny')
+
+_NEXT_DATA = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+_TITLE = re.compile(r'"title"[\s:]*"([^"]+)"')
+_PRICE = re.compile(r'"price"[\s:]*\{[^}]*?"value"[\s:]*(\d+)')
+_DESCRIPTION = re.compile(r'"description"[\s:]*"(.*?)"(?:,|})')
+_IMAGES = re.compile(r'"(https://[^"]+\.olxcdn\.com/[^"]+)"')
+_YOUTUBE = re.compile(r'https://www\.youtube\.com/(?:watch\?v=|embed/)[\w-]+|https://youtu\.be/[\w-]+')
+
+
+class OtomotoOffer(BaseModel):
+    """Fields read from one Otomoto offer page"""
+    source: str = 'html'
+    title: str = ''
+    vin: str = ''
+    cenaBrutto: Optional[int] = None
+    rok: Optional[int] = None
+    przebieg: Optional[int] = None
+    moc: Optional[int] = None
+    kubatura: Optional[int] = None
+    marka: Optional[str] = None
+    model: Optional[str] = None
+    wersja: Optional[str] = None
+    paliwo: Optional[str] = None
+    skrzynia: Optional[str] = None
+    typNadwozia: Optional[str] = None
+    kolor: Optional[str] = None
+    krajPochodzenia: Optional[str] = None
+    bezwypadkowy: bool = False
+    serwisowanyWAso: bool = False
+    maNumerRejestracyjny: bool = False
+    opis: Optional[str] = None
+    zdjecia: List[str] = []
+    youtube: Optional[str] = None
+
+
+# --- Bank wyrażeń regularnych (kompilowane raz, przy imporcie) ---
+
+_KEY = re.compile(r'"key"[\s:]*"([^"]+)"')
+_LABEL = re.compile(r'"label"[\s:]*"([^"]+)"')
+# Dopasowywane od końca "key"/"label" do końca tego samego obiektu JSON
+_DISPLAY_VALUE_AFTER = re.compile(r'[^}]*?"displayValue"[\s:]*"([^"]+)"')
+_VALUE_AFTER = re.compile(r'[^}]*?"value"[\s:]*"([^"]+)"')
+_TEXT_VALUE = r'[^>]*?>([a-zA-Z0-9\sęóąśłżźćńĘÓĄŚŁŻŹĆŃ]+)<'
+
+
+@lru_cache(maxsize=None)
+def _label_text_pattern(label: str) -> Pattern:
+    return re.compile(label + _TEXT_VALUE)
+
+
+for _, _, _label in FIELDS:
+    _label_text_pattern(_label)
+
+
+def _label_text_value(html: str, label: str) -> Optional[str]:
+    m = _label_text_pattern(label).search(html)
+    if m:
+        val = m.group(1).strip()
+        if len(val) < 40 and val != label:
+            return val
+    return None
+
+
+def scan_parameters(html: str, fields=FIELDS) -> Dict[str, Optional[str]]:
+    """All field values in one pass over the document.
+
+    Same precedence as looking each field up separately: the first
+    "key" object with a displayValue, then with a value, then the first
+    "label" object with a value, then the label followed by text in HTML.
+    """
+    wanted_keys = {key for _, key, _ in fields}
+    display: Dict[str, str] = {}
+    value: Dict[str, str] = {}
+    for m in _KEY.finditer(html):
+        key = m.group(1)
+        if key not in wanted_keys:
+            continue
+        if key not in display:
+            found = _DISPLAY_VALUE_AFTER.match(html, m.end())
+            if found:
+                display[key] = found.group(1)
+        if key not in value:
+            found = _VALUE_AFTER.match(html, m.end())
+            if found:
+                value[key] = found.group(1)
+
+    result = {field: display.get(key) or value.get(key) for field, key, _ in fields}
+    missing = [(field, label) for field, _, label in fields if result[field] is None]
+    if not missing:
+        return result
+
+    wanted_labels = {label for _, label in missing}
+    by_label: Dict[str, str] = {}
+    for m in _LABEL.finditer(html):
+        label = m.group(1)
+        if label in wanted_labels and label not in by_label:
+            found = _VALUE_AFTER.match(html, m.end())
+            if found:
+                by_label[label] = found.group(1)
+    for field, label in missing:
+        result[field] = by_label.get(label) or _label_text_value(html, label)
+    return result
+
+
+def extract_oto_value(html, key, label):
+    """Single field lookup (see scan_parameters for the whole set)"""
+    return scan_parameters(html, ((key, key, label),))[key]
+
+
+def _to_int(value) -> Optional[int]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, int):
+        return value
+    digits = re.sub(r'[^\d]', '', str(value).lower().replace('cm3', '').replace('cm³', ''))
+    return int(digits) if digits else None
+
+
+def clean_description(text: str) -> str:
+    text = re.sub(r' {2,}', ' ', text)
+    text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+    return text.strip()
+
+
+def _html_fragment_to_text(fragment: str) -> str:
+    """Description HTML from the state -> the same text the DOM path produces"""
+    text = re.sub(r'<br\s*/?>', '\n', fragment, flags=re.I)
+    text = re.sub(r'</p\s*>', '\n', text, flags=re.I)
+    text = re.sub(r'<[^>]+>', '', text)
+    return clean_description(html_lib.unescape(text))
+
+
+def _images(html: str) -> List[str]:
+    hq_images = [img.split(';')[0] + ";s=1080x720" for img in _IMAGES.findall(html) if "image" in img]
+    return list(dict.fromkeys(hq_images))
+
+
+def _youtube(html: str) -> Optional[str]:
+    m = _YOUTUBE.search(html)
+    return m.group(0).replace('embed/', 'watch?v=') if m else None
+
+
+def _valid_vin(vin) -> str:
+    if not vin or "Zgadzam" in vin or len(vin) > 20:
+        return ''
+    return vin
+
+
+def _build(raw: Dict[str, Optional[str]], **extra) -> OtomotoOffer:
+    values = dict(extra)
+    for field, _, _ in FIELDS:
+        value = raw.get(field)
+        if field in INT_FIELDS:
+            value = _to_int(value)
+        elif field in FLAG_FIELDS:
+            value = value == "Tak"
+        elif field == 'vin':
+            value = _valid_vin(value)
+        values[field] = value
+    return OtomotoOffer(**values)
+
+
+# --- Ścieżka 1: stan Next.js ---
+
+def _find_advert(state) -> Optional[dict]:
+    stack = [state]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            advert = node.get('advert')
+            if isinstance(advert, dict) and advert.get('title'):
+                return advert
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return None
+
+
+def _advert_parameters(advert: dict) -> Dict[str, str]:
+    """Every {"key", "displayValue"/"value"} pair in the advert, first occurrence wins"""
+    by_key: Dict[str, str] = {}
+    by_label: Dict[str, str] = {}
+    stack = [advert]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            key, label = node.get('key'), node.get('label')
+            value = node.get('displayValue') or node.get('value')
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            if isinstance(value, str) and value:
+                if isinstance(key, str):
+                    by_key.setdefault(key, value)
+                if isinstance(label, str):
+                    by_label.setdefault(label, value)
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return {field: by_key.get(key) or by_label.get(label) for field, key, label in FIELDS}
+
+
+def _from_state(html: str) -> Optional[OtomotoOffer]:
+    m = _NEXT_DATA.search(html)
+    if not m:
+        return None
+    try:
+        advert = _find_advert(json.loads(m.group(1)))
+    except ValueError:
+        return None
+    if not advert:
+        return None
+
+    raw = _advert_parameters(advert)
+    price = advert.get('price')
+    if isinstance(price, dict):
+        price = price.get('value')
+    description = advert.get('description')
+    video = advert.get('video')
+    return _build(
+        raw,
+        source='json',
+        title=advert['title'],
+        cenaBrutto=_to_int(price),
+        opis=_html_fragment_to_text(description) if isinstance(description, str) and description else None,
+        zdjecia=_images(html),
+        youtube=video.replace('embed/', 'watch?v=') if isinstance(video, str) and video else _youtube(html),
+    )
+
+
+# --- Ścieżka 2: DOM + regex ---
+
+def _from_html(html: str, backend: Optional[str] = None) -> OtomotoOffer:
+    dom = parse_html(html, backend)
+    raw = scan_parameters(html)
+    raw['vin'] = _valid_vin(raw['vin'])
+    details_vin = dom.details_vin()
+    if details_vin is not None:
+        raw['vin'] = details_vin
+
+    heading = dom.heading()
+    if heading is not None:
+        title = heading.strip()
+    else:
+        m_title = _TITLE.search(html)
+        title = m_title.group(1) if m_title else ''
+
+    price_text = dom.price_text()
+    price = _to_int(price_text) if price_text is not None else None
+    if price is None:
+        m_price = _PRICE.search(html)
+        price = int(m_price.group(1)) if m_price else None
+
+    opis = None
+    description = dom.description()
+    if description is not None:
+        opis = clean_description(description)
+    else:
+        m_desc = _DESCRIPTION.search(html)
+        if m_desc:
+            try:
+                opis = json.loads('"' + m_desc.group(1) + '"')
+            except ValueError:
+                opis = m_desc.group(1)
+
+    youtube = dom.iframe_src(_YOUTUBE)
+    if youtube:
+        youtube = youtube.replace('embed/', 'watch?v=')
+
+    return _build(
+        raw,
+        source='html',
+        title=title,
+        cenaBrutto=price,
+        opis=opis,
+        zdjecia=_images(html),
+        youtube=youtube or _youtube(html),
+    )
+
+
+def extract_offer(html: str, backend: Optional[str] = None) -> OtomotoOffer:
+    """Parse an offer page: embedded state first, DOM/regex fallback (backend: see html_dom)"""
+    return _from_state(html) or _from_html(html, backend)
+
+
+def offer_form_data(offer: OtomotoOffer) -> dict:
+    """Admin panel form data returned by /api/scrape-otomoto"""
+    data = offer.model_dump(include={field for field, _, _ in FIELDS})
+
+    if offer.title:
+        data["title"] = offer.title
+    if offer.cenaBrutto is not None:
+        data["cenaBrutto"] = offer.cenaBrutto
+    if offer.youtube:
+        data['youtube'] = offer.youtube
+        data['youtubeLink'] = offer.youtube
+        data['video'] = offer.youtube
+    if offer.zdjecia:
+        data["zdjecia"] = offer.zdjecia
+        data["zdjecieGlowne"] = offer.zdjecia[0]
+    if offer.opis is not None:
+        data["opis"] = offer.opis
+
+    fuel = str(data.get("paliwo", "")).lower()
+    if "diesel" in fuel:
+        data["paliwo"] = "Diesel"
+    elif "benz" in fuel or "petrol" in fuel:
+        data["paliwo"] = "Benzyna"
+    elif "elektry" in fuel or "electric" in fuel:
+        data["paliwo"] = "Elektryczny"
+    elif "hybry" in fuel:
+        data["paliwo"] = "Hybryda"
+
+    gb = str(data.get("skrzynia", "")).lower()
+    if "auto" in gb:
+        data["skrzynia"] = "Automatyczna"
+    elif "man" in gb:
+        data["skrzynia"] = "Manualna"
+
+    if not data.get("marka") and data.get("title"):
+        parts = data["title"].split()
+        data["marka"] = parts[0]
+        data["model"] = " ".join(parts[1:3])
+
+    return data
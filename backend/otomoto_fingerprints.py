@@ -0,0 +1,100 @@
+"""
+Per-offer fingerprints for the incremental Otomoto sync.
+
+For every offer URL seen on the dealer profile we remember the VIN, title,
+price, when it was last seen and fetched, a hash of its card on the dealer
+page, a hash of the offer HTML and the HTTP validators (ETag /
+Last-Modified). The next run fetches an offer only when its card changed,
+the fingerprint is older than the refetch window, or the offer is not in
+the database - and then revalidates it with a conditional request.
+
+The store is a JSON file written atomically at the end of each run; a
+missing or unreadable file just means a full sync.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+OTOMOTO_FINGERPRINTS_PATH = os.environ.get(
+    'OTOMOTO_FINGERPRINTS_PATH',
+    str(Path(__file__).parent / 'otomoto_fingerprints.json'),
+)
+# Po tylu godzinach oferta jest pobierana ponownie, nawet jeśli karta się nie zmieniła
+OTOMOTO_REFETCH_AFTER_HOURS = float(os.environ.get('OTOMOTO_REFETCH_AFTER_HOURS', '168'))
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data) -> str:
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FingerprintStore:
+    """URL -> fingerprint dict, persisted as JSON"""
+
+    def __init__(self, path: Optional[str] = OTOMOTO_FINGERPRINTS_PATH, refetch_after_hours: float = OTOMOTO_REFETCH_AFTER_HOURS):
+        self.path = path
+        self.refetch_after = timedelta(hours=refetch_after_hours)
+        self.offers: Dict[str, dict] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.offers = json.load(f).get('offers', {})
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Nie można wczytać odcisków Otomoto ({e}) - pełna synchronizacja")
+            self.offers = {}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'offers': self.offers}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, url: str) -> Optional[dict]:
+        return self.offers.get(url)
+
+    def put(self, url: str, **fields) -> dict:
+        fingerprint = self.offers.setdefault(url, {})
+        fingerprint.update(fields)
+        return fingerprint
+
+    def touch(self, url: str, card_hash: Optional[str] = None) -> None:
+        """Mark a known offer as seen in this run"""
+        fingerprint = self.offers[url]
+        fingerprint['last_seen'] = _now()
+        if card_hash is not None:
+            fingerprint['card_hash'] = card_hash
+
+    def is_fresh(self, url: str, card_hash: Optional[str]) -> bool:
+        """True when the offer can be skipped without fetching it"""
+        fingerprint = self.offers.get(url)
+        if not fingerprint or not card_hash or fingerprint.get('card_hash') != card_hash:
+            return False
+        fetched = fingerprint.get('last_fetched')
+        if not fetched:
+            return False
+        return datetime.now(timezone.utc) - datetime.fromisoformat(fetched) < self.refetch_after
+
+    def prune(self, seen_urls: Iterable[str]) -> List[str]:
+        """Drop offers no longer on the dealer profile; returns their URLs"""
+        seen = set(seen_urls)
+        removed = [url for url in self.offers if url not in seen]
+        for url in removed:
+            del self.offers[url]
+        return removed
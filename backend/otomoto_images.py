@@ -0,0 +1,176 @@
+"""
+Photo ingestion for the Otomoto sync.
+
+Photos of a new offer are downloaded and uploaded concurrently (bounded by
+one semaphore per run). Each download is streamed in chunks to a temporary
+file while it is hashed, and the upload reads that file back, so an image
+is never held in memory in full. The bucket path is the content hash
+(image_store):
+- the same photo seen twice in one run is stored once (in-flight uploads
+  are shared),
+- on a re-import the bucket rejects the existing path as a duplicate and
+  the stored copy is reused.
+Failed downloads and uploads are retried with backoff. A photo that still
+fails is skipped, and the offer is imported with the remaining ones.
+With `variants=True` the AVIF/WebP renditions (image_variants) of every
+stored photo are generated too and collected in `self.variants`.
+Every photo path is claimed in the run's ImageStore before it is uploaded or
+reused, so a concurrent collection does not delete it before the listing
+that references it is saved.
+"""
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import requests
+
+from db import db_call
+from image_store import ImageStore, content_path, image_hasher
+from image_variants import store_variants
+from storage import BUCKET, is_duplicate
+
+OTOMOTO_IMAGE_RETRIES = int(os.environ.get('OTOMOTO_IMAGE_RETRIES', '2'))
+OTOMOTO_IMAGE_BACKOFF = float(os.environ.get('OTOMOTO_IMAGE_BACKOFF', '0.5'))
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def image_path(digest: str) -> str:
+    return content_path(digest, 'jpg')
+
+
+def _is_permanent(error: Exception) -> bool:
+    """4xx from the photo host - retrying will not help"""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return isinstance(error, requests.HTTPError) and status is not None and 400 <= status < 500 and status != 429
+
+
+class ImageIngestor:
+    """Downloads offer photos into the bucket; one instance per sync run"""
+
+    def __init__(
+        self,
+        supabase,
+        download: Callable[[str, object], Awaitable[str]],
+        concurrency: int,
+        retries: int = OTOMOTO_IMAGE_RETRIES,
+        backoff: float = OTOMOTO_IMAGE_BACKOFF,
+        variants: bool = False,
+        store: Optional[ImageStore] = None,
+    ):
+        # download(url, file) -> skrót treści; strumieniuje zdjęcie do pliku
+        self.supabase = supabase
+        self.download = download
+        self.retries = retries
+        self.backoff = backoff
+        self._slots = asyncio.Semaphore(concurrency)
+        self.with_variants = variants
+        self.store = store
+        # {URL zdjęcia: warianty} - zapisywane w zdjeciaWarianty ogłoszenia
+        self.variants: Dict[str, dict] = {}
+        self._stored: Dict[str, asyncio.Future] = {}
+        self.stats = {"uploaded": 0, "reused": 0, "failed": 0, "retries": 0}
+
+    async def ingest(self, urls: List[str]) -> List[str]:
+        """Public URLs of the stored photos, in offer order, failures left out"""
+        stored = await asyncio.gather(*(self.ingest_one(url) for url in urls))
+        return [url for url in stored if url]
+
+    def variants_for(self, urls: List[str]) -> Dict[str, dict]:
+        return {url: self.variants[url] for url in urls if self.variants.get(url)}
+
+    async def ingest_one(self, url: str) -> Optional[str]:
+        async with self._slots:
+            fd, tmp_path = tempfile.mkstemp(prefix='otomoto-', suffix='.img')
+            os.close(fd)
+            try:
+                digest = await self._retrying(self._download, url, tmp_path)
+                if digest is None:
+                    return None
+                return await self._store(digest, tmp_path)
+            finally:
+                os.unlink(tmp_path)
+
+    async def _retrying(self, fn: Callable, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return await fn(*args)
+            except Exception as e:
+                if attempt == self.retries or _is_permanent(e):
+                    logger.warning(f"Zdjęcie z Otomoto pominięte ({args[0]}): {e}")
+                    self.stats["failed"] += 1
+                    return None
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def _download(self, url: str, tmp_path: str) -> str:
+        with open(tmp_path, 'wb') as f:
+            return await self.download(url, f)
+
+    async def _store(self, digest: str, tmp_path: str) -> Optional[str]:
+        pending = self._stored.get(digest)
+        if pending is not None:
+            # Ta sama treść już wgrywana / wgrana w tym przebiegu
+            stored = await asyncio.shield(pending)
+            if stored:
+                self.stats["reused"] += 1
+            return stored
+        pending = asyncio.get_running_loop().create_future()
+        self._stored[digest] = pending
+        path = image_path(digest)
+        if self.store is not None:
+            # Przed wgraniem: istniejąca kopia (duplikat) nie może zniknąć, zanim zapiszemy ogłoszenie
+            self.store.claim('bucket', path)
+        stored = None
+        try:
+            if await self._retrying(self._upload, path, tmp_path):
+                stored = self.supabase.storage.from_(BUCKET).get_public_url(path)
+                if self.with_variants:
+                    data = await asyncio.to_thread(_read, tmp_path)
+                    self.variants[stored] = await store_variants(data, path, self._put_variant)
+        finally:
+            pending.set_result(stored)
+            if stored is None:
+                del self._stored[digest]
+        return stored
+
+    async def _upload(self, path: str, tmp_path: str) -> bool:
+        try:
+            await db_call(self._upload_file, path, tmp_path)
+        except Exception as e:
+            if not is_duplicate(e):
+                raise
+            self.stats["reused"] += 1
+            return True
+        self.stats["uploaded"] += 1
+        return True
+
+    async def _put_variant(self, path: str, data: bytes, content_type: str) -> str:
+        try:
+            await db_call(self.supabase.storage.from_(BUCKET).upload, path, data, file_options={"content-type": content_type})
+        except Exception as e:
+            if not is_duplicate(e):
+                raise
+        return self.supabase.storage.from_(BUCKET).get_public_url(path)
+
+    def _upload_file(self, path: str, tmp_path: str) -> None:
+        with open(tmp_path, 'rb') as f:
+            self.supabase.storage.from_(BUCKET).upload(path, f, file_options={"content-type": "image/jpeg"})
+
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def stream_to(chunks, out) -> str:
+    """Copy chunks into the file `out` while hashing them; returns the hex digest"""
+    hasher = image_hasher()
+    for chunk in chunks:
+        hasher.update(chunk)
+        out.write(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,84 @@
+"""
+In-memory index of `buses` rows for the Otomoto sync.
+
+Built once per run from the rows read at the start. Lookups by VIN and by
+normalized title + price are O(1), replacing the per-offer linear scans,
+and the same index tracks which VINs/titles are still on the dealer
+profile for the sold-marking pass.
+"""
+import re
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_title(title) -> str:
+    if not title:
+        return ''
+    return _WHITESPACE.sub(' ', str(title)).strip().casefold()
+
+
+def normalize_price(price) -> Optional[int]:
+    try:
+        return int(price)
+    except (TypeError, ValueError):
+        return None
+
+
+class BusIndex:
+    """VIN -> row, (title, price) -> row and the active VIN/title sets of one run"""
+
+    def __init__(self, rows: Iterable[dict] = ()):
+        self.rows = list(rows)
+        self.by_vin: Dict[str, dict] = {}
+        self.by_title_price: Dict[Tuple[str, Optional[int]], dict] = {}
+        self.active_vins: Set[str] = set()
+        self.active_titles: Set[str] = set()
+        self._claimed: Set[tuple] = set()
+        for row in self.rows:
+            self._index(row)
+
+    def _index(self, row: dict) -> None:
+        vin = row.get('vin')
+        if vin:
+            self.by_vin.setdefault(vin, row)
+        price = normalize_price(row.get('cenaBrutto'))
+        # Import z Otomoto zapisuje tytuł oferty w `naped`
+        for key in ('title', 'naped'):
+            title = normalize_title(row.get(key))
+            if title:
+                self.by_title_price.setdefault((title, price), row)
+
+    def add(self, row: dict) -> None:
+        """Index a row inserted during this run (duplicate links within one run)"""
+        self.rows.append(row)
+        self._index(row)
+
+    def find(self, vin: Optional[str], title: Optional[str], price) -> Optional[dict]:
+        """Existing row for an offer: by VIN when it has one, otherwise by title + price"""
+        if vin:
+            return self.by_vin.get(vin)
+        return self.by_title_price.get((normalize_title(title), normalize_price(price)))
+
+    def claim(self, vin: Optional[str], title: Optional[str], price) -> bool:
+        """Reserve an offer for insertion; False if another worker already did"""
+        key = ('vin', vin) if vin else ('title', normalize_title(title), normalize_price(price))
+        if key in self._claimed:
+            return False
+        self._claimed.add(key)
+        return True
+
+    def mark_active(self, vin: Optional[str], title: Optional[str]) -> None:
+        if vin:
+            self.active_vins.add(vin)
+        title = normalize_title(title)
+        if title:
+            self.active_titles.add(title)
+
+    def is_missing(self, row: dict) -> bool:
+        """Row no longer on the dealer profile (VIN if it has a real one, else title)"""
+        vin = row.get('vin')
+        if vin and len(vin) > 5:
+            return vin not in self.active_vins
+        title = normalize_title(row.get('naped'))
+        return bool(title) and title not in self.active_titles
@@ -0,0 +1,398 @@
+"""
+Pipelined Otomoto inventory sync (used by sync_otomoto_job).
+
+Stages run concurrently and never block the event loop:
+- pages:  dealer inventory pages are fetched in parallel; links are handed
+          to the offer stage page by page, as soon as each page arrives
+- offers: a fixed pool of workers fetches and parses offer pages
+- images: photos of new offers are streamed, deduplicated by content
+          hash and uploaded in parallel (see otomoto_images)
+
+The sync is incremental: offers whose dealer-page card is unchanged and
+whose fingerprint is recent are not fetched at all, the rest are fetched
+with conditional requests and parsed only when their content changed
+(see otomoto_fingerprints). Each run reports the delta.
+
+Blocking HTTP (the shared pooled client from http_client) and HTML
+parsing run in a dedicated thread pool, separate from the Supabase pool,
+so a sync never starves API traffic. Requests to the same host are spaced by a per-host
+minimum interval instead of the old fixed 2 s sleep after every offer.
+"""
+import asyncio
+import os
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+from urllib.parse import urlsplit
+
+from db import db_execute, db_select_all
+from html_dom import parse_html
+from http_client import HttpClient, get_http_client
+from image_store import ImageStore, listing_images
+from otomoto_extractor import OtomotoOffer, extract_offer
+from otomoto_fingerprints import FingerprintStore, content_hash
+from otomoto_images import IMAGE_CHUNK_SIZE, ImageIngestor, stream_to
+from otomoto_index import BusIndex
+
+DEALER_URL = "https://fhufranko.otomoto.pl/inventory"
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+OTOMOTO_MAX_PAGES = int(os.environ.get('OTOMOTO_MAX_PAGES', '3'))
+OTOMOTO_OFFER_CONCURRENCY = int(os.environ.get('OTOMOTO_OFFER_CONCURRENCY', '4'))
+OTOMOTO_IMAGE_CONCURRENCY = int(os.environ.get('OTOMOTO_IMAGE_CONCURRENCY', '8'))
+OTOMOTO_MAX_IMAGES = int(os.environ.get('OTOMOTO_MAX_IMAGES', '10'))
+# Minimalny odstęp (s) między startami zapytań do tego samego hosta
+OTOMOTO_HOST_INTERVAL = float(os.environ.get('OTOMOTO_HOST_INTERVAL', '0.25'))
+
+
+class HostRateLimiter:
+    """Spaces request starts to the same host by at least `interval` seconds.
+
+    Slots are reserved up front, so N concurrent callers for one host are
+    released at t, t+interval, t+2*interval... while other hosts proceed.
+    """
+
+    def __init__(self, interval: float, clock: Callable[[], float] = time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, url: str) -> None:
+        if self.interval <= 0:
+            return
+        host = urlsplit(url).netloc
+        now = self.clock()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class OfferResponse(NamedTuple):
+    status: int
+    html: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class HttpFetcher:
+    """Blocking HTTP used by the sync; every method runs in a worker thread.
+
+    All requests go through the process-wide pooled client, so connections
+    and the Cloudflare clearance survive between offers and between runs.
+    """
+
+    def __init__(self, client: Optional[HttpClient] = None):
+        self._client = client
+
+    @property
+    def client(self) -> HttpClient:
+        return self._client or get_http_client()
+
+    def fetch_page(self, url: str) -> bytes:
+        return self.client.get(url, headers=HEADERS, timeout=15).content
+
+    def fetch_offer(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> OfferResponse:
+        """GET an offer; with validators the server may answer 304 and an empty body"""
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        r = self.client.get(url, headers=headers, timeout=10, browser=True)
+        if r.status_code == 304:
+            return OfferResponse(304, '', etag, last_modified)
+        return OfferResponse(
+            r.status_code,
+            r.content.decode('utf-8', errors='ignore'),
+            r.headers.get('ETag'),
+            r.headers.get('Last-Modified'),
+        )
+
+    def download_image(self, url: str, out) -> str:
+        """Stream a photo into the binary file `out`; returns its content hash"""
+        with self.client.get(url, timeout=5, stream=True) as r:
+            r.raise_for_status()
+            return stream_to(r.iter_content(IMAGE_CHUNK_SIZE), out)
+
+
+def parse_dealer_cards(content, backend: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """Offer link -> hash of its listing card (title, price, parameters) on a dealer page"""
+    cards: Dict[str, Optional[str]] = {}
+    for href, card_text in parse_html(content, backend).links():
+        if '/oferta/' not in href or 'otomoto.pl' not in href:
+            continue
+        link = href.split('?')[0]
+        card_hash = content_hash(card_text) if card_text is not None else None
+        if cards.get(link) is None:
+            cards[link] = card_hash
+    return cards
+
+
+def parse_dealer_page(content) -> List[str]:
+    """Offer links on one dealer inventory page (query strings stripped)"""
+    return list(parse_dealer_cards(content))
+
+
+def offer_summary(offer: OtomotoOffer) -> dict:
+    """VIN, title and price used to match an offer against existing rows"""
+    return {"vin": offer.vin, "title": offer.title, "price": offer.cenaBrutto or 0}
+
+
+def offer_to_bus_fields(offer: OtomotoOffer) -> dict:
+    """Fields of a new `buses` row (without id, images and timestamps)"""
+    title = offer.title
+    return {
+        'marka': offer.marka or (title.split()[0] if title else "Inna"),
+        'model': offer.model or "Inny",
+        'rok': offer.rok or 2000,
+        'przebieg': offer.przebieg or 0,
+        'cenaBrutto': offer.cenaBrutto or 0,
+        'paliwo': offer.paliwo or "Diesel",
+        'skrzynia': offer.skrzynia or "Manualna",
+        'typNadwozia': offer.typNadwozia or "Furgon",
+        'moc': offer.moc or 0,
+        'kubatura': offer.kubatura or 0,
+        'kolor': offer.kolor or "Biały",
+        'opis': offer.opis or "Zaimportowano automatycznie.",
+        'vin': offer.vin,
+        'naped': title,
+    }
+
+
+class OtomotoSync:
+    """One sync run: scrape the dealer profile, insert new offers, retire missing ones"""
+
+    def __init__(
+        self,
+        supabase,
+        fetcher: Optional[HttpFetcher] = None,
+        dealer_url: str = DEALER_URL,
+        max_pages: int = OTOMOTO_MAX_PAGES,
+        offer_concurrency: int = OTOMOTO_OFFER_CONCURRENCY,
+        image_concurrency: int = OTOMOTO_IMAGE_CONCURRENCY,
+        max_images: int = OTOMOTO_MAX_IMAGES,
+        host_interval: float = OTOMOTO_HOST_INTERVAL,
+        fingerprints: Optional[FingerprintStore] = None,
+        record_variants: bool = False,
+        store: Optional[ImageStore] = None,
+    ):
+        self.supabase = supabase
+        self.fetcher = fetcher or HttpFetcher()
+        self.dealer_url = dealer_url
+        self.max_pages = max_pages
+        self.offer_concurrency = offer_concurrency
+        self.image_concurrency = image_concurrency
+        self.max_images = max_images
+        self.limiter = HostRateLimiter(host_interval)
+        self.fingerprints = fingerprints if fingerprints is not None else FingerprintStore()
+        self.index = BusIndex()
+        # record_variants: kolumna zdjeciaWarianty istnieje (sql/image_variants.sql)
+        self.record_variants = record_variants
+        self.store = store or ImageStore(supabase)
+        self.images = ImageIngestor(
+            supabase, self._download_image, image_concurrency, variants=record_variants, store=self.store,
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.report = {"pages": 0, "offers": 0, "new": 0, "failed": 0, "images": 0, "marked_sold": 0, "deleted": 0,
+                       "images_removed": 0,
+                       "delta": {"added": [], "changed": [], "removed": [], "unchanged": 0, "skipped": 0}}
+
+    async def _blocking(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _fetch(self, fn: Callable, url: str, *args):
+        await self.limiter.wait(url)
+        return await self._blocking(fn, url, *args)
+
+    async def _download_image(self, url: str, out) -> str:
+        return await self._fetch(self.fetcher.download_image, url, out)
+
+    async def run(self) -> dict:
+        started = time.monotonic()
+        workers = self.max_pages + self.offer_concurrency + self.image_concurrency
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="otomoto") as executor:
+            self._executor = executor
+            db_buses = await db_select_all(lambda: self.supabase.table('buses').select('*'))
+            self.index = BusIndex(db_buses)
+
+            links: asyncio.Queue = asyncio.Queue()
+            offer_workers = [
+                asyncio.create_task(self._offer_worker(links))
+                for _ in range(self.offer_concurrency)
+            ]
+            try:
+                seen = await self._discover(links)
+                for _ in offer_workers:
+                    links.put_nowait(None)
+                await asyncio.gather(*offer_workers)
+            finally:
+                for task in offer_workers:
+                    task.cancel()
+            self.report["delta"]["removed"] = self.fingerprints.prune(seen)
+            await self._blocking(self.fingerprints.save)
+
+            await self._reconcile(db_buses)
+            # Zdjęcia usuniętych ogłoszeń - jedno liczenie referencji, usuwanie partiami
+            self.report["images_removed"] = (await self.store.collect())["removed"]
+
+        self.report["seconds"] = round(time.monotonic() - started, 2)
+        delta = self.report["delta"]
+        print(f"[CRON] Synchronizacja zakończona w {self.report['seconds']} s: "
+              f"nowe {len(delta['added'])}, zmienione {len(delta['changed'])}, "
+              f"usunięte {len(delta['removed'])}, bez zmian {delta['unchanged'] + delta['skipped']}, "
+              f"dodane do bazy {self.report['new']}, oznaczone jako sprzedane {self.report['marked_sold']}")
+        return self.report
+
+    async def _discover(self, links: asyncio.Queue) -> Set[str]:
+        """Fetch dealer pages in parallel; stop at the first empty page, like the serial loop did"""
+        urls = [f"{self.dealer_url}?page={page}" for page in range(1, self.max_pages + 1)]
+        tasks = [asyncio.create_task(self._fetch_dealer_page(url)) for url in urls]
+        seen: Set[str] = set()
+        try:
+            for task in tasks:
+                cards = await task
+                if not cards:
+                    break
+                self.report["pages"] += 1
+                for link, card_hash in cards.items():
+                    if link not in seen:
+                        seen.add(link)
+                        links.put_nowait((link, card_hash))
+        finally:
+            for task in tasks:
+                task.cancel()
+        print(f"[CRON] Znaleziono {len(seen)} aktywnych linków na profilu Otomoto.")
+        return seen
+
+    async def _fetch_dealer_page(self, url: str) -> Dict[str, Optional[str]]:
+        content = await self._fetch(self.fetcher.fetch_page, url)
+        return await self._blocking(parse_dealer_cards, content)
+
+    async def _offer_worker(self, links: asyncio.Queue) -> None:
+        while True:
+            item = await links.get()
+            if item is None:
+                return
+            link, card_hash = item
+            self.report["offers"] += 1
+            try:
+                await self._process_offer(link, card_hash)
+            except Exception as e:
+                self.report["failed"] += 1
+                # Znana oferta, której nie udało się pobrać, nadal jest aktywna
+                self._mark_active(self.fingerprints.get(link))
+                print(f"[CRON] Błąd przy analizie oferty: {e}")
+                traceback.print_exc()
+
+    def _mark_active(self, summary: Optional[dict]) -> None:
+        if summary:
+            self.index.mark_active(summary.get("vin"), summary.get("title"))
+
+    def _exists(self, summary: dict) -> bool:
+        return self.index.find(summary.get("vin"), summary.get("title"), summary.get("price")) is not None
+
+    async def _process_offer(self, link: str, card_hash: Optional[str]) -> None:
+        delta = self.report["delta"]
+        known = self.fingerprints.get(link)
+
+        # Karta bez zmian, świeży odcisk i auto jest w bazie - nie pobieramy oferty
+        if known and self.fingerprints.is_fresh(link, card_hash) and self._exists(known):
+            self.fingerprints.touch(link)
+            self._mark_active(known)
+            delta["skipped"] += 1
+            return
+
+        await self.limiter.wait(link)
+        validators = (known.get('etag'), known.get('last_modified')) if known else (None, None)
+        response = await self._blocking(self.fetcher.fetch_offer, link, *validators)
+        if response.status >= 400:
+            raise RuntimeError(f"HTTP {response.status} dla {link}")
+        fetched_at = datetime.now(timezone.utc).isoformat()
+
+        offer: Optional[OtomotoOffer] = None
+        html_hash = content_hash(response.html) if response.status != 304 else None
+        if known and (response.status == 304 or html_hash == known.get('content_hash')):
+            summary = known
+            delta["unchanged"] += 1
+        else:
+            offer = await self._blocking(extract_offer, response.html)
+            summary = offer_summary(offer)
+            (delta["changed"] if known else delta["added"]).append(link)
+
+        self.fingerprints.put(
+            link,
+            vin=summary.get("vin"),
+            title=summary.get("title"),
+            price=summary.get("price"),
+            content_hash=html_hash or known.get('content_hash'),
+            card_hash=card_hash,
+            etag=response.etag,
+            last_modified=response.last_modified,
+            last_seen=fetched_at,
+            last_fetched=fetched_at,
+        )
+        self._mark_active(summary)
+        if self._exists(summary) or not self.index.claim(summary.get("vin"), summary.get("title"), summary.get("price")):
+            return
+
+        if offer is None:
+            if response.status == 304:
+                # Auto usunięte z bazy, a serwer odpowiedział 304 - potrzebna pełna treść
+                response = await self._fetch(self.fetcher.fetch_offer, link)
+            offer = await self._blocking(extract_offer, response.html)
+
+        print(f"[CRON] Znaleziono nowe auto: {offer.title}. Pobieram z Otomoto i dodaję do bazy Supabase...")
+        details = offer_to_bus_fields(offer)
+        uploaded_urls = await self.images.ingest(offer.zdjecia[:self.max_images])
+        self.report["images"] += len(uploaded_urls)
+
+        bus_dict = {
+            'id': str(uuid.uuid4()),
+            'numerOgloszenia': f"FKBUS{str(uuid.uuid4().int)[:6]}",
+            **details,
+            'zdjecia': uploaded_urls,
+            'zdjecieGlowne': uploaded_urls[0] if uploaded_urls else None,
+            'miasto': 'Smyków',
+            'status': 'aktywne',
+            'dataPublikacji': datetime.now(timezone.utc).isoformat(),
+            'normaEmisji': 'Euro 6',
+            'dmcKategoria': 'do 3.5t',
+            'ladownosc': 1000,
+            'vat': True
+        }
+        if self.record_variants:
+            bus_dict['zdjeciaWarianty'] = self.images.variants_for(uploaded_urls)
+        await db_execute(self.supabase.table('buses').insert(bus_dict))
+        self.index.add(bus_dict)
+        self.report["new"] += 1
+
+    async def _reconcile(self, db_buses) -> None:
+        """Oznacz jako sprzedane i usuwaj trwale stare ogłoszenia"""
+        for bus in db_buses:
+            if bus.get('status') == 'sprzedane':
+                if bus.get('data_sprzedazy'):
+                    try:
+                        dt_str = bus['data_sprzedazy'].replace('Z', '+00:00')
+                        sell_date = datetime.fromisoformat(dt_str)
+                        if datetime.now(timezone.utc) - sell_date > timedelta(days=5):
+                            print(f"[CRON] Auto {bus['id']} ma status sprzedanego powyżej 5 dni. Usuwam trwale.")
+                            await db_execute(self.supabase.table('buses').delete().eq('id', bus['id']))
+                            self.report["deleted"] += 1
+                            self.store.release(listing_images(bus), schedule=False)
+                    except Exception:
+                        pass
+            else:
+                if self.index.active_vins and self.index.is_missing(bus):
+                    print(f"[CRON] Auto zniknęło z profilu dealera na Otomoto. Oznaczam auto z bazy ({bus.get('id')}) jako sprzedane.")
+                    await db_execute(self.supabase.table('buses').update({
+                        'status': 'sprzedane',
+                        'sold': True,
+                        'gwarancja': True,
+                        'data_sprzedazy': datetime.now(timezone.utc).isoformat()
+                    }).eq('id', bus['id']))
+                    self.report["marked_sold"] += 1
@@ -1,32 +1,51 @@
-from datetime import datetime, timedelta, timezone
-import re as regex_cron
+from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import asyncio
-import requests
 import traceback
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Request, Depends
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, FileResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Form, Request, Depends, Query
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import HTTPConnection
 from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
 from pathlib import Path
-from datetime import datetime, date
 import os
 import hmac
 import hashlib
 import logging
 import uuid
 import jwt
-import cloudscraper
-from bs4 import BeautifulSoup
-import re
 from supabase import create_client, Client
 
 # Import new listing models
 from listing_models import Listing, ListingCreate, ListingUpdate, FuelType, GearboxType, ConditionStatus
+from db import MISSING_COLUMN_CODES, MISSING_FUNCTION_CODES, db_execute, db_select_all, error_code, shutdown_db_pool
+from listing_cache import listing_cache, list_key, listing_key, invalidate_listings
+from token_cache import TokenCache
+from http_cache import RenderedJSON, conditional_response
+from listing_stats import STATS_COLUMNS, aggregate_stats
+from listing_facets import FACET_COLUMNS, FacetIndex, facet_index
+from listing_mapping import (
+    LISTING_VIEWS, map_bus_db_to_listing, map_buses_db_to_listings,
+    get_listing_mapper, listing_select_columns
+)
+from http_client import close_http_client, get_http_client
+from upload_stream import SpooledUpload, UploadError, multipart_openapi, parse_uploads
+from image_variants import photo_variants_for, shutdown_image_pool, store_variants
+from image_store import ImageStore, content_path, listing_images
+from storage_gc import STORAGE_GC_DRY_RUN, STORAGE_GC_INTERVAL_HOURS, StorageSweep
+from storage import STORAGE_BACKEND, LocalFiles, LocalStorage
+from storage_migration import STORAGE_MIGRATE_INTERVAL_MINUTES, migrate_local_photos
+from bulk_upload import NDJSON, BulkUpload, ndjson_events
+from otomoto_extractor import extract_offer, offer_form_data
+from otomoto_sync import OtomotoSync
+from listing_query import (
+    ListingQuery, listing_query_params, apply_listing_query,
+    matches_listing_query, query_listings_in_memory, build_page
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -50,6 +69,17 @@ def _sign(value: str) -> str:
     ).hexdigest()
 
 
+# Wartość ciasteczka sesji admina liczona raz, porównywana w stałym czasie
+ADMIN_COOKIE_VALUE = _sign("ok").encode()
+
+
+def is_admin_cookie(token: Optional[str]) -> bool:
+    """Constant-time check of the admin session cookie"""
+    if not token:
+        return False
+    return hmac.compare_digest(token.encode(), ADMIN_COOKIE_VALUE)
+
+
 # Supabase client (database + storage)
 supabase_url = os.environ.get('SUPABASE_URL')
 supabase_key = os.environ.get('SUPABASE_ANON_KEY')
@@ -87,7 +117,7 @@ MOCK_OPINIONS = []
 # --- AUTH START ---
 oauth2_scheme = HTTPBearer(auto_error=False)
 JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET', '')
-ADMIN_EMAILS = set(
+ADMIN_EMAILS = frozenset(
     e.strip().lower() for e in os.environ.get('ADMIN_EMAILS', '').split(',') if e.strip()
 )
 
@@ -110,21 +140,30 @@ def verify_supabase_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
 
+def _jwt_user(token: str) -> dict:
+    """Verified claims with the admin decision made once per token"""
+    payload = verify_supabase_token(token)
+    email = (payload.get('email') or '').lower()
+    return {**payload, "auth_method": "jwt", "admin": email in ADMIN_EMAILS}
+
+
+# Zweryfikowane tokeny trzymane do ich `exp` (bez ponownego jwt.decode)
+jwt_users = TokenCache(_jwt_user)
+
+
 async def get_current_user_optional(
     request: Request,
     creds: HTTPAuthorizationCredentials = Depends(oauth2_scheme)
 ):
     """Get current user from JWT or cookie session"""
     # Try cookie first (password-based admin access)
-    cookie_token = request.cookies.get(ADMIN_COOKIE_NAME)
-    if cookie_token == _sign("ok"):
+    if is_admin_cookie(request.cookies.get(ADMIN_COOKIE_NAME)):
         return {"email": "admin@cookie", "auth_method": "cookie", "admin": True}
 
     # Try JWT token
     if creds and JWT_SECRET:
         try:
-            payload = verify_supabase_token(creds.credentials)
-            return {**payload, "auth_method": "jwt"}
+            return dict(jwt_users.verify(creds.credentials))
         except BaseException:
             pass
 
@@ -142,8 +181,8 @@ def admin_required(user: Optional[dict] = Depends(get_current_user_optional)):
 
     # JWT-based access requires email in whitelist
     if user.get("auth_method") == "jwt":
-        email = (user.get('email') or '').lower()
-        if email not in ADMIN_EMAILS:
+        if not user.get("admin"):
+            email = (user.get('email') or '').lower()
             raise HTTPException(
                 status_code=403,
                 detail=f"Admin access required. Email '{email}' is not in admin list."
@@ -160,31 +199,29 @@ app = FastAPI()
 # Admin Panel Guard Middleware for API routes
 
 
-@app.middleware("http")
-async def _admin_guard(request: Request, call_next):
-    """Protect /api/admin* routes"""
-    # Przepuszczanie wstępnych zapytań (OPTIONS) z przeglądarki klienta
-    if request.method == "OPTIONS":
-        return await call_next(request)
+class AdminGuard:
+    """Protect /api/admin* routes (pure ASGI; other requests pass straight through)"""
 
-    path = request.url.path
+    def __init__(self, app):
+        self.app = app
 
-    if path.startswith("/api/admin"):
-        # Check cookie
-        token = request.cookies.get(ADMIN_COOKIE_NAME)
-        if token == _sign("ok"):
-            return await call_next(request)
+    async def __call__(self, scope, receive, send):
+        # Przepuszczanie wstępnych zapytań (OPTIONS) z przeglądarki klienta
+        if (scope["type"] != "http" or scope["method"] == "OPTIONS"
+                or not scope["path"].startswith("/api/admin")):
+            await self.app(scope, receive, send)
+            return
 
-        # Check Authorization header (JWT)
-        auth_header = request.headers.get("Authorization")
-        if auth_header and auth_header.startswith("Bearer "):
-            # Let the dependency handle JWT validation
-            pass
-        else:
-            return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+        connection = HTTPConnection(scope)
+        # Check cookie, then Authorization header (JWT validated by the dependency)
+        if (is_admin_cookie(connection.cookies.get(ADMIN_COOKIE_NAME))
+                or connection.headers.get("Authorization", "").startswith("Bearer ")):
+            await self.app(scope, receive, send)
+            return
+        await JSONResponse(status_code=401, content={"detail": "Unauthorized"})(scope, receive, send)
 
-    response = await call_next(request)
-    return response
+
+app.add_middleware(AdminGuard)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -255,6 +292,8 @@ def map_listing_to_bus_db(listing_data: dict) -> dict:
         'opis': listing_data.get('description_html'),
         'zdjecia': listing_data.get('zdjecia', []),
         'zdjecieGlowne': listing_data.get('zdjecieGlowne') or (listing_data.get('zdjecia')[0] if listing_data.get('zdjecia') else None),
+        # Tylko warianty zdjęć obecnych w ogłoszeniu; brak klucza = bez zmian przy aktualizacji
+        'zdjeciaWarianty': photo_variants_for(listing_data['zdjeciaWarianty'], listing_data.get('zdjecia')) if 'zdjeciaWarianty' in listing_data else None,
 
         'wyrozniowane': listing_data.get('wyrozniowane', False),
         'nowosc': listing_data.get('nowosc', False),
@@ -286,58 +325,6 @@ def map_listing_to_bus_db(listing_data: dict) -> dict:
     return {k: v for k, v in bus_data.items() if v is not None}
 
 
-def map_bus_db_to_listing(bus_data: dict) -> dict:
-    """Map database fields to new listing model while preserving legacy frontend keys"""
-    result = dict(bus_data)
-
-    result['cenaBrutto'] = bus_data.get('cenaBrutto') or bus_data.get('price_pln')
-    result['rok'] = bus_data.get('rok') or bus_data.get('production_year')
-    result['przebieg'] = bus_data.get('przebieg') or bus_data.get('mileage_km')
-    result['marka'] = bus_data.get('marka') or bus_data.get('make')
-    result['paliwo'] = bus_data.get('paliwo') or bus_data.get('fuel_type')
-    result['skrzynia'] = bus_data.get('skrzynia') or bus_data.get('gearbox')
-    result['moc'] = bus_data.get('moc') or bus_data.get('power_hp')
-    result['kubatura'] = bus_data.get('kubatura') or bus_data.get('engine_displacement_cc')
-    result['typNadwozia'] = bus_data.get('typNadwozia') or bus_data.get('body_type')
-    result['opis'] = bus_data.get('opis') or bus_data.get('description_html')
-
-    result['zdjecia'] = bus_data.get('zdjecia') or []
-    result['wyposazenie'] = bus_data.get('wyposazenie') or {}
-
-    result['title'] = bus_data.get('title') or f"{result.get('marka', '')} {bus_data.get('model', '')}".strip()
-    result['price_pln'] = result['cenaBrutto']
-    result['make'] = result['marka']
-    result['production_year'] = result['rok']
-    result['mileage_km'] = result['przebieg']
-    result['fuel_type'] = result['paliwo']
-    result['gearbox'] = result['skrzynia']
-    result['power_hp'] = result['moc']
-    result['engine_displacement_cc'] = result['kubatura']
-    result['body_type'] = result['typNadwozia']
-    result['description_html'] = result['opis']
-
-    result['color'] = bus_data.get('kolor') or bus_data.get('color')
-    result['seats'] = bus_data.get('liczbaMiejsc') or bus_data.get('seats')
-    result['gvw_kg'] = bus_data.get('dmc') or bus_data.get('gvw_kg')
-    result['origin_country'] = bus_data.get('krajPochodzenia') or bus_data.get('origin_country')
-    result['condition_status'] = bus_data.get('stan') or bus_data.get('condition_status') or 'Używany'
-
-    is_sold = bus_data.get("sold") or bus_data.get("gwarancja") or (bus_data.get("status") == "sprzedane") or False
-    is_reserved = bus_data.get("reserved") or bus_data.get("hak") or False
-
-    result["sold"] = is_sold
-    result["isSold"] = is_sold
-    result["reserved"] = is_reserved
-    result["isReserved"] = is_reserved
-
-    # DODANE MAPOWANIE YOUTUBE DO FRONTENDU
-    yt_link = bus_data.get('youtube_url') or bus_data.get('youtubeUrl') or bus_data.get('video')
-    result['video'] = yt_link
-    result['youtube_url'] = yt_link
-    result['youtubeUrl'] = yt_link
-
-    return result
-
 # --- API ENDPOINTS ---
 
 
@@ -364,7 +351,7 @@ async def login(request: Request, login_data: AdminLoginRequest):
     # Set secure cookie
     response.set_cookie(
         key=ADMIN_COOKIE_NAME,
-        value=_sign("ok"),
+        value=ADMIN_COOKIE_VALUE.decode(),
         httponly=True,
         secure=True,
         samesite="lax",
@@ -392,31 +379,149 @@ async def check_auth(user: Optional[dict] = Depends(get_current_user_optional)):
 
 
 @api_router.get("/ogloszenia")
-async def get_all_listings():
-    """Get all listings (public)"""
+async def get_all_listings(
+    request: Request,
+    query: ListingQuery = Depends(listing_query_params),
+    compact: bool = False,
+    view: str = Query('full', pattern='^(' + '|'.join(LISTING_VIEWS) + ')$'),
+):
+    """Get all listings (public).
+
+    Without query parameters returns the full list (legacy behaviour).
+    With filters / sortBy / limit / cursor returns one page:
+    {"items", "next_cursor", "limit", "sortBy", "total"}.
+    `compact=true` returns each listing without English / alias keys.
+    `view=card` selects only the columns CarCard needs (no opis / zdjecia).
+    Supports If-None-Match / If-Modified-Since (304).
+    """
+    if not query.is_bare():
+        return conditional_response(request, await search_listings(query, compact, view))
+
+    if not supabase:
+        listings = map_buses_db_to_listings(MOCK_BUSES, compact, view)
+        return conditional_response(request, RenderedJSON(listings, listing_cache.modified_at))
+
+    key = list_key('all', compact, view)
+    cached = listing_cache.get(key)
+    if cached is not None:
+        return conditional_response(request, cached)
+
+    generation, modified_at = listing_cache.generation, listing_cache.modified_at
+    if view == 'card':
+        columns = listing_select_columns(view, extra=await _card_extra_columns())
+        builder = supabase.table('buses').select(columns).order('dataPublikacji', desc=True)
+        listings = map_buses_db_to_listings((await db_execute(builder)).data, view=view)
+    else:
+        response = await db_execute(supabase.table('buses').select('*'))
+        listings = map_buses_db_to_listings(response.data, compact)
+        # Sort by created_at desc
+        listings.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    rendered = RenderedJSON(listings, modified_at)
+    listing_cache.set(key, rendered, generation)
+    return conditional_response(request, rendered)
+
+
+async def search_listings(query: ListingQuery, compact: bool = False, view: str = 'full') -> RenderedJSON:
+    """Filtered, sorted, cursor-paginated listing page (predicates run in the database)"""
+    mapper = get_listing_mapper(compact, view)
+    try:
+        if not supabase:
+            rows = query_listings_in_memory(MOCK_BUSES, query)
+            total = None if query.cursor else sum(1 for b in MOCK_BUSES if matches_listing_query(b, query))
+            return RenderedJSON(build_page(rows, query, mapper, total), listing_cache.modified_at)
+
+        key = list_key('search', compact, view, query.model_dump_json(exclude_none=True))
+        cached = listing_cache.get(key)
+        if cached is not None:
+            return cached
+
+        generation, modified_at = listing_cache.generation, listing_cache.modified_at
+        # Licznik wyników tylko dla pierwszej strony - kolejne strony go nie potrzebują
+        count = None if query.cursor else 'exact'
+        columns = listing_select_columns(view, extra=(query.sort_column, *await _card_extra_columns()))
+        builder = supabase.table('buses').select(columns, count=count)
+        response = await db_execute(apply_listing_query(builder, query))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rendered = RenderedJSON(build_page(response.data or [], query, mapper, response.count), modified_at)
+    listing_cache.set(key, rendered, generation)
+    return rendered
+
+
+@api_router.get("/ogloszenia/facets")
+async def get_listing_facets(request: Request, query: ListingQuery = Depends(listing_query_params)):
+    """Value counts and min/max ranges for SearchForm, respecting the applied filters"""
     if not supabase:
-        return [map_bus_db_to_listing(bus) for bus in MOCK_BUSES]
+        index = FacetIndex()
+        index.load(MOCK_BUSES)
+        return conditional_response(request, RenderedJSON(index.compute(query), listing_cache.modified_at))
 
-    response = supabase.table('buses').select('*').execute()
-    listings = [map_bus_db_to_listing(bus) for bus in response.data]
-    # Sort by created_at desc
-    listings.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-    return listings
+    key = list_key('facets', query.model_dump_json(exclude_none=True, exclude={'sortBy', 'limit', 'cursor'}))
+    cached = listing_cache.get(key)
+    if cached is not None:
+        return conditional_response(request, cached)
+
+    generation, modified_at = listing_cache.generation, listing_cache.modified_at
+    await ensure_facet_index()
+    rendered = RenderedJSON(facet_index.compute(query), modified_at)
+    listing_cache.set(key, rendered, generation)
+    return conditional_response(request, rendered)
+
+
+_facet_load_lock = asyncio.Lock()
+
+
+async def ensure_facet_index() -> None:
+    """Load the facet index once; later writes update it row by row"""
+    async with _facet_load_lock:
+        # Ponawiamy, jeśli w trakcie pobierania admin zmienił jakieś ogłoszenie
+        for attempt in range(3):
+            if facet_index.loaded:
+                return
+            generation = facet_index.generation if attempt < 2 else None
+            rows = await db_select_all(lambda: supabase.table('buses').select(','.join(FACET_COLUMNS)))
+            facet_index.load(rows, generation)
 
 
 @api_router.get("/ogloszenia/{listing_id}")
-async def get_listing_by_id(listing_id: str):
-    """Get single listing (public)"""
+async def get_listing_by_id(request: Request, listing_id: str, compact: bool = False):
+    """Get single listing (public). Supports If-None-Match / If-Modified-Since (304)."""
+    mapper = get_listing_mapper(compact)
     if not supabase:
         bus = next((b for b in MOCK_BUSES if b['id'] == listing_id), None)
         if not bus:
             raise HTTPException(status_code=404, detail="Listing not found")
-        return map_bus_db_to_listing(bus)
+        return conditional_response(request, RenderedJSON(mapper(bus), listing_cache.modified_at))
+
+    cached = listing_cache.get(listing_key(listing_id, compact))
+    if cached is not None:
+        return conditional_response(request, cached)
 
-    response = supabase.table('buses').select('*').eq('id', listing_id).execute()
+    generation, modified_at = listing_cache.generation, listing_cache.modified_at
+    response = await db_execute(supabase.table('buses').select('*').eq('id', listing_id))
     if not response.data:
         raise HTTPException(status_code=404, detail="Listing not found")
-    return map_bus_db_to_listing(response.data[0])
+    rendered = RenderedJSON(mapper(response.data[0]), modified_at)
+    listing_cache.set(listing_key(listing_id, compact), rendered, generation)
+    return conditional_response(request, rendered)
+
+
+async def listing_changed(listing_id: str) -> None:
+    """Refresh the facet index row and drop cached reads after an admin write"""
+    if supabase and facet_index.loaded:
+        try:
+            response = await db_execute(
+                supabase.table('buses').select(','.join(FACET_COLUMNS)).eq('id', listing_id)
+            )
+            if response.data:
+                facet_index.upsert(response.data[0])
+            else:
+                facet_index.remove(listing_id)
+        except Exception as e:
+            logging.warning(f"Facet index refresh failed, full reload scheduled: {e}")
+            facet_index.reset()
+    invalidate_listings(listing_id)
 
 # Admin Listing Endpoints
 
@@ -460,7 +565,8 @@ async def create_listing(listing_data: ListingCreate):
             if bus_dict.get(k) is None:
                 bus_dict[k] = v
 
-        response = supabase.table('buses').insert(bus_dict).execute()
+        response = await db_execute(supabase.table('buses').insert(await _without_missing_columns(bus_dict)))
+        await listing_changed(bus_id)
 
         return {
             "success": True,
@@ -477,7 +583,7 @@ async def update_listing(listing_id: str, listing_update: ListingUpdate):
     """Update listing"""
     try:
         # Check existence
-        response = supabase.table('buses').select('*').eq('id', listing_id).execute()
+        response = await db_execute(supabase.table('buses').select('*').eq('id', listing_id))
         if not response.data:
             raise HTTPException(status_code=404, detail="Listing not found")
 
@@ -485,8 +591,9 @@ async def update_listing(listing_id: str, listing_update: ListingUpdate):
         update_dict = {k: v for k, v in listing_update.dict().items() if v is not None}
 
         if update_dict:
-            bus_update = map_listing_to_bus_db(update_dict)
-            response = supabase.table('buses').update(bus_update).eq('id', listing_id).execute()
+            bus_update = await _without_missing_columns(map_listing_to_bus_db(update_dict))
+            response = await db_execute(supabase.table('buses').update(bus_update).eq('id', listing_id))
+            await listing_changed(listing_id)
 
             if not response.data:
                 raise HTTPException(status_code=500, detail="Database update failed")
@@ -508,113 +615,102 @@ async def update_listing(listing_id: str, listing_update: ListingUpdate):
 async def delete_listing(listing_id: str):
     """Delete listing and its images"""
     # Najpierw pobieramy dane, aby wiedzieć jakie zdjęcia usunąć z chmury
-    listing = supabase.table('buses').select('zdjecia, zdjecieGlowne').eq('id', listing_id).execute()
+    listing = await db_execute(supabase.table('buses').select('zdjecia, zdjecieGlowne').eq('id', listing_id))
 
     # 1. Usuwamy wpis z bazy danych
-    response = supabase.table('buses').delete().eq('id', listing_id).execute()
+    response = await db_execute(supabase.table('buses').delete().eq('id', listing_id))
+    await listing_changed(listing_id)
 
     if not response.data:
         raise HTTPException(status_code=404, detail="Listing not found")
 
-    # 2. Próbujemy usunąć zdjęcia z Supabase Storage (optymalizacja miejsca)
-    try:
-        if listing.data:
-            bus = listing.data[0]
-            images = bus.get('zdjecia', []) or []
-            main_image = bus.get('zdjecieGlowne')
-            if main_image and main_image not in images:
-                images.append(main_image)
-
-            paths_to_delete = []
-            for img_url in images:
-                if img_url and "Client.co" in img_url and "/buses/" in img_url:
-                    # Wyciągamy samą nazwę pliku po ostatnim ukośniku
-                    filename = img_url.split('/')[-1]
-                    paths_to_delete.append(f"buses/{filename}")
-
-            if paths_to_delete:
-                supabase.storage.from_("buses").remove(paths_to_delete)
-    except Exception as e:
-        logging.warning(f"Nie udało się usunąć zdjęć z chmury: {e}")
+    # 2. Zdjęcia usuwa w tle image_store - tylko te, których nie używa inne ogłoszenie
+    if listing.data:
+        image_store().release(listing_images(listing.data[0]))
 
     return {"success": True, "message": "Ogłoszenie i zdjęcia usunięte"}
 
 # Upload Image
 
+_image_store: Optional[ImageStore] = None
 
-@api_router.post("/upload", dependencies=[Depends(admin_required)])
-async def upload_image(file: UploadFile = File(...)):
-    """Upload image to Supabase or local"""
-    try:
-        contents = await file.read()
-        ext = file.filename.split('.')[-1]
-        filename = f"{uuid.uuid4()}.{ext}"
 
-        # Try Supabase
+def image_store() -> ImageStore:
+    """Photo store for the current Supabase client"""
+    global _image_store
+    if _image_store is None or _image_store.supabase is not supabase:
+        _image_store = ImageStore(supabase, UPLOADS_DIR)
+    return _image_store
+
+
+async def _store_upload(upload: SpooledUpload) -> dict:
+    """Save an accepted upload under its content hash with its variants.
+
+    Supabase Storage first, the local disk store when the bucket fails
+    (or only the local store with STORAGE_BACKEND=local).
+    """
+    store = image_store()
+    path = content_path(upload.digest, upload.ext)
+    error = None
+    for provider in store.upload_providers():
         try:
-            path = f"buses/{filename}"
-            supabase.storage.from_("buses").upload(path, contents, file_options={"content-type": file.content_type})
-            public_url = supabase.storage.from_("buses").get_public_url(path)
-            return {"success": True, "url": public_url}
+            url = await provider.put(path, upload, upload.content_type)
+            break
         except Exception as e:
-            logging.warning(f"Supabase upload failed, falling back to local: {e}")
+            logging.warning(f"Zapis zdjęcia ({provider.location}) nie powiódł się: {e}")
+            error = e
+    else:
+        raise error or RuntimeError("Brak skonfigurowanego magazynu zdjęć")
+    store.claim(provider.location, path)
 
-        # Local fallback
-        local_path = UPLOADS_DIR / "buses"
-        local_path.mkdir(parents=True, exist_ok=True)
-        with open(local_path / filename, "wb") as f:
-            f.write(contents)
-        return {"success": True, "url": f"/uploads/buses/{filename}"}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    data = await asyncio.to_thread(upload.read)
+    return {"url": url, "variants": await store_variants(data, path, provider.put)}
 
 
-@api_router.post("/upload-bulk", dependencies=[Depends(admin_required)])
-async def upload_images_bulk(files: List[UploadFile] = File(...)):
-    """Upload multiple images to Supabase Storage in one request"""
-    uploaded_urls = []
-    errors = []
+async def _parse_uploads(request: Request) -> List[SpooledUpload]:
+    try:
+        return await parse_uploads(request)
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=f"Nieprawidłowy upload: {e}")
 
-    MAX_FILE_SIZE = 10 * 1024 * 1024
-    ALLOWED_TYPES = ["image/jpeg", "image/png", "image/webp", "image/avif"]
 
-    for file in files:
+@api_router.post("/upload", dependencies=[Depends(admin_required)], openapi_extra=multipart_openapi('file'))
+async def upload_image(request: Request):
+    """Upload image to Supabase or local"""
+    uploads = await _parse_uploads(request)
+    try:
+        upload = next((u for u in uploads if u.field == 'file'), None)
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Brak pliku w polu 'file'")
+        if not upload.ok:
+            status = 413 if upload.size > upload.max_size else 415
+            raise HTTPException(status_code=status, detail=f"{upload.filename}: {upload.error or 'Niekompletny plik'}")
         try:
-            if file.content_type not in ALLOWED_TYPES:
-                errors.append(f"{file.filename}: Niewłaściwy format (Tylko JPG/PNG/WEBP/AVIF)")
-                continue
-
-            contents = await file.read()
-
-            if len(contents) > MAX_FILE_SIZE:
-                errors.append(f"{file.filename}: Plik za duży (Max 10MB)")
-                continue
-
-            ext = file.filename.split('.')[-1].lower()
-            unique_filename = f"{uuid.uuid4()}.{ext}"
-
-            try:
-                path = f"buses/{unique_filename}"
-                supabase.storage.from_("buses").upload(path, contents, file_options={"content-type": file.content_type})
-                public_url = supabase.storage.from_("buses").get_public_url(path)
-                uploaded_urls.append(public_url)
-            except Exception as supabase_error:
-                logging.warning(f"Supabase upload failed, using local fallback: {supabase_error}")
-                local_path = UPLOADS_DIR / "buses"
-                local_path.mkdir(parents=True, exist_ok=True)
-                with open(local_path / unique_filename, "wb") as local_f:
-                    local_f.write(contents)
-                uploaded_urls.append(f"/uploads/buses/{unique_filename}")
-
+            return {"success": True, **await _store_upload(upload)}
         except Exception as e:
-            errors.append(f"{file.filename}: Błąd uploadu ({str(e)})")
+            raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    finally:
+        for u in uploads:
+            u.close()
 
-    return {
-        "success": True if len(uploaded_urls) > 0 else False,
-        "urls": uploaded_urls,
-        "errors": errors
-    }
+
+@api_router.post("/upload-bulk", dependencies=[Depends(admin_required)], openapi_extra=multipart_openapi('files', many=True))
+async def upload_images_bulk(request: Request, stream: bool = Query(False)):
+    """Upload multiple images to Supabase Storage in one request.
+
+    Files are stored concurrently while the body is still arriving. With
+    ?stream=true (or Accept: application/x-ndjson) progress events are
+    streamed as NDJSON; otherwise only the final summary is returned.
+    """
+    bulk = BulkUpload(request, _store_upload)
+    try:
+        await bulk.receive()
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=f"Nieprawidłowy upload: {e}")
+
+    if stream or NDJSON in request.headers.get('accept', ''):
+        return StreamingResponse(ndjson_events(bulk.events()), media_type=NDJSON)
+    return await bulk.summary()
 
 # Otomoto Scraper
 
@@ -622,17 +718,15 @@ async def upload_images_bulk(files: List[UploadFile] = File(...)):
 @api_router.post("/scrape-otomoto", dependencies=[Depends(admin_required)])
 async def scrape_otomoto_endpoint(request: OtomotoScrapeRequest):
     """Otomoto Scraper - Ostateczny Fix na Kodowanie (Czysty tekst + UTF-8)"""
-    import json
-    import re
     try:
         url = request.url.strip()
+        # User-Agent ustala współdzielona sesja przeglądarkowa (musi pasować do ciasteczka Cloudflare)
         headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
             "Accept-Language": "pl-PL,pl;q=0.9",
         }
 
-        response = requests.get(url, headers=headers, timeout=15)
+        response = await asyncio.to_thread(get_http_client().get, url, headers=headers, timeout=15, browser=True)
 
         if response.status_code in [403, 401, 429]:
             raise Exception("Otomoto zablokowało zapytanie (Ochrona Cloudflare).")
@@ -641,155 +735,8 @@ async def scrape_otomoto_endpoint(request: OtomotoScrapeRequest):
 
         # Wymuszamy czytanie surowych bajtów jako UTF-8
         html = response.content.decode('utf-8', errors='ignore')
-        soup = BeautifulSoup(html, "html.parser")
-        data = {}
-
-        def extract_value(key, label):
-            m = re.search(r'"key"[\s:]*"' + key + r'"[^}]*?"displayValue"[\s:]*"([^"]+)"', html)
-            if m:
-                return m.group(1)
-            m = re.search(r'"key"[\s:]*"' + key + r'"[^}]*?"value"[\s:]*"([^"]+)"', html)
-            if m:
-                return m.group(1)
-            m = re.search(r'"label"[\s:]*"' + label + r'"[^}]*?"value"[\s:]*"([^"]+)"', html)
-            if m:
-                return m.group(1)
-            m2 = re.search(label + r'[^>]*?>([a-zA-Z0-9\sęóąśłżźćńĘÓĄŚŁŻŹĆŃ]+)<', html)
-            if m2:
-                val = m2.group(1).strip()
-                if len(val) < 40 and val != label:
-                    return val
-            return None
-
-        data["rok"] = extract_value("year", "Rok produkcji")
-        data["przebieg"] = extract_value("mileage", "Przebieg")
-        data["moc"] = extract_value("engine_power", "Moc")
-        data["kubatura"] = extract_value("engine_capacity", "Pojemność skokowa")
-        data["vin"] = extract_value("vin", "VIN")
-        
-        if data.get("vin") and ("Zgadzam" in str(data["vin"]) or len(str(data["vin"])) > 20):
-            data["vin"] = ""
-            
-        for div in soup.find_all('div', attrs={"data-testid": "advert-details-item"}):
-            p_tags = div.find_all('p')
-            if len(p_tags) >= 2 and "VIN" in p_tags[0].text:
-                data["vin"] = p_tags[1].text.strip()
-
-        data["marka"] = extract_value("make", "Marka pojazdu")
-        data["model"] = extract_value("model", "Model pojazdu")
-        data["wersja"] = extract_value("version", "Wersja")
-        data["paliwo"] = extract_value("fuel_type", "Rodzaj paliwa")
-        data["skrzynia"] = extract_value("gearbox", "Skrzynia biegów")
-        data["typNadwozia"] = extract_value("body_type", "Typ nadwozia")
-        data["kolor"] = extract_value("color", "Kolor")
-        data["krajPochodzenia"] = extract_value("country_origin", "Kraj pochodzenia")
-
-        data["bezwypadkowy"] = extract_value("no_accident", "Bezwypadkowy") == "Tak"
-        data["serwisowanyWAso"] = extract_value("service_record", "Serwisowany w ASO") == "Tak"
-        data["maNumerRejestracyjny"] = extract_value("registered", "Zarejestrowany w Polsce") == "Tak"
-
-        title_elem = soup.select_one("h1")
-        if title_elem:
-            data["title"] = (title_elem.text if title_elem else " ")
-        else:
-            m_title = re.search(r'"title"[\s:]*"([^"]+)"', html)
-            if m_title:
-                data["title"] = m_title.group(1)
-
-        m_price = re.search(r'"price"[\s:]*\{[^}]*?"value"[\s:]*(\d+)', html)
-        if m_price:
-            data["cenaBrutto"] = int(m_price.group(1))
-
-        # --- POBIERANIE LINKU YOUTUBE ---
-        try:
-            import re as regex_yt
-            yt_link = ""
-
-            # Opcja 1: Szukanie wprost iframe z YouTube
-            iframe = soup.find('iframe', src=regex_yt.compile(r'youtube\.com|youtu\.be'))
-            if iframe:
-                yt_link = iframe.get('src', '')
-
-            # Opcja 2: Przeszukanie ukrytych stanów strony
-            if not yt_link:
-                yt_match = regex_yt.search(r'(https://www\.youtube\.com/watch\?v=[\w-]+|https://youtu\.be/[\w-]+)', str(soup))
-                if yt_match:
-                    yt_link = yt_match.group(0)
-
-            if yt_link:
-                yt_link = yt_link.replace('embed/', 'watch?v=')
-                data['youtube'] = yt_link
-                data['youtubeLink'] = yt_link
-                data['video'] = yt_link
-        except Exception as e:
-            print("Błąd pobierania YT:", e)
-        else:
-            p_elem = soup.select_one('[data-testid="ad-price-container"] h3') or soup.find('h3', class_=lambda c: c and 'price' in str(c).lower())
-            if not p_elem:
-                p_elem = soup.find(attrs={"data-testid": "ad-price-container"})
-            if p_elem:
-                data["cenaBrutto"] = int(re.sub(r'[^\d]', '', (p_elem.text if p_elem else " ")))
-
-        raw_images = re.findall(r'"(https://[^"]+\.olxcdn\.com/[^"]+)"', html)
-        hq_images = []
-        for img in raw_images:
-            if "image" in img:
-                base = img.split(';')[0]
-                hq_images.append(base + ";s=1080x720")
-
-        unique_images = list(dict.fromkeys(hq_images))
-        if unique_images:
-            data["zdjecia"] = unique_images
-            data["zdjecieGlowne"] = unique_images[0]
-
-        # 5. OPIS - Wymuszanie przerw między liniami
-        desc_elem = soup.select_one('[data-testid="ad-description"]') or soup.select_one('.offer-description__description')
-        if desc_elem:
-            for br in desc_elem.find_all("br"):
-                br.replace_with("\n")
-            for p in desc_elem.find_all("p"):
-                p.append("\n")
-
-            clean_text = (desc_elem.text if desc_elem else " ")
-            clean_text = re.sub(r' {2,}', ' ', clean_text)
-            clean_text = re.sub(r'\n\s*\n\s*\n+', '\n\n', clean_text)
-            data["opis"] = clean_text.strip()
-        else:
-            m_desc = re.search(r'"description"[\s:]*"(.*?)"(?:,|})', html)
-            if m_desc:
-                try:
-                    data["opis"] = json.loads('"' + m_desc.group(1) + '"')
-                except BaseException:
-                    data["opis"] = m_desc.group(1)
-
-        for k in ["rok", "przebieg", "moc", "kubatura"]:
-            if data.get(k):
-                try:
-                    v = str(data[k]).lower().replace('cm3', '').replace('cm³', '')
-                    data[k] = int(re.sub(r'[^\d]', '', v))
-                except BaseException:
-                    pass
-
-        fuel = str(data.get("paliwo", "")).lower()
-        if "diesel" in fuel:
-            data["paliwo"] = "Diesel"
-        elif "benz" in fuel or "petrol" in fuel:
-            data["paliwo"] = "Benzyna"
-        elif "elektry" in fuel or "electric" in fuel:
-            data["paliwo"] = "Elektryczny"
-        elif "hybry" in fuel:
-            data["paliwo"] = "Hybryda"
-
-        gb = str(data.get("skrzynia", "")).lower()
-        if "auto" in gb:
-            data["skrzynia"] = "Automatyczna"
-        elif "man" in gb:
-            data["skrzynia"] = "Manualna"
-
-        if not data.get("marka") and data.get("title"):
-            parts = data["title"].split()
-            data["marka"] = parts[0]
-            data["model"] = " ".join(parts[1:3])
+        offer = await asyncio.to_thread(extract_offer, html)
+        data = offer_form_data(offer)
 
         return {"success": True, "data": data, "missing_fields": []}
 
@@ -801,7 +748,7 @@ async def scrape_otomoto_endpoint(request: OtomotoScrapeRequest):
 @api_router.post("/admin/listings/{bus_id}/toggle-sold", dependencies=[Depends(admin_required)])
 @api_router.post("/ogloszenia/{bus_id}/toggle-sold", dependencies=[Depends(admin_required)])
 async def toggle_sold(bus_id: str):
-    bus = supabase.table('buses').select('sold, gwarancja, status').eq('id', bus_id).execute()
+    bus = await db_execute(supabase.table('buses').select('sold, gwarancja, status').eq('id', bus_id))
     if not bus.data:
         raise HTTPException(404, "Not found")
     
@@ -818,7 +765,8 @@ async def toggle_sold(bus_id: str):
         'gwarancja': new_state,
         'status': 'sprzedane' if new_state else 'aktywne'
     }
-    supabase.table('buses').update(update_data).eq('id', bus_id).execute()
+    await db_execute(supabase.table('buses').update(update_data).eq('id', bus_id))
+    await listing_changed(bus_id)
     
     return {"success": True, "sold": new_state}
 
@@ -826,7 +774,7 @@ async def toggle_sold(bus_id: str):
 @api_router.post("/admin/listings/{bus_id}/toggle-reserved", dependencies=[Depends(admin_required)])
 @api_router.post("/ogloszenia/{bus_id}/toggle-reserved", dependencies=[Depends(admin_required)])
 async def toggle_reserved(bus_id: str):
-    bus = supabase.table('buses').select('reserved, hak').eq('id', bus_id).execute()
+    bus = await db_execute(supabase.table('buses').select('reserved, hak').eq('id', bus_id))
     if not bus.data:
         raise HTTPException(404, "Not found")
         
@@ -836,7 +784,8 @@ async def toggle_reserved(bus_id: str):
         
     new_state = not current
     
-    supabase.table('buses').update({'reserved': new_state, 'hak': new_state}).eq('id', bus_id).execute()
+    await db_execute(supabase.table('buses').update({'reserved': new_state, 'hak': new_state}).eq('id', bus_id))
+    await listing_changed(bus_id)
     
     return {"success": True, "reserved": new_state}
 
@@ -846,38 +795,115 @@ async def toggle_reserved(bus_id: str):
 
 @api_router.get("/admin/stats", dependencies=[Depends(admin_required)])
 async def get_stats():
+    """Dashboard counters and facets (marka / paliwo / typNadwozia / price buckets)"""
     if not supabase:
-        return {
-            "total": len(MOCK_BUSES), 
-            "wyrozniowane": sum(1 for b in MOCK_BUSES if b.get('wyrozniowane')), 
-            "nowe": sum(1 for b in MOCK_BUSES if b.get('nowosc')), 
-            "flotowe": sum(1 for b in MOCK_BUSES if b.get('flotowy'))
-        }
-    response = supabase.table('buses').select('*').execute()
-    buses = response.data
-    return {
-        "total": len(buses),
-        "wyrozniowane": sum(1 for b in buses if b.get('wyrozniowane')),
-        "nowe": sum(1 for b in buses if b.get('nowosc')),
-        "flotowe": sum(1 for b in buses if b.get('flotowy'))
-    }
+        return aggregate_stats(MOCK_BUSES)
+
+    cached = listing_cache.get(list_key('stats'))
+    if cached is not None:
+        return cached
+
+    generation = listing_cache.generation
+    stats = await fetch_listing_stats()
+    listing_cache.set(list_key('stats'), stats, generation)
+    return stats
+
+
+_stats_rpc_available = True
+_variants_column_available: Optional[bool] = None
+
+
+async def variants_column_available() -> bool:
+    """Whether `buses.zdjeciaWarianty` exists (sql/image_variants.sql); probed until it answers"""
+    global _variants_column_available
+    if _variants_column_available is None and supabase:
+        try:
+            await db_execute(supabase.table('buses').select('zdjeciaWarianty').limit(1))
+            _variants_column_available = True
+        except Exception as e:
+            # Tylko brak kolumny jest trwały; po błędzie chwilowym sprawdzamy ponownie przy następnym zapisie
+            if error_code(e) in MISSING_COLUMN_CODES:
+                _variants_column_available = False
+                logging.warning(f"Column zdjeciaWarianty missing, image variants are not recorded: {e}")
+            else:
+                logging.warning(f"zdjeciaWarianty probe failed, variants skipped for this request: {e}")
+                return False
+    return bool(_variants_column_available)
+
+
+async def _card_extra_columns() -> tuple:
+    return ('zdjeciaWarianty',) if await variants_column_available() else ()
+
+
+async def _without_missing_columns(bus_data: dict) -> dict:
+    if not await variants_column_available():
+        bus_data.pop('zdjeciaWarianty', None)
+    return bus_data
+
+
+async def fetch_listing_stats() -> dict:
+    """Aggregate in the database via bus_stats() (sql/bus_stats.sql).
+
+    If the function is not installed, fall back to a narrow projection of
+    the columns the counters need and aggregate in Python.
+    """
+    global _stats_rpc_available
+    if _stats_rpc_available:
+        try:
+            response = await db_execute(supabase.rpc('bus_stats'))
+            return response.data
+        except Exception as e:
+            # Tylko brak funkcji wyłącza RPC na stałe; błąd chwilowy - fallback dla tego wywołania
+            if error_code(e) in MISSING_FUNCTION_CODES:
+                _stats_rpc_available = False
+                logging.warning(f"bus_stats() RPC not installed, using column projection: {e}")
+            else:
+                logging.warning(f"bus_stats() RPC failed, using column projection for this request: {e}")
+
+    return aggregate_stats(await db_select_all(lambda: supabase.table('buses').select(','.join(STATS_COLUMNS))))
+
+
+@api_router.post("/admin/storage/gc", dependencies=[Depends(admin_required)])
+async def run_storage_gc(dry_run: bool = Query(False)):
+    """Delete stored photos no listing references (dry_run: report only)"""
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Storage not configured")
+    return await StorageSweep(image_store()).run(dry_run=dry_run)
+
+
+@api_router.post("/admin/storage/migrate", dependencies=[Depends(admin_required)])
+async def run_storage_migration():
+    """Move photos saved on the local fallback disk to Supabase Storage"""
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Storage not configured")
+    report = await migrate_local_photos(image_store())
+    if report["listings"]:
+        invalidate_listings()
+        facet_index.reset()
+    return report
+
+
+@api_router.get("/admin/cache-stats", dependencies=[Depends(admin_required)])
+async def get_cache_stats():
+    """Listing and token cache hit/miss counters"""
+    return {"listings": listing_cache.stats(), "tokens": jwt_users.stats()}
 
 # Opinion Endpoints
 
 
 @api_router.get("/opinie")
-async def get_opinions():
+async def get_opinions(request: Request):
     if not supabase:
-        return MOCK_OPINIONS
-    response = supabase.table('opinions').select('*').eq('wyswietlaj', True).execute()
-    return response.data
+        return conditional_response(request, RenderedJSON(MOCK_OPINIONS))
+    response = await db_execute(supabase.table('opinions').select('*').eq('wyswietlaj', True))
+    return conditional_response(request, RenderedJSON(response.data))
 
 
 @api_router.get("/admin/opinions", dependencies=[Depends(admin_required)])
 async def get_all_opinions_admin():
     if not supabase:
         return MOCK_OPINIONS
-    response = supabase.table('opinions').select('*').execute()
+    response = await db_execute(supabase.table('opinions').select('*'))
     return response.data
 
 
@@ -886,7 +912,7 @@ async def create_opinion(op: OpinionCreate):
     data = op.dict(by_alias=True)
     data['id'] = str(uuid.uuid4())
     data['dataPublikacji'] = datetime.now().isoformat()
-    resp = supabase.table('opinions').insert(data).execute()
+    resp = await db_execute(supabase.table('opinions').insert(data))
     return resp.data[0]
 
 
@@ -894,21 +920,22 @@ async def create_opinion(op: OpinionCreate):
 async def update_opinion(op_id: str, op: OpinionUpdate):
     data = {k: v for k, v in op.dict(by_alias=True).items() if v is not None}
     if data:
-        resp = supabase.table('opinions').update(data).eq('id', op_id).execute()
+        resp = await db_execute(supabase.table('opinions').update(data).eq('id', op_id))
         return resp.data[0]
     return {}
 
 
 @api_router.delete("/admin/opinions/{op_id}", dependencies=[Depends(admin_required)])
 async def delete_opinion(op_id: str):
-    supabase.table('opinions').delete().eq('id', op_id).execute()
+    await db_execute(supabase.table('opinions').delete().eq('id', op_id))
     return {"success": True}
 
 # Register Router
 app.include_router(api_router)
 
 # Mount Uploads
-app.mount("/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
+# Zdjęcia z lokalnego magazynu (storage.LocalStorage) - immutable cache, Range, pathsend
+app.mount("/uploads", LocalFiles(LocalStorage(UPLOADS_DIR)), name="uploads")
 
 # Frontend Static Files (if build exists)
 FRONTEND_BUILD_DIR = ROOT_DIR.parent / "frontend" / "build"
@@ -938,209 +965,64 @@ app.add_middleware(
 
 # --- AUTOMATYZACJA OTOMOTO ---
 
-DEALER_URL = "https://fhufranko.otomoto.pl/inventory"
-
-
-def extract_oto_value(html, key, label):
-    m = regex_cron.search(r'"key"[\s:]*"' + key + r'"[^}]*?"displayValue"[\s:]*"([^"]+)"', html)
-    if m:
-        return m.group(1)
-    m = regex_cron.search(r'"key"[\s:]*"' + key + r'"[^}]*?"value"[\s:]*"([^"]+)"', html)
-    if m:
-        return m.group(1)
-    m = regex_cron.search(r'"label"[\s:]*"' + label + r'"[^}]*?"value"[\s:]*"([^"]+)"', html)
-    if m:
-        return m.group(1)
-    m2 = regex_cron.search(label + r'[^>]*?>([a-zA-Z0-9\sęóąśłżźćńĘÓĄŚŁŻŹĆŃ]+)<', html)
-    if m2:
-        val = m2.group(1).strip()
-        if len(val) < 40 and val != label:
-            return val
-    return None
-
-
 async def sync_otomoto_job():
     print("[CRON] Rozpoczynam synchronizację z Otomoto...")
     if not supabase:
         return
 
     try:
-        db_resp = supabase.table('buses').select('*').execute()
-        db_buses = db_resp.data or []
-
-        headers = {"User-Agent": "Mozilla/5.0"}
-        offer_links = set()
-        scraper = cloudscraper.create_scraper(browser={'browser': 'chrome', 'platform': 'windows', 'mobile': False})
-
-        # Pobieramy do 3 stron
-        for page in range(1, 4):
-            resp = requests.get(f"{DEALER_URL}?page={page}", headers=headers, timeout=15)
-            soup = BeautifulSoup(resp.content, "html.parser")
-            links = [a['href'].split('?')[0] for a in soup.find_all('a', href=True) if '/oferta/' in a['href'] and 'otomoto.pl' in a['href']]
-            if not links:
-                break
-            for l in links:
-                offer_links.add(l)
-
-        print(f"[CRON] Znaleziono {len(offer_links)} aktywnych linków na profilu Otomoto.")
-
-        active_vins = set()
-        active_titles = set()
-
-        for link in offer_links:
-            try:
-                r = scraper.get(link, timeout=10)
-                html = r.content.decode('utf-8', errors='ignore')
-
-                vin = extract_oto_value(html, "vin", "VIN")
-                if vin and ("Zgadzam" in vin or len(vin) > 20):
-                    vin = ""
-                s_soup = BeautifulSoup(html, "html.parser")
-                for div in s_soup.find_all('div', attrs={"data-testid": "advert-details-item"}):
-                    p_tags = div.find_all('p')
-                    if len(p_tags) >= 2 and "VIN" in p_tags[0].text:
-                        vin = p_tags[1].text.strip()
-
-                m_title = regex_cron.search(r'"title"[\s:]*"([^"]+)"', html)
-                title = m_title.group(1) if m_title else ""
-
-                if vin:
-                    active_vins.add(vin)
-                if title:
-                    active_titles.add(title)
-
-                exists = False
-                if vin:
-                    exists = any(b.get('vin') == vin for b in db_buses)
-                else:
-                    m_price = regex_cron.search(r'"price"[\s:]*\{[^}]*?"value"[\s:]*(\d+)', html)
-                    price = int(m_price.group(1)) if m_price else 0
-                    exists = any((b.get('title') == title or b.get('naped') == title) and b.get('cenaBrutto') == price for b in db_buses)
-
-                if not exists:
-                    print(f"[CRON] Znaleziono nowe auto: {title}. Pobieram z Otomoto i dodaję do bazy Supabase...")
-                    data = {"vin": vin, "title": title}
-
-                    price_elem = BeautifulSoup(html, "html.parser").select_one('[data-testid="ad-price-container"] h3')
-                    if price_elem:
-                        data["cenaBrutto"] = int(regex_cron.sub(r'[^\d]', '', str(getattr(price_elem, "text", "0") or "0")) or 0)
-                    else:
-                        m_price = regex_cron.search(r'"price"[\s:]*\{[^}]*?"value"[\s:]*(\d+)', html)
-                        data["cenaBrutto"] = int(m_price.group(1)) if m_price else 0
-
-                    data["rok"] = extract_oto_value(html, "year", "Rok produkcji")
-                    data["przebieg"] = extract_oto_value(html, "mileage", "Przebieg")
-                    data["moc"] = extract_oto_value(html, "engine_power", "Moc")
-                    data["kubatura"] = extract_oto_value(html, "engine_capacity", "Pojemność skokowa")
-
-                    for k in ["rok", "przebieg", "moc", "kubatura"]:
-                        if data.get(k):
-                            try:
-                                v = str(data[k]).lower().replace('cm3', '').replace('cm³', '')
-                                data[k] = int(regex_cron.sub(r'[^\d]', '', v))
-                            except BaseException:
-                                pass
-
-                    marka = extract_oto_value(html, "make", "Marka pojazdu") or title.split()[0] if title else "Inna"
-                    model = extract_oto_value(html, "model", "Model pojazdu") or "Inny"
-
-                    raw_images = regex_cron.findall(r'"(https://[^"]+\.olxcdn\.com/[^"]+)"', html)
-                    hq_images = [img.split(';')[0] + ";s=1080x720" for img in raw_images if "image" in img]
-                    unique_images = list(dict.fromkeys(hq_images))
-
-                    # Automatyczny upload zdjęć na Supabase
-                    uploaded_urls = []
-                    for img_url in unique_images[:10]:
-                        try:
-                            img_r = requests.get(img_url, timeout=5)
-                            fname = f"{uuid.uuid4()}.jpg"
-                            supabase.storage.from_("buses").upload(f"buses/{fname}", img_r.content, file_options={"content-type": "image/jpeg"})
-                            uploaded_urls.append(supabase.storage.from_("buses").get_public_url(f"buses/{fname}"))
-                        except BaseException:
-                            pass
-
-                    desc_elem = BeautifulSoup(html, "html.parser").select_one('[data-testid="ad-description"]')
-                    if desc_elem:
-                        for br in desc_elem.find_all("br"):
-                            br.replace_with("\n")
-                        opis = str(getattr(desc_elem, "text", "Zaimportowano automatycznie.") or "Zaimportowano automatycznie.")
-                    else:
-                        opis = "Zaimportowano automatycznie."
-
-                    bus_dict = {
-                        'id': str(uuid.uuid4()),
-                        'numerOgloszenia': f"FKBUS{str(uuid.uuid4().int)[:6]}",
-                        'marka': marka,
-                        'model': model,
-                        'rok': data.get('rok', 2000),
-                        'przebieg': data.get('przebieg', 0),
-                        'cenaBrutto': data.get('cenaBrutto', 0),
-                        'paliwo': extract_oto_value(html, "fuel_type", "Rodzaj paliwa") or "Diesel",
-                        'skrzynia': extract_oto_value(html, "gearbox", "Skrzynia biegów") or "Manualna",
-                        'typNadwozia': extract_oto_value(html, "body_type", "Typ nadwozia") or "Furgon",
-                        'moc': data.get('moc', 0),
-                        'kubatura': data.get('kubatura', 0),
-                        'kolor': extract_oto_value(html, "color", "Kolor") or "Biały",
-                        'opis': opis,
-                        'zdjecia': uploaded_urls,
-                        'zdjecieGlowne': uploaded_urls[0] if uploaded_urls else None,
-                        'vin': data.get('vin'),
-                        'naped': title,
-                        'miasto': 'Smyków',
-                        'status': 'aktywne',
-                        'dataPublikacji': datetime.now(timezone.utc).isoformat(),
-                        'normaEmisji': 'Euro 6',
-                        'dmcKategoria': 'do 3.5t',
-                        'ladownosc': 1000,
-                        'vat': True
-                    }
-                    supabase.table('buses').insert(bus_dict).execute()
-
-            except Exception as e:
-                print(f"[CRON] Błąd przy analizie oferty: {e}")
-                traceback.print_exc()
-            await asyncio.sleep(2)
-
-        # 3. Oznacz jako sprzedane i usuwaj trwale stare ogłoszenia
-        for bus in db_buses:
-            if bus.get('status') == 'sprzedane':
-                if bus.get('data_sprzedazy'):
-                    try:
-                        dt_str = bus['data_sprzedazy'].replace('Z', '+00:00')
-                        sell_date = datetime.fromisoformat(dt_str)
-                        if datetime.now(timezone.utc) - sell_date > timedelta(days=5):
-                            print(f"[CRON] Auto {bus['id']} ma status sprzedanego powyżej 5 dni. Usuwam trwale.")
-                            supabase.table('buses').delete().eq('id', bus['id']).execute()
-                            images = bus.get('zdjecia', [])
-                            paths = [img.split('/')[-1] for img in images if "Client.co" in img]
-                            if paths:
-                                supabase.storage.from_("buses").remove([f"buses/{p}" for p in paths])
-                    except BaseException:
-                        pass
-            else:
-                is_missing = False
-                if bus.get('vin') and len(bus.get('vin')) > 5:
-                    if bus.get('vin') not in active_vins:
-                        is_missing = True
-                else:
-                    if bus.get('naped') and bus.get('naped') not in active_titles:
-                        is_missing = True
-
-                if is_missing and active_vins:
-                    print(f"[CRON] Auto zniknęło z profilu dealera na Otomoto. Oznaczam auto z bazy ({bus.get('id')}) jako sprzedane.")
-                    supabase.table('buses').update({
-                        'status': 'sprzedane',
-                        'sold': True,
-                        'gwarancja': True,
-                        'data_sprzedazy': datetime.now(timezone.utc).isoformat()
-                    }).eq('id', bus['id']).execute()
-
+        await OtomotoSync(supabase, record_variants=await variants_column_available(), store=image_store()).run()
     except Exception as e:
         print(f"[CRON] Błąd główny pętli: {e}")
+    finally:
+        invalidate_listings()
+        facet_index.reset()
+
+
+async def storage_gc_job():
+    try:
+        report = await StorageSweep(image_store()).run(dry_run=STORAGE_GC_DRY_RUN)
+        if STORAGE_GC_DRY_RUN:
+            logging.warning(f"[CRON] STORAGE_GC_DRY_RUN=1 - sprzątanie zdjęć tylko raportuje, "
+                            f"{report['orphans']} osieroconych ({report['orphan_bytes']} B) nie usunięto")
+        print(f"[CRON] Sprzątanie zdjęć: osieroconych {report['orphans']}, usunięto {report['removed']} obiektów, "
+              f"odzyskano {report['bytes_reclaimed'] / (1024 * 1024):.1f} MB")
+    except Exception as e:
+        print(f"[CRON] Błąd sprzątania zdjęć: {e}")
+
+
+async def storage_migrate_job():
+    try:
+        report = await migrate_local_photos(image_store())
+        if report["listings"]:
+            invalidate_listings()
+            facet_index.reset()
+        if report["uploaded"] or report["failed"]:
+            print(f"[CRON] Migracja lokalnych zdjęć do Supabase: {report}")
+    except Exception as e:
+        print(f"[CRON] Błąd migracji lokalnych zdjęć: {e}")
+
+
+scheduler = AsyncIOScheduler()
 
 
 @app.on_event("startup")
 async def start_otomoto_cron():
     # Automatyczny skaner działający w tle został wyłączony.
     # Pozostaje ręczne dodawanie i importowanie przez panel admina.
-    print("[CRON] Automatyczna synchronizacja z Otomoto jest wyłączona.")
\ No newline at end of file
+    print("[CRON] Automatyczna synchronizacja z Otomoto jest wyłączona.")
+    # Sprzątanie zdjęć: STORAGE_GC_INTERVAL_HOURS (0 = wyłączone), STORAGE_GC_DRY_RUN=1 = tylko raport
+    if supabase and STORAGE_GC_INTERVAL_HOURS > 0:
+        scheduler.add_job(storage_gc_job, 'interval', hours=STORAGE_GC_INTERVAL_HOURS, id='storage_gc', max_instances=1, coalesce=True)
+    if supabase and STORAGE_BACKEND != 'local' and STORAGE_MIGRATE_INTERVAL_MINUTES > 0:
+        scheduler.add_job(storage_migrate_job, 'interval', minutes=STORAGE_MIGRATE_INTERVAL_MINUTES, id='storage_migrate', max_instances=1, coalesce=True)
+    if scheduler.get_jobs():
+        scheduler.start()
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    shutdown_db_pool()
+    close_http_client()
+    shutdown_image_pool()
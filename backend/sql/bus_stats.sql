@@ -0,0 +1,47 @@
+-- Agregaty dla GET /api/admin/stats liczone w bazie (jedno wywołanie RPC).
+-- Uruchom raz w Supabase SQL Editor. Kształt wyniku = listing_stats.aggregate_stats().
+-- Progi cenowe muszą odpowiadać PRICE_BUCKET_EDGES w backend/listing_stats.py.
+
+create or replace function public.bus_stats()
+returns json
+language sql
+stable
+as $$
+  with b as (
+    select
+      coalesce(nullif(marka, ''), 'brak') as marka,
+      coalesce(nullif(paliwo, ''), 'brak') as paliwo,
+      coalesce(nullif("typNadwozia", ''), 'brak') as "typNadwozia",
+      case
+        when "cenaBrutto" is null then 'brak'
+        when "cenaBrutto" < 50000 then '0-49999'
+        when "cenaBrutto" < 100000 then '50000-99999'
+        when "cenaBrutto" < 150000 then '100000-149999'
+        when "cenaBrutto" < 200000 then '150000-199999'
+        else '200000+'
+      end as cena,
+      coalesce(sold, false) or coalesce(gwarancja, false) or coalesce(status = 'sprzedane', false) as is_sold,
+      coalesce(reserved, false) or coalesce(hak, false) as is_reserved,
+      coalesce(wyrozniowane, false) as wyrozniowane,
+      coalesce(nowosc, false) as nowosc,
+      coalesce(flotowy, false) as flotowy
+    from public.buses
+  )
+  select json_build_object(
+    'total', (select count(*) from b),
+    'wyrozniowane', (select count(*) from b where wyrozniowane),
+    'nowe', (select count(*) from b where nowosc),
+    'flotowe', (select count(*) from b where flotowy),
+    'sold', (select count(*) from b where is_sold),
+    'reserved', (select count(*) from b where is_reserved and not is_sold),
+    'active', (select count(*) from b where not is_sold),
+    'facets', json_build_object(
+      'marka', (select coalesce(json_object_agg(marka, n), '{}'::json) from (select marka, count(*) as n from b group by marka) t),
+      'paliwo', (select coalesce(json_object_agg(paliwo, n), '{}'::json) from (select paliwo, count(*) as n from b group by paliwo) t),
+      'typNadwozia', (select coalesce(json_object_agg("typNadwozia", n), '{}'::json) from (select "typNadwozia", count(*) as n from b group by "typNadwozia") t),
+      'cena', (select coalesce(json_object_agg(cena, n), '{}'::json) from (select cena, count(*) as n from b group by cena) t)
+    )
+  );
+$$;
+
+grant execute on function public.bus_stats() to anon, authenticated;
@@ -0,0 +1,7 @@
+-- Warianty AVIF/WebP zdjęć ogłoszenia (backend/image_variants.py).
+-- Uruchom raz w Supabase SQL Editor. Bez tej kolumny backend działa dalej,
+-- tylko nie zapisuje wariantów (zdjęcia serwowane są w oryginale).
+-- Kształt: {"<url zdjęcia>": {"card": {"width": 640, "avif": "<url>", "webp": "<url>"}, ...}}
+
+alter table public.buses
+  add column if not exists "zdjeciaWarianty" jsonb not null default '{}'::jsonb;
@@ -0,0 +1,354 @@
+"""
+Storage providers for listing photos.
+
+A provider stores objects under logical paths (buses/<name>.<ext>,
+buses/<name>/<variant>.<fmt>) and maps them to public URLs:
+- SupabaseStorage: the `buses` bucket in Supabase Storage
+- LocalStorage: files under backend/uploads, served at /uploads by LocalFiles.
+  It is the fallback when the bucket is unreachable, and the main store
+  with STORAGE_BACKEND=local (the whole stack then runs offline).
+
+LocalStorage writes atomically (temp file + rename) into directories
+sharded by the first two characters of the photo name
+(buses/ab/abcd....jpg), so no single directory grows without bound. Paths
+are content hashes, so objects never change. LocalFiles serves them with a
+one-year immutable Cache-Control, ETag / 304 and single byte ranges, and
+uses the server's zero-copy `http.response.pathsend` when it is offered.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional
+
+from starlette.responses import FileResponse, Response
+
+from db import db_call
+
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'supabase')
+# Rozmiar strony przy listowaniu bucketu
+STORAGE_LIST_PAGE = 1000
+
+BUCKET = "buses"
+LOCAL_URL_PREFIX = "/uploads/"
+
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+}
+IMMUTABLE = "public, max-age=31536000, immutable"
+# parse_range: zakres poza plikiem - odpowiedź 416
+UNSATISFIABLE: tuple = ()
+
+
+class ObjectInfo(NamedTuple):
+    path: str
+    size: int
+    age: Optional[float]  # sekundy; None = nieznany wiek
+
+
+def is_duplicate(error: Exception) -> bool:
+    """Storage refused the upload because the path already exists"""
+    if str(getattr(error, 'status', '')) == '409':
+        return True
+    text = str(error)
+    return 'Duplicate' in text or 'already exists' in text
+
+
+def content_type_for(path: str) -> str:
+    return CONTENT_TYPES.get(path.rsplit('.', 1)[-1].lower(), 'application/octet-stream')
+
+
+def _payload(source):
+    """bytes / file object as is; SpooledUpload through its payload() context"""
+    return source.payload() if hasattr(source, 'payload') else nullcontext(source)
+
+
+class StorageProvider:
+    """Interface of a photo store; `location` names it in StoredImage"""
+
+    location = ''
+
+    def public_url(self, path: str) -> str:
+        raise NotImplementedError
+
+    def locate(self, url: str) -> Optional[str]:
+        """Logical path of one of this provider's URLs; None otherwise"""
+        raise NotImplementedError
+
+    async def put(self, path: str, source, content_type: str) -> str:
+        """Store bytes / a binary file / a SpooledUpload; an existing object is kept. Returns the URL"""
+        raise NotImplementedError
+
+    async def remove(self, paths: List[str]) -> None:
+        raise NotImplementedError
+
+    async def list(self, prefix: str, descend: Callable[[str], bool] = lambda folder: True) -> List[ObjectInfo]:
+        """Every object under `prefix`; subfolders only when descend(folder)"""
+        raise NotImplementedError
+
+
+class SupabaseStorage(StorageProvider):
+    location = 'bucket'
+
+    def __init__(self, supabase, bucket: str = BUCKET, page_size: int = STORAGE_LIST_PAGE):
+        self.supabase = supabase
+        self.bucket = bucket
+        self.page_size = page_size
+        # Publiczny URL obiektu = prefiks + ścieżka w buckecie
+        self._public_prefix = self.public_url('x')[:-1]
+
+    def _bucket(self):
+        return self.supabase.storage.from_(self.bucket)
+
+    def public_url(self, path: str) -> str:
+        return self._bucket().get_public_url(path)
+
+    def locate(self, url: str) -> Optional[str]:
+        if url.startswith(self._public_prefix):
+            return url[len(self._public_prefix):]
+        return None
+
+    def write(self, path: str, source, content_type: str) -> None:
+        with _payload(source) as payload:
+            try:
+                self._bucket().upload(path, payload, file_options={"content-type": content_type})
+            except Exception as e:
+                if not is_duplicate(e):
+                    raise
+
+    async def put(self, path: str, source, content_type: str) -> str:
+        await db_call(self.write, path, source, content_type)
+        return self.public_url(path)
+
+    async def remove(self, paths: List[str]) -> None:
+        await db_call(self._bucket().remove, paths)
+
+    def _list_folder(self, folder: str) -> List[dict]:
+        entries: List[dict] = []
+        while True:
+            page = self._bucket().list(folder, {"limit": self.page_size, "offset": len(entries),
+                                                "sortBy": {"column": "name", "order": "asc"}})
+            entries.extend(page)
+            if len(page) < self.page_size:
+                return entries
+
+    async def list(self, prefix: str, descend: Callable[[str], bool] = lambda folder: True) -> List[ObjectInfo]:
+        now = time.time()
+        objects: List[ObjectInfo] = []
+        folders = [prefix]
+        while folders:
+            folder = folders.pop()
+            for entry in await db_call(self._list_folder, folder):
+                path = f"{folder}/{entry['name']}"
+                if entry.get('id') is None:
+                    if descend(path):
+                        folders.append(path)
+                    continue
+                size = (entry.get('metadata') or {}).get('size') or 0
+                objects.append(ObjectInfo(path, size, _age(entry.get('created_at'), now)))
+        return objects
+
+
+def _age(created_at: Optional[str], now: float) -> Optional[float]:
+    if not created_at:
+        return None
+    try:
+        return now - datetime.fromisoformat(created_at.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def shard_path(path: str) -> str:
+    """buses/abcd.jpg -> buses/ab/abcd.jpg, buses/abcd/card.webp -> buses/ab/abcd/card.webp"""
+    top, _, rest = path.partition('/')
+    if not rest:
+        return path
+    return f"{top}/{rest[:2]}/{rest}"
+
+
+def unshard_path(relative: str) -> str:
+    top, _, rest = relative.partition('/')
+    shard, _, name = rest.partition('/')
+    if name and len(shard) == 2 and name.startswith(shard):
+        return f"{top}/{name}"
+    return relative  # plik sprzed shardingu
+
+
+class LocalStorage(StorageProvider):
+    location = 'local'
+
+    def __init__(self, root: Path, url_prefix: str = LOCAL_URL_PREFIX):
+        self.root = Path(root)
+        self.url_prefix = url_prefix
+
+    def public_url(self, path: str) -> str:
+        return f"{self.url_prefix}{path}"
+
+    def locate(self, url: str) -> Optional[str]:
+        if not url.startswith(self.url_prefix):
+            return None
+        path = url[len(self.url_prefix):]
+        # Tylko pliki w katalogu magazynu (bez "..")
+        if not path or '..' in path.split('/'):
+            return None
+        return path
+
+    def file_path(self, path: str) -> Optional[Path]:
+        """Existing file of a logical path (sharded, or the pre-sharding layout)"""
+        for candidate in (self.root / shard_path(path), self.root / path):
+            if candidate.is_file():
+                return candidate
+        return None
+
+    def write(self, path: str, source, content_type: str) -> None:
+        target = self.root / shard_path(path)
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Zapis atomowy: plik tymczasowy w tym samym katalogu + rename
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as out, _payload(source) as payload:
+                if isinstance(payload, bytes):
+                    out.write(payload)
+                else:
+                    shutil.copyfileobj(payload, out, 1024 * 1024)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    async def put(self, path: str, source, content_type: str) -> str:
+        await asyncio.to_thread(self.write, path, source, content_type)
+        return self.public_url(path)
+
+    def _remove(self, paths: List[str]) -> None:
+        for path in paths:
+            for target in (self.root / shard_path(path), self.root / path):
+                target.unlink(missing_ok=True)
+                # Puste katalogi wariantów i shardów
+                parent = target.parent
+                while parent != self.root and parent.parent != self.root:
+                    try:
+                        parent.rmdir()
+                    except OSError:
+                        break
+                    parent = parent.parent
+
+    async def remove(self, paths: List[str]) -> None:
+        await asyncio.to_thread(self._remove, paths)
+
+    def _list(self, prefix: str, descend: Callable[[str], bool]) -> List[ObjectInfo]:
+        base = self.root / prefix
+        if not base.is_dir():
+            return []
+        now = time.time()
+        objects = []
+        for dirpath, dirnames, filenames in os.walk(base):
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    continue
+                full = os.path.join(dirpath, filename)
+                stat = os.stat(full)
+                path = unshard_path(os.path.relpath(full, self.root).replace(os.sep, '/'))
+                objects.append(ObjectInfo(path, stat.st_size, now - stat.st_mtime))
+        return [obj for obj in objects if descend_ok(obj.path, descend)]
+
+    async def list(self, prefix: str, descend: Callable[[str], bool] = lambda folder: True) -> List[ObjectInfo]:
+        return await asyncio.to_thread(self._list, prefix, descend)
+
+
+def descend_ok(path: str, descend: Callable[[str], bool]) -> bool:
+    """Objects below the top folder are listed only when their folder would be descended into"""
+    parts = path.split('/')
+    return len(parts) <= 2 or descend('/'.join(parts[:-1]))
+
+
+class ImmutableFileResponse(FileResponse):
+    chunk_size = 256 * 1024
+
+
+class LocalFiles:
+    """ASGI app serving LocalStorage objects (mounted at /uploads)"""
+
+    def __init__(self, storage: LocalStorage):
+        self.storage = storage
+
+    async def __call__(self, scope, receive, send) -> None:
+        root_path = scope.get('root_path', '')
+        route_path = scope['path'][len(root_path):] if scope['path'].startswith(root_path) else scope['path']
+        path = self.storage.locate(self.storage.url_prefix + route_path.lstrip('/'))
+        file = await asyncio.to_thread(self.storage.file_path, path) if path else None
+        if scope['method'] not in ('GET', 'HEAD') or file is None:
+            status = 405 if file is not None else 404
+            await Response("Not Found" if status == 404 else "Method Not Allowed", status_code=status)(scope, receive, send)
+            return
+
+        stat = await asyncio.to_thread(os.stat, file)
+        headers = {"cache-control": IMMUTABLE, "accept-ranges": "bytes"}
+        response = ImmutableFileResponse(file, headers=headers, media_type=content_type_for(path), stat_result=stat)
+        request_headers = {k.decode('latin-1'): v.decode('latin-1') for k, v in scope['headers']}
+
+        if request_headers.get('if-none-match') == response.headers['etag']:
+            await Response(status_code=304, headers={"cache-control": IMMUTABLE, "etag": response.headers['etag']})(
+                scope, receive, send)
+            return
+        byte_range = parse_range(request_headers.get('range'), stat.st_size)
+        if byte_range is None:
+            await response(scope, receive, send)
+            return
+        if byte_range == UNSATISFIABLE:
+            headers = {"content-range": f"bytes */{stat.st_size}", "accept-ranges": "bytes"}
+            await Response(status_code=416, headers=headers)(scope, receive, send)
+            return
+        await send_range(scope, send, file, stat, byte_range, response)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """(start, end) inclusive for a single 'bytes=' range; None = whole file, UNSATISFIABLE = 416"""
+    if not header or not header.startswith('bytes=') or ',' in header or size == 0:
+        return None
+    start, _, end = header[6:].strip().partition('-')
+    try:
+        if start == '':
+            length = int(end)
+            return (max(0, size - length), size - 1) if length > 0 else UNSATISFIABLE
+        first = int(start)
+        last = min(int(end), size - 1) if end else size - 1
+        if end and first > int(end):
+            return None
+    except ValueError:
+        return None
+    return (first, last) if first < size else UNSATISFIABLE
+
+
+async def send_range(scope, send, file: Path, stat, byte_range: tuple, full: FileResponse) -> None:
+    start, end = byte_range
+    headers = [(k, v) for k, v in full.raw_headers if k != b'content-length']
+    headers += [
+        (b'content-length', str(end - start + 1).encode()),
+        (b'content-range', f"bytes {start}-{end}/{stat.st_size}".encode()),
+    ]
+    await send({"type": "http.response.start", "status": 206, "headers": headers})
+    if scope['method'] == 'HEAD':
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        return
+    fd = os.open(file, os.O_RDONLY)
+    try:
+        offset = start
+        while offset <= end:
+            chunk = await asyncio.to_thread(os.pread, fd, min(ImmutableFileResponse.chunk_size, end - offset + 1), offset)
+            offset += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": offset <= end and bool(chunk)})
+            if not chunk:
+                break
+    finally:
+        os.close(fd)
+
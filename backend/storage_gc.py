@@ -0,0 +1,84 @@
+"""
+Background garbage collection of the photo storage.
+
+image_store removes the photos of deleted listings as they are released. This
+job is the safety net behind it. It lists every object under buses/ in the
+bucket and in the local uploads/buses fallback, compares them with the photo
+URLs still referenced by the `buses` table, and deletes the orphans in
+batches. Orphans include photos whose deletion failed or was never attempted,
+and variants left without an original. The report gives the number of
+reclaimed objects and bytes.
+
+An object belongs to a photo by its stem: buses/<name>.<ext> and everything
+under buses/<name>/ (its variants) are kept while the photo is referenced.
+Objects younger than IMAGE_GC_GRACE are skipped, because they may have just
+been uploaded for a listing that is not saved yet.
+
+A sweep that finds no referenced photo at all deletes nothing: an empty or
+RLS-filtered `buses` read would otherwise turn every live photo into an
+orphan. STORAGE_GC_DRY_RUN=1 makes the scheduled job report without
+deleting.
+"""
+import logging
+import os
+import time
+from typing import List
+
+from image_store import IMAGE_PREFIX, ImageStore, StoredImage
+
+STORAGE_GC_INTERVAL_HOURS = float(os.environ.get('STORAGE_GC_INTERVAL_HOURS', '24'))
+STORAGE_GC_DRY_RUN = os.environ.get('STORAGE_GC_DRY_RUN', '0') == '1'
+
+logger = logging.getLogger(__name__)
+
+
+def photo_stem(path: str) -> str:
+    """buses/abc.jpg and buses/abc/card.webp -> buses/abc"""
+    rest = path[len(IMAGE_PREFIX) + 1:] if path.startswith(f"{IMAGE_PREFIX}/") else path
+    return f"{IMAGE_PREFIX}/{rest.split('/', 1)[0].rsplit('.', 1)[0]}"
+
+
+class StorageSweep:
+    """One full pass over every storage provider (bucket, local fallback)"""
+
+    def __init__(self, store: ImageStore):
+        self.store = store
+
+    async def run(self, dry_run: bool = False) -> dict:
+        started = time.monotonic()
+        store = self.store
+        async with store.lock:
+            referenced = await store.referenced()
+            keep = {(image.location, photo_stem(image.path)) for image in (*referenced, *store.claimed())}
+            objects: List[tuple] = []
+            for location, provider in store.providers.items():
+                # Katalog wariantów listujemy tylko, gdy zdjęcie nie jest używane
+                listed = await provider.list(IMAGE_PREFIX, descend=lambda folder: (location, photo_stem(folder)) not in keep)
+                objects.extend((StoredImage(location, obj.path), obj) for obj in listed)
+            orphans = [
+                (image, obj) for image, obj in objects
+                if (image.location, photo_stem(image.path)) not in keep
+                and obj.age is not None and obj.age >= store.grace
+            ]
+            report = {
+                "scanned": len(objects),
+                "referenced": len(referenced),
+                "orphans": len(orphans),
+                "orphan_bytes": sum(obj.size for _, obj in orphans),
+                "removed": 0,
+                "failed": 0,
+                "bytes_reclaimed": 0,
+                "dry_run": dry_run,
+            }
+            if orphans and not referenced:
+                # Zero odwołań przy istniejących zdjęciach to raczej pusty/odfiltrowany odczyt niż prawda
+                report["aborted"] = "no listing references any stored photo"
+                logger.warning(f"Sprzątanie magazynu zdjęć przerwane: {report['aborted']}")
+            elif orphans and not dry_run:
+                removed, failed = await store.remove([image for image, _ in orphans], with_variants=False)
+                sizes = {image: obj.size for image, obj in orphans}
+                report["removed"], report["failed"] = len(removed), len(failed)
+                report["bytes_reclaimed"] = sum(sizes[image] for image in removed)
+        report["seconds"] = round(time.monotonic() - started, 2)
+        logger.info(f"Sprzątanie magazynu zdjęć: {report}")
+        return report
@@ -0,0 +1,79 @@
+"""
+Migration of local fallback photos to the Supabase bucket.
+
+Photos land in the local store (uploads/buses) when the bucket is
+unreachable during an upload. This job uploads every local object
+(originals and variants) to the bucket under the same path, then rewrites
+the listing URLs (`zdjecia`, `zdjecieGlowne`, `zdjeciaWarianty`) from
+/uploads/... to the bucket URL. The local copies are released to
+image_store, which deletes them once no listing references them.
+"""
+import logging
+import os
+from typing import Dict
+
+from db import db_execute, db_select_all
+from image_store import IMAGE_PREFIX, ImageStore
+from storage import content_type_for
+
+STORAGE_MIGRATE_INTERVAL_MINUTES = float(os.environ.get('STORAGE_MIGRATE_INTERVAL_MINUTES', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+def rewrite_listing_urls(row: dict, urls: Dict[str, str]) -> dict:
+    """Changed photo columns of one listing row (empty when nothing moved)"""
+    changes = {}
+    photos = row.get('zdjecia') or []
+    moved = [urls.get(url, url) for url in photos]
+    if moved != photos:
+        changes['zdjecia'] = moved
+    main = row.get('zdjecieGlowne')
+    if main in urls:
+        changes['zdjecieGlowne'] = urls[main]
+    variants = row.get('zdjeciaWarianty') or {}
+    moved_variants = {
+        urls.get(photo, photo): {
+            name: {key: urls.get(value, value) if isinstance(value, str) else value for key, value in entry.items()}
+            for name, entry in sizes.items()
+        }
+        for photo, sizes in variants.items()
+    }
+    if moved_variants != variants:
+        changes['zdjeciaWarianty'] = moved_variants
+    return changes
+
+
+async def migrate_local_photos(store: ImageStore) -> dict:
+    """Upload local photos to the bucket and point the listings at them"""
+    report = {"uploaded": 0, "failed": 0, "listings": 0, "released": 0}
+    local, bucket = store.providers.get('local'), store.providers.get('bucket')
+    if local is None or bucket is None:
+        return report
+
+    urls: Dict[str, str] = {}
+    originals = []
+    for obj in await local.list(IMAGE_PREFIX):
+        try:
+            with open(local.file_path(obj.path), 'rb') as f:
+                urls[local.public_url(obj.path)] = await bucket.put(obj.path, f, content_type_for(obj.path))
+        except Exception as e:
+            logger.warning(f"Migracja zdjęcia {obj.path} nie powiodła się: {e}")
+            report["failed"] += 1
+            continue
+        report["uploaded"] += 1
+        if obj.path.count('/') == 1:
+            originals.append(local.public_url(obj.path))
+    if not urls:
+        return report
+
+    for row in await db_select_all(lambda: store.supabase.table('buses').select('*')):
+        changes = rewrite_listing_urls(row, urls)
+        if changes:
+            await db_execute(store.supabase.table('buses').update(changes).eq('id', row['id']))
+            report["listings"] += 1
+
+    # Lokalne kopie usuwa image_store, gdy żadne ogłoszenie już ich nie używa
+    store.release(originals, schedule=False)
+    report["released"] = (await store.collect())["removed"]
+    return report
@@ -0,0 +1,36 @@
+"""
+Shared fixtures and multipart helpers for the backend tests
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.fakes import FakeSupabase
+
+JPEG = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01'
+PNG = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
+WEBP = b'RIFF\x24\x00\x00\x00WEBPVP8 '
+AVIF = b'\x00\x00\x00\x1cftypavif\x00\x00\x00\x00'
+
+BOUNDARY = 'testboundary'
+
+
+def multipart_body(*files, fields=()):
+    """files: (field, filename, bytes)"""
+    body = b''
+    for name, value in fields:
+        body += f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+    for field, filename, data in files:
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                 f'Content-Type: image/jpeg\r\n\r\n').encode() + data + b'\r\n'
+    return body + f'--{BOUNDARY}--\r\n'.encode()
+
+
+@pytest.fixture
+def admin_client(monkeypatch):
+    import server
+
+    supabase = FakeSupabase([])
+    monkeypatch.setattr(server, 'supabase', supabase)
+    client = TestClient(server.app)
+    client.cookies.set(server.ADMIN_COOKIE_NAME, server._sign('ok'))
+    return client, supabase
@@ -0,0 +1,115 @@
+"""
+In-memory stand-ins for the Supabase client used by the sync tests
+"""
+from datetime import datetime, timezone
+
+from storage3.exceptions import StorageApiError
+
+
+class FakeQuery:
+    def __init__(self, table, action, payload=None):
+        self.table = table
+        self.action = action
+        self.payload = payload
+        self.filters = []
+        self.sort = None
+        self.window = None
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, column):
+        self.sort = column
+        return self
+
+    def range(self, start, end):
+        self.window = (start, end)
+        return self
+
+    def execute(self):
+        rows = self.table.rows
+        matching = [r for r in rows if all(r.get(c) == v for c, v in self.filters)]
+        if self.action == 'insert':
+            rows.append(dict(self.payload))
+        elif self.action == 'update':
+            for row in matching:
+                row.update(self.payload)
+        elif self.action == 'delete':
+            self.table.rows = [r for r in rows if r not in matching]
+        if self.sort:
+            matching = sorted(matching, key=lambda r: str(r.get(self.sort)))
+        if self.action == 'select':
+            start, end = self.window or (0, len(matching))
+            matching = matching[start:min(end + 1, start + self.table.max_rows)]
+        return type('Response', (), {'data': [dict(r) for r in matching]})()
+
+
+class FakeTable:
+    # Jak PostgREST: strona nigdy nie ma więcej wierszy niż max_rows
+    max_rows = 1000
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, columns):
+        return FakeQuery(self, 'select')
+
+    def insert(self, payload):
+        return FakeQuery(self, 'insert', payload)
+
+    def update(self, payload):
+        return FakeQuery(self, 'update', payload)
+
+    def delete(self):
+        return FakeQuery(self, 'delete')
+
+
+class FakeBucket:
+    def __init__(self):
+        self.files = {}
+        # path -> created_at; pliki dodane wprost do `files` są "stare"
+        self.created = {}
+
+    def upload(self, path, content, file_options=None):
+        if path in self.files:
+            raise StorageApiError('The resource already exists', 'Duplicate', 409)
+        self.files[path] = content.read() if hasattr(content, 'read') else content
+        self.created[path] = datetime.now(timezone.utc).isoformat()
+
+    def list(self, path=None, options=None):
+        """Direct children of a folder, paginated like storage3 (folders have id None)"""
+        prefix = f"{path}/" if path else ""
+        entries = {}
+        for name in sorted(self.files):
+            if not name.startswith(prefix):
+                continue
+            child, _, rest = name[len(prefix):].partition('/')
+            if rest:
+                entries.setdefault(child, {'name': child, 'id': None, 'metadata': None})
+            else:
+                entries[child] = {
+                    'name': child, 'id': name,
+                    'created_at': self.created.get(name, '2020-01-01T00:00:00.000Z'),
+                    'metadata': {'size': len(self.files[name])},
+                }
+        options = options or {}
+        offset = options.get('offset', 0)
+        return list(entries.values())[offset:offset + options.get('limit', 100)]
+
+    def get_public_url(self, path):
+        return f"https://cdn.test/{path}"
+
+    def remove(self, paths):
+        for path in paths:
+            self.files.pop(path, None)
+
+
+class FakeSupabase:
+    def __init__(self, buses):
+        self.buses = FakeTable(buses)
+        self.bucket = FakeBucket()
+        self.storage = type('Storage', (), {'from_': lambda _, name: self.bucket})()
+
+    def table(self, name):
+        return self.buses
@@ -0,0 +1,160 @@
+"""
+Local stand-in for Otomoto serving the fixture pages over real HTTP
+
+The fixtures in fixtures/otomoto are synthetic, hand-written pages that
+follow Otomoto's markup (the __NEXT_DATA__ state, the legacy
+window.__APP_STATE__ script, advert-details DOM, dealer result cards).
+They are not captured from the live site.
+
+- /inventory?page=N  dealer page N (empty page past the last one)
+- /otomoto/...       offer pages; every link on the dealer page gets its own
+                     offer, built from the fixture offer pages with a
+                     unique VIN and title; supports ETag / If-None-Match
+- /olxcdn/...        photo bytes
+
+LocalFetcher is the production HttpFetcher with www.otomoto.pl and the
+olxcdn host pointed at this server, so the whole sync runs without network.
+"""
+import hashlib
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from otomoto_sync import HttpFetcher
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures' / 'otomoto'
+
+OTOMOTO = 'https://www.otomoto.pl/'
+OLXCDN = 'https://ireland.apollo.olxcdn.com/'
+
+# Oferty z fixture: (plik, VIN, tytuł) - podmieniane na unikalne dla każdego linku
+OFFER_TEMPLATES = (
+    ('offer_state.html', 'VF1MA000X61234567', 'Renault Master L3H2 2.3 dCi 136KM Klima Tempomat'),
+    ('offer_legacy.html', 'WF0XXXTTGXJA76543', 'Ford Transit Custom 2.0 TDCi 9 osób'),
+)
+
+_OFFER_LINK = re.compile(r'href="https://www\.otomoto\.pl/([^"?]*/oferta/([^"?/]+)\.html)')
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding='utf-8')
+
+
+def offer_vin(index: int) -> str:
+    return f"LOCAL{index:012d}"
+
+
+class LocalOtomoto:
+    """Threaded HTTP server with the fixture pages; use as a context manager"""
+
+    def __init__(self, dealer_pages=('dealer_page_1.html',)):
+        self.dealer_pages = [read_fixture(name) for name in dealer_pages]
+        self.offers = {}
+        templates = [(read_fixture(name), vin, title) for name, vin, title in OFFER_TEMPLATES]
+        for page in self.dealer_pages:
+            for path, _ in _OFFER_LINK.findall(page):
+                index = len(self.offers)
+                html, vin, title = templates[index % len(templates)]
+                self.offers[path] = html.replace(vin, offer_vin(index)).replace(title, f"{title} #{index}")
+        self.requests = Counter()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def dealer_url(self) -> str:
+        return f"{self.base_url}/inventory"
+
+    def local(self, url: str) -> str:
+        """Map an Otomoto / olxcdn URL onto this server"""
+        if url.startswith(OTOMOTO):
+            return f"{self.base_url}/otomoto/{url[len(OTOMOTO):]}"
+        if url.startswith(OLXCDN):
+            return f"{self.base_url}/olxcdn/{url[len(OLXCDN):]}"
+        return url
+
+    def start(self) -> 'LocalOtomoto':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                site.requests[parts.path.split('/')[1]] += 1
+                if parts.path == '/inventory':
+                    page = int(parse_qs(parts.query).get('page', ['1'])[0])
+                    html = site.dealer_pages[page - 1] if page <= len(site.dealer_pages) else '<html><body></body></html>'
+                    return self._send(html.encode('utf-8'), 'text/html; charset=utf-8')
+                if parts.path.startswith('/otomoto/'):
+                    html = site.offers.get(parts.path[len('/otomoto/'):])
+                    if html is None:
+                        return self._send(b'Not found', 'text/plain', status=404)
+                    return self._send(html.encode('utf-8'), 'text/html; charset=utf-8', conditional=True)
+                if parts.path.startswith('/olxcdn/'):
+                    body = b'\xff\xd8\xff\xe0' + hashlib.sha256(parts.path.encode()).digest() * 64
+                    return self._send(body, 'image/jpeg')
+                self._send(b'Not found', 'text/plain', status=404)
+
+            def _send(self, body: bytes, content_type: str, status: int = 200, conditional: bool = False):
+                etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+                if conditional and self.headers.get('If-None-Match') == etag:
+                    site.requests['not-modified'] += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if conditional:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+class LocalFetcher(HttpFetcher):
+    """Production fetcher with Otomoto hosts redirected to a LocalOtomoto"""
+
+    def __init__(self, site: LocalOtomoto):
+        super().__init__()
+        self.site = site
+
+    def fetch_page(self, url):
+        return super().fetch_page(self.site.local(url))
+
+    def fetch_offer(self, url, etag=None, last_modified=None):
+        return super().fetch_offer(self.site.local(url), etag, last_modified)
+
+    def download_image(self, url, out):
+        return super().download_image(self.site.local(url), out)
@@ -0,0 +1,55 @@
+"""
+Unit tests for the AdminGuard ASGI middleware
+Run with: pytest backend/tests/test_admin_guard.py -v
+"""
+import asyncio
+import json
+
+import pytest
+
+
+class TestAdminGuard:
+
+    def call(self, path, method="GET", headers=()):
+        import server
+
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append((receive, send))
+
+        sent = []
+
+        async def receive():
+            return {"type": "http.request"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+        asyncio.run(server.AdminGuard(app)(scope, receive, send))
+        return calls, sent, (receive, send)
+
+    def test_other_paths_pass_straight_through(self):
+        calls, sent, channels = self.call('/static/js/main.js')
+        assert calls == [channels] and sent == []
+
+    def test_admin_path_without_credentials(self):
+        calls, sent, _ = self.call('/api/admin/listings')
+        assert calls == []
+        assert sent[0]['status'] == 401 and json.loads(sent[1]['body']) == {"detail": "Unauthorized"}
+
+    @pytest.mark.parametrize("method,headers", [
+        ("OPTIONS", []),
+        ("GET", [(b'authorization', b'Bearer x.y.z')]),
+    ])
+    def test_preflight_and_bearer_pass(self, method, headers):
+        calls, _, _ = self.call('/api/admin/listings', method, headers)
+        assert len(calls) == 1
+
+    def test_admin_cookie_passes(self):
+        import server
+
+        cookie = f"{server.ADMIN_COOKIE_NAME}={server._sign('ok')}".encode()
+        calls, _, _ = self.call('/api/admin/listings', headers=[(b'cookie', cookie)])
+        assert len(calls) == 1
@@ -0,0 +1,174 @@
+"""
+Unit tests for concurrent bulk uploads
+Run with: pytest backend/tests/test_bulk_upload.py -v
+"""
+import asyncio
+import json
+
+import pytest
+
+from bulk_upload import BulkUpload, ndjson_events
+from tests.conftest import BOUNDARY, JPEG, PNG, multipart_body
+from upload_stream import UploadError
+
+
+class FakeRequest:
+    """Multipart body delivered in chunks, with an optional pause between them"""
+
+    def __init__(self, body, chunk=64, delay=0.0, content_type=f'multipart/form-data; boundary={BOUNDARY}'):
+        self.headers = {'content-type': content_type}
+        self.body = body
+        self.chunk = chunk
+        self.delay = delay
+        self.finished = False
+
+    async def stream(self):
+        for i in range(0, len(self.body), self.chunk):
+            await asyncio.sleep(self.delay)
+            yield self.body[i:i + self.chunk]
+        self.finished = True
+
+
+def collect(request, store, concurrency=2):
+    async def run():
+        bulk = BulkUpload(request, store, concurrency)
+        await bulk.receive()
+        return [event async for event in bulk.events()]
+    return asyncio.run(run())
+
+
+def photos(n):
+    return [('files', f'{i}.jpg', JPEG + bytes([i]) * 50) for i in range(n)]
+
+
+class TestBulkUploadEvents:
+
+    def test_results_in_input_order(self):
+        async def store(upload):
+            # Pierwsze pliki kończą się najpóźniej
+            await asyncio.sleep(0.03 - int(upload.filename.split('.')[0]) * 0.005)
+            return f"https://cdn.test/{upload.filename}"
+
+        events = collect(FakeRequest(multipart_body(*photos(5))), store)
+        done = events[-1]
+
+        assert done['event'] == 'done' and done['success'] is True
+        assert done['urls'] == [f"https://cdn.test/{i}.jpg" for i in range(5)]
+        assert [r['index'] for r in done['results']] == list(range(5))
+        stored = [e['index'] for e in events if e['event'] == 'stored']
+        assert sorted(stored) == list(range(5)) and stored != list(range(5))
+
+    def test_concurrency_is_bounded(self):
+        active = []
+        peak = []
+
+        async def store(upload):
+            active.append(upload)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(upload)
+            return 'url'
+
+        collect(FakeRequest(multipart_body(*photos(6)), chunk=10_000), store, concurrency=2)
+        assert max(peak) == 2
+
+    def test_storing_starts_before_body_is_received(self):
+        request = FakeRequest(multipart_body(*photos(3)), chunk=32, delay=0.001)
+        seen_unfinished = []
+
+        async def store(upload):
+            seen_unfinished.append(not request.finished)
+            return 'url'
+
+        collect(request, store)
+        assert seen_unfinished[0] is True
+
+    def test_failures_are_reported_per_file(self):
+        async def store(upload):
+            if upload.filename == '1.jpg':
+                raise ConnectionError("storage down")
+            return f"u{upload.filename}"
+
+        body = multipart_body(*photos(2), ('files', 'notes.txt', b'plain text, not an image'))
+        done = collect(FakeRequest(body), store)[-1]
+
+        assert done['urls'] == ['u0.jpg']
+        assert done['errors'][0] == '1.jpg: Błąd uploadu (storage down)'
+        assert done['errors'][1].startswith('notes.txt: Niewłaściwy format')
+
+    def test_each_file_is_received_before_it_is_stored(self):
+        async def store(upload):
+            return 'url'
+
+        events = collect(FakeRequest(multipart_body(*photos(3))), store)
+        for index in range(3):
+            kinds = [e['event'] for e in events if e.get('index') == index]
+            assert kinds == ['received', 'stored']
+
+    def test_files_are_closed(self):
+        uploads = []
+
+        async def store(upload):
+            uploads.append(upload)
+            return 'url'
+
+        collect(FakeRequest(multipart_body(*photos(3))), store)
+        assert all(u.file.closed for u in uploads)
+
+    def test_rejects_non_multipart(self):
+        async def store(upload):
+            return 'url'
+
+        with pytest.raises(UploadError):
+            collect(FakeRequest(b'{}', content_type='application/json'), store)
+
+
+class TestNdjson:
+
+    def test_one_json_object_per_line(self):
+        async def events():
+            yield {"event": "received", "index": 0, "filename": "żuk.jpg"}
+            yield {"event": "done"}
+
+        async def run():
+            return [line async for line in ndjson_events(events())]
+
+        lines = asyncio.run(run())
+        assert all(line.endswith(b"\n") for line in lines)
+        assert json.loads(lines[0])['filename'] == 'żuk.jpg'
+
+
+class TestBulkEndpoint:
+
+    def test_streams_progress_as_ndjson(self, admin_client):
+        client, supabase = admin_client
+        response = client.post('/api/upload-bulk?stream=true', files=[
+            ('files', ('a.jpg', JPEG + b'a', 'image/jpeg')),
+            ('files', ('b.png', PNG + b'b', 'image/png')),
+        ])
+
+        assert response.headers['content-type'].startswith('application/x-ndjson')
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert [e['event'] for e in events].count('received') == 2
+        done = events[-1]
+        assert done['event'] == 'done' and len(done['urls']) == 2
+        assert len(supabase.bucket.files) == 2
+
+    def test_summary_without_streaming(self, admin_client):
+        client, _ = admin_client
+        response = client.post('/api/upload-bulk', files=[('files', ('a.jpg', JPEG + b'a', 'image/jpeg'))])
+
+        body = response.json()
+        assert set(body) == {'success', 'urls', 'variants', 'errors', 'results'}
+        assert body['results'][0]['filename'] == 'a.jpg'
+
+    def test_too_many_files_is_a_bad_request(self, admin_client, monkeypatch):
+        import upload_stream
+
+        monkeypatch.setattr(upload_stream, 'MAX_UPLOAD_FILES', 1)
+        client, supabase = admin_client
+        response = client.post('/api/upload-bulk?stream=true', files=[
+            ('files', ('a.jpg', JPEG + b'a', 'image/jpeg')),
+            ('files', ('b.jpg', JPEG + b'b', 'image/jpeg')),
+        ])
+        assert response.status_code == 400
@@ -0,0 +1,69 @@
+"""
+Tests for the HTML parser backends (lxml must match html.parser)
+Run with: pytest backend/tests/test_html_dom.py -v
+"""
+import pytest
+from html_dom import available_backends, parse_html
+from otomoto_extractor import _YOUTUBE, extract_offer
+from otomoto_sync import parse_dealer_cards
+from benchmarks.bench_otomoto_extractor import load_fixture
+
+pytestmark = pytest.mark.skipif('lxml' not in available_backends(), reason="lxml not installed")
+
+FIXTURES = ['offer_state.html', 'offer_legacy.html', 'dealer_page_1.html']
+
+SNIPPETS = [
+    '',
+    '<h1>  Renault <b>Master</b> <!-- ukryte --> L3H2 </h1>',
+    '<div data-testid="ad-price-container"><span>od</span><h3 class="Offer-PRICE">65&nbsp;900 PLN</h3></div>',
+    '<h3 class="offer-price__number">49 000</h3>',
+    '<div data-testid="ad-price-container">72 500 PLN</div>',
+    '<div data-testid="ad-description"><p>Pierwsza<br>linia<br/>druga</p>tekst<p>Trzecia &amp; <i>czwarta</i></p><script>var x=1;</script></div>',
+    '<div class="x offer-description__description y"><p>Stary opis</p></div>',
+    '<div data-testid="advert-details-item"><p>VIN</p><p> WF0XXX </p></div><div data-testid="advert-details-item"><p>Kolor</p><p>Biały</p></div>',
+    '<iframe src="https://maps.google.com/x"></iframe><iframe src="https://www.youtube.com/embed/abc_123"></iframe>',
+    '<article><a href="https://www.otomoto.pl/oferta/a?x=1">A</a> <p> 10 000 <b>PLN</b></p></article><a href="/b">B</a>',
+]
+
+LOOKUPS = ('heading', 'details_vin', 'price_text', 'description')
+
+
+def lookups(content, backend):
+    dom = parse_html(content, backend)
+    result = {name: getattr(dom, name)() for name in LOOKUPS}
+    dom = parse_html(content, backend)
+    result['iframe_src'] = dom.iframe_src(_YOUTUBE)
+    result['links'] = list(dom.links())
+    return result
+
+
+class TestBackendsAgree:
+    """Every lookup returns the same value on both backends"""
+
+    @pytest.mark.parametrize("html", SNIPPETS)
+    def test_snippets(self, html):
+        assert lookups(html, 'lxml') == lookups(html, 'html.parser')
+
+    @pytest.mark.parametrize("name", FIXTURES)
+    def test_fixtures(self, name):
+        html = load_fixture(name)
+        assert lookups(html, 'lxml') == lookups(html, 'html.parser')
+
+    def test_bytes_input(self):
+        html = SNIPPETS[1].encode('utf-8')
+        assert lookups(html, 'lxml') == lookups(html, 'html.parser')
+
+
+class TestExtraction:
+    """Extractor and dealer parsing give identical results per backend"""
+
+    @pytest.mark.parametrize("name", ['offer_state.html', 'offer_legacy.html'])
+    def test_offer(self, name):
+        html = load_fixture(name)
+        assert extract_offer(html, 'lxml') == extract_offer(html, 'html.parser')
+
+    def test_dealer_page(self):
+        html = load_fixture('dealer_page_1.html').encode('utf-8')
+        cards = parse_dealer_cards(html, 'lxml')
+        assert len(cards) == 32
+        assert cards == parse_dealer_cards(html, 'html.parser')
@@ -0,0 +1,81 @@
+"""
+Unit tests for conditional JSON responses
+Run with: pytest backend/tests/test_http_cache.py -v
+"""
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from starlette.requests import Request
+
+from http_cache import RenderedJSON, conditional_response
+from listing_cache import TTLCache
+
+MODIFIED = datetime(2025, 1, 5, 12, 0, tzinfo=timezone.utc)
+
+
+def make_request(**headers) -> Request:
+    raw = [(k.replace('_', '-').lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+class TestRenderedJSON:
+    """Test body rendering and ETag"""
+
+    def test_etag_is_stable(self):
+        assert RenderedJSON({"a": 1, "b": [1, 2]}).etag == RenderedJSON({"a": 1, "b": [1, 2]}).etag
+
+    def test_etag_changes_with_content(self):
+        assert RenderedJSON({"a": 1}).etag != RenderedJSON({"a": 2}).etag
+
+    def test_body_matches_json_response(self):
+        assert RenderedJSON({"marka": "Łada"}).body == '{"marka":"Łada"}'.encode("utf-8")
+
+
+class TestConditionalResponse:
+    """Test 200 / 304 selection"""
+
+    def test_full_response_has_validators(self):
+        rendered = RenderedJSON([1, 2, 3], MODIFIED)
+        response = conditional_response(make_request(), rendered)
+        assert response.status_code == 200
+        assert response.headers["etag"] == rendered.etag
+        assert "last-modified" in response.headers
+        assert "cache-control" in response.headers
+
+    def test_if_none_match(self):
+        rendered = RenderedJSON([1])
+        assert conditional_response(make_request(if_none_match=rendered.etag), rendered).status_code == 304
+        assert conditional_response(make_request(if_none_match='W/' + rendered.etag), rendered).status_code == 304
+        assert conditional_response(make_request(if_none_match='"other"'), rendered).status_code == 200
+
+    def test_if_modified_since(self):
+        rendered = RenderedJSON([2], MODIFIED)
+        current = format_datetime(rendered.last_modified, usegmt=True)
+        older = format_datetime(rendered.last_modified - timedelta(seconds=1), usegmt=True)
+        assert conditional_response(make_request(if_modified_since=current), rendered).status_code == 304
+        assert conditional_response(make_request(if_modified_since=older), rendered).status_code == 200
+
+    def test_if_none_match_takes_precedence(self):
+        rendered = RenderedJSON([3], MODIFIED)
+        current = format_datetime(rendered.last_modified, usegmt=True)
+        request = make_request(if_none_match='"other"', if_modified_since=current)
+        assert conditional_response(request, rendered).status_code == 200
+
+    def test_no_last_modified_without_a_source(self):
+        rendered = RenderedJSON([4])
+        response = conditional_response(make_request(if_modified_since='Sun, 05 Jan 2025 12:00:00 GMT'), rendered)
+        assert response.status_code == 200
+        assert "last-modified" not in response.headers
+
+    def test_last_modified_never_goes_back_for_a_repeated_body(self):
+        """A → B → A: the old body comes back with a newer Last-Modified"""
+        cache = TTLCache(ttl=60, max_entries=8)
+        first = RenderedJSON({"zarezerwowany": False}, cache.modified_at)
+        cache.clear()
+        cache.clear()
+        again = RenderedJSON({"zarezerwowany": False}, cache.modified_at)
+
+        assert again.etag == first.etag
+        assert again.last_modified >= first.last_modified + timedelta(seconds=2)
+        since = format_datetime(first.last_modified, usegmt=True)
+        assert conditional_response(make_request(if_modified_since=since), again).status_code == 200
@@ -0,0 +1,186 @@
+"""
+Unit tests for the shared pooled HTTP client
+Run with: pytest backend/tests/test_http_client.py -v
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+from http_client import HttpClient, close_http_client, get_http_client
+from otomoto_sync import HttpFetcher
+
+
+class Server:
+    """Local server: /ok, /flaky/<n> (503 n times), /cookie, /slow; records client ports"""
+
+    def __init__(self):
+        self.hits = Counter()
+        self.ports = set()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.cookies = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.hits[self.path] += 1
+                    server.ports.add(self.client_address[1])
+                    server.cookies.append(self.headers.get('Cookie'))
+                if self.path.startswith('/flaky/'):
+                    if server.hits[self.path] <= int(self.path.rsplit('/', 1)[1]):
+                        return self._send(503, b'busy')
+                if self.path == '/cookie':
+                    return self._send(200, b'ok', [('Set-Cookie', 'cf_clearance=abc; Path=/')])
+                if self.path == '/slow':
+                    with server.lock:
+                        server.active += 1
+                        server.max_active = max(server.max_active, server.active)
+                    time.sleep(0.05)
+                    with server.lock:
+                        server.active -= 1
+                self._send(200, b'ok')
+
+            def _send(self, status, body, headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    s = Server()
+    yield s
+    s.stop()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(http_client, 'HTTP_BACKOFF', 0)
+    c = HttpClient(max_per_host=2)
+    yield c
+    c.close()
+
+
+class TestKeepAlive:
+    """Connections are pooled and reused"""
+
+    def test_sequential_requests_reuse_one_connection(self, server, client):
+        for _ in range(5):
+            assert client.get(server.url('/ok')).status_code == 200
+        assert len(server.ports) == 1
+
+    def test_connections_shared_between_threads(self, server, client):
+        for _ in range(3):
+            t = threading.Thread(target=lambda: client.get(server.url('/ok')))
+            t.start()
+            t.join()
+        assert len(server.ports) == 1
+
+    def test_per_host_connection_limit(self, server, client):
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            statuses = list(pool.map(lambda _: client.get(server.url('/slow')).status_code, range(6)))
+        assert statuses == [200] * 6
+        assert server.max_active <= 2
+        assert len(server.ports) <= 2
+
+
+class TestRetries:
+    """Transient failures are retried with backoff"""
+
+    def test_retries_transient_status(self, server, client):
+        assert client.get(server.url('/flaky/2')).status_code == 200
+        assert server.hits['/flaky/2'] == 3
+
+    def test_returns_last_response_when_retries_run_out(self, server, client):
+        response = client.get(server.url('/flaky/10'))
+        assert response.status_code == 503
+        assert server.hits['/flaky/10'] == http_client.HTTP_RETRIES + 1
+
+    def test_browser_session_leaves_503_to_cloudscraper(self, server, client):
+        response = client.get(server.url('/flaky/1'), browser=True)
+        assert response.status_code == 503
+        assert server.hits['/flaky/1'] == 1
+
+    def test_connection_errors_raise(self, client):
+        with pytest.raises(Exception):
+            client.get('http://127.0.0.1:9/', timeout=0.5)
+
+
+class TestSessions:
+
+    def test_cookies_shared_between_sessions_and_threads(self, server, client):
+        client.get(server.url('/cookie'), browser=True)
+        t = threading.Thread(target=lambda: client.get(server.url('/ok')))
+        t.start()
+        t.join()
+        assert server.cookies[-1] == 'cf_clearance=abc'
+
+    def test_browser_sessions_share_user_agent(self, client):
+        agents = []
+        for _ in range(2):
+            t = threading.Thread(target=lambda: agents.append(client.session(browser=True).headers['User-Agent']))
+            t.start()
+            t.join()
+        assert agents[0] == agents[1] == client._browser_headers['User-Agent']
+
+    def test_session_is_created_once_per_thread(self, client):
+        assert client.session() is client.session()
+        assert client.session(browser=True) is not client.session()
+
+    def test_timeouts(self, client):
+        assert client.timeout() == (http_client.HTTP_CONNECT_TIMEOUT, http_client.HTTP_READ_TIMEOUT)
+        assert client.timeout(5) == (http_client.HTTP_CONNECT_TIMEOUT, 5)
+        assert client.timeout((1, 2)) == (1, 2)
+
+    def test_closed_client_refuses_requests(self, server):
+        c = HttpClient()
+        c.close()
+        with pytest.raises(RuntimeError):
+            c.get(server.url('/ok'))
+
+
+class TestSharedClient:
+
+    def test_one_client_per_process(self):
+        try:
+            assert get_http_client() is get_http_client()
+            first = get_http_client()
+            close_http_client()
+            assert get_http_client() is not first
+        finally:
+            close_http_client()
+
+    def test_fetcher_uses_shared_client(self, server, client):
+        assert HttpFetcher().client is get_http_client()
+        fetcher = HttpFetcher(client)
+        assert fetcher.fetch_page(server.url('/ok')) == b'ok'
+        assert fetcher.fetch_offer(server.url('/ok')).html == 'ok'
+        assert len(server.ports) == 2  # sesja zwykła + przeglądarkowa
+        close_http_client()
@@ -0,0 +1,158 @@
+"""
+Unit tests for the content-addressed image store
+Run with: pytest backend/tests/test_image_store.py -v
+"""
+import asyncio
+
+from db import shutdown_db_pool
+from image_store import ImageStore, StoredImage, all_variant_paths, listing_images
+from tests.conftest import JPEG
+from tests.fakes import FakeSupabase
+
+URL = "https://cdn.test/"
+
+
+class RecordingBucket:
+    """FakeBucket.remove that records batches and can fail"""
+
+    def __init__(self, bucket, fail=False):
+        self.bucket = bucket
+        self.fail = fail
+        self.batches = []
+
+    def __call__(self, paths):
+        if self.fail:
+            raise ConnectionError("storage down")
+        self.batches.append(list(paths))
+        self.bucket.__class__.remove(self.bucket, paths)
+
+
+def run(coro):
+    try:
+        return asyncio.run(coro)
+    finally:
+        shutdown_db_pool()
+
+
+def store_with(rows, files=(), **kwargs):
+    supabase = FakeSupabase(rows)
+    for path in files:
+        supabase.bucket.files[path] = b'x'
+    return ImageStore(supabase, delay=0, **kwargs), supabase
+
+
+class TestLocate:
+
+    def test_bucket_local_and_external_urls(self, tmp_path):
+        store = ImageStore(FakeSupabase([]), tmp_path)
+        assert store.locate(f"{URL}buses/a.jpg?t=1") == StoredImage('bucket', 'buses/a.jpg')
+        assert store.locate("/uploads/buses/b.png") == StoredImage('local', 'buses/b.png')
+        assert store.locate("https://ireland.apollo.olxcdn.com/v1/files/x/image") is None
+        assert store.locate("/uploads/../server.py") is None
+        assert store.locate(None) is None
+
+    def test_reference_counts(self):
+        store, _ = store_with([])
+        rows = [
+            {'zdjecia': [f"{URL}buses/a.jpg", f"{URL}buses/b.jpg"], 'zdjecieGlowne': f"{URL}buses/a.jpg"},
+            {'zdjecia': None, 'zdjecieGlowne': f"{URL}buses/a.jpg"},
+        ]
+        counts = store.reference_counts(rows)
+        assert counts[StoredImage('bucket', 'buses/a.jpg')] == 2
+        assert counts[StoredImage('bucket', 'buses/b.jpg')] == 1
+
+    def test_listing_images(self):
+        assert listing_images({'zdjecia': ['a', None], 'zdjecieGlowne': 'b'}) == ['a', 'b']
+
+
+class TestCollect:
+
+    def test_removes_only_unreferenced_photos(self):
+        shared = f"{URL}buses/shared.jpg"
+        store, supabase = store_with(
+            [{'id': 'other', 'zdjecia': [shared]}],
+            files=['buses/shared.jpg', 'buses/gone.jpg', 'buses/gone/card.webp'],
+        )
+        store.release([shared, f"{URL}buses/gone.jpg", "https://elsewhere.test/x.jpg"], schedule=False)
+
+        stats = run(store.collect())
+
+        assert stats == {"removed": 1, "kept": 1, "failed": 0}
+        assert set(supabase.bucket.files) == {'buses/shared.jpg'}
+
+    def test_variants_are_removed_with_the_photo(self):
+        assert 'buses/abc/card.webp' in all_variant_paths('buses/abc.jpg')
+
+    def test_recently_uploaded_photos_are_kept(self):
+        store, supabase = store_with([], files=['buses/new.jpg'])
+        store.claim('bucket', 'buses/new.jpg')
+        store.release([f"{URL}buses/new.jpg"], schedule=False)
+
+        assert run(store.collect())["kept"] == 1
+        assert 'buses/new.jpg' in supabase.bucket.files
+
+    def test_deletes_in_batches(self, monkeypatch):
+        store, supabase = store_with([], files=[f'buses/{i}.jpg' for i in range(5)], batch_size=2)
+        remove = RecordingBucket(supabase.bucket)
+        monkeypatch.setattr(supabase.bucket, 'remove', remove)
+        store.release([f"{URL}buses/{i}.jpg" for i in range(5)], schedule=False)
+
+        assert run(store.collect())["removed"] == 5
+        assert len(remove.batches) == 3
+        assert supabase.bucket.files == {}
+
+    def test_failed_batches_are_retried_later(self, monkeypatch):
+        store, supabase = store_with([], files=['buses/a.jpg'])
+        remove = RecordingBucket(supabase.bucket, fail=True)
+        monkeypatch.setattr(supabase.bucket, 'remove', remove)
+        store.release([f"{URL}buses/a.jpg"], schedule=False)
+
+        assert run(store.collect())["failed"] == 1
+        remove.fail = False
+        assert run(store.collect())["removed"] == 1
+        assert supabase.bucket.files == {}
+
+    def test_local_fallback_files(self, tmp_path):
+        (tmp_path / 'buses' / 'a').mkdir(parents=True)
+        (tmp_path / 'buses' / 'a.jpg').write_bytes(b'x')
+        (tmp_path / 'buses' / 'a' / 'card.webp').write_bytes(b'x')
+        store = ImageStore(FakeSupabase([]), tmp_path, delay=0)
+        store.release(["/uploads/buses/a.jpg"], schedule=False)
+
+        run(store.collect())
+        assert list((tmp_path / 'buses').iterdir()) == []
+
+    def test_release_schedules_one_background_collection(self):
+        store, supabase = store_with([], files=['buses/a.jpg', 'buses/b.jpg'])
+
+        async def delete_two():
+            store.release([f"{URL}buses/a.jpg"])
+            store.release([f"{URL}buses/b.jpg"])
+            await store.wait()
+
+        run(delete_two())
+        assert supabase.bucket.files == {}
+
+
+class TestEndpoints:
+
+    def test_same_photo_is_stored_once(self, admin_client):
+        client, supabase = admin_client
+        first = client.post('/api/upload', files={'file': ('a.jpg', JPEG + b'same', 'image/jpeg')}).json()
+        second = client.post('/api/upload', files={'file': ('b.jpg', JPEG + b'same', 'image/jpeg')}).json()
+
+        assert first['url'] == second['url']
+        assert len(supabase.bucket.files) == 1
+
+    def test_delete_listing_releases_its_photos(self, admin_client):
+        import server
+
+        client, supabase = admin_client
+        supabase.buses.rows.extend([
+            {'id': 'a', 'zdjecia': [f"{URL}buses/only-a.jpg", f"{URL}buses/shared.jpg"]},
+            {'id': 'b', 'zdjecia': [f"{URL}buses/shared.jpg"]},
+        ])
+        assert client.delete('/api/admin/listings/a').status_code == 200
+
+        store = server.image_store()
+        assert run(store.collect()) == {"removed": 1, "kept": 1, "failed": 0}
@@ -0,0 +1,194 @@
+"""
+Unit tests for responsive image variants
+Run with: pytest backend/tests/test_image_variants.py -v
+"""
+import asyncio
+import io
+
+import pytest
+from postgrest.exceptions import APIError
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+import image_variants  # noqa: E402
+from db import shutdown_db_pool  # noqa: E402
+from image_variants import (  # noqa: E402
+    photo_variants_for, render_variants, shutdown_image_pool, store_variants, variant_map, variant_path,
+)
+from listing_mapping import map_bus_db_to_card  # noqa: E402
+from tests.fakes import FakeSupabase  # noqa: E402
+from tests.test_otomoto_images import FakeDownloads, ingest  # noqa: E402
+
+FORMATS = ['webp']
+
+
+def jpeg(width, height, exif=None):
+    out = io.BytesIO()
+    image = Image.new('RGB', (width, height), (200, 30, 30))
+    if exif is not None:
+        image.save(out, format='JPEG', exif=exif)
+    else:
+        image.save(out, format='JPEG')
+    return out.getvalue()
+
+
+@pytest.fixture
+def image_pool():
+    yield
+    shutdown_image_pool()
+
+
+class TestRenderVariants:
+
+    def test_widths_are_capped_and_not_upscaled(self):
+        variants = render_variants(jpeg(1000, 500), FORMATS)
+
+        assert [(v.name, v.width, v.height) for v in variants] == [
+            ('thumb', 320, 160), ('card', 640, 320), ('gallery', 1000, 500),
+        ]
+        with Image.open(io.BytesIO(variants[0].data)) as image:
+            assert image.format == 'WEBP' and image.size == (320, 160)
+
+    def test_metadata_is_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        exif[0x8825] = {2: (50.0, 3.0, 0.0)}  # GPS
+        variants = render_variants(jpeg(400, 300, exif=exif.tobytes()), FORMATS)
+
+        for variant in variants:
+            with Image.open(io.BytesIO(variant.data)) as image:
+                assert not image.getexif()
+                assert 'icc_profile' not in image.info
+
+    def test_exif_orientation_is_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # obrót o 90°
+        variants = render_variants(jpeg(400, 200, exif=exif.tobytes()), FORMATS)
+        assert (variants[0].width, variants[0].height) == (200, 400)
+
+    def test_no_formats_no_variants(self):
+        assert render_variants(jpeg(100, 100), []) == []
+
+
+class TestVariantPaths:
+
+    def test_variant_path_sits_next_to_original(self):
+        assert variant_path('buses/abc.jpg', 'card', 'avif') == 'buses/abc/card.avif'
+
+    def test_variant_map_groups_formats(self):
+        variants = render_variants(jpeg(500, 250), ['webp', 'webp'])[:2]
+        assert variant_map(variants, ['u1', 'u2']) == {'thumb': {'width': 320, 'webp': 'u2'}}
+
+    def test_only_variants_of_listed_photos_are_kept(self):
+        variants = {'a': {'card': {}}, 'gone': {'card': {}}}
+        assert photo_variants_for(variants, ['a', 'b']) == {'a': {'card': {}}}
+        assert photo_variants_for(None, ['a']) == {}
+
+    def test_card_gets_main_photo_variants(self):
+        row = {'zdjecieGlowne': 'a', 'zdjeciaWarianty': {'a': {'card': {'width': 640, 'webp': 'a.webp'}}}}
+        assert map_bus_db_to_card(row)['zdjecieGlowneWarianty'] == {'card': {'width': 640, 'webp': 'a.webp'}}
+        assert map_bus_db_to_card({'zdjecieGlowne': 'x'})['zdjecieGlowneWarianty'] == {}
+
+
+class TestStoreVariants:
+
+    def test_renders_in_pool_and_stores(self, image_pool, monkeypatch):
+        monkeypatch.setattr(image_variants, 'IMAGE_VARIANT_FORMATS', FORMATS)
+        stored = {}
+
+        async def put(path, data, content_type):
+            stored[path] = content_type
+            return f"https://cdn.test/{path}"
+
+        result = asyncio.run(store_variants(jpeg(700, 350), 'buses/x.jpg', put))
+
+        assert result == {
+            'thumb': {'width': 320, 'webp': 'https://cdn.test/buses/x/thumb.webp'},
+            'card': {'width': 640, 'webp': 'https://cdn.test/buses/x/card.webp'},
+            'gallery': {'width': 700, 'webp': 'https://cdn.test/buses/x/gallery.webp'},
+        }
+        assert set(stored.values()) == {'image/webp'}
+
+    def test_errors_leave_the_photo_without_variants(self, image_pool):
+        async def put(path, data, content_type):
+            return path
+
+        assert asyncio.run(store_variants(b'\xff\xd8\xff not really a jpeg', 'buses/x.jpg', put)) == {}
+
+
+class TestUploadEndpoint:
+
+    def test_upload_returns_variants(self, admin_client, image_pool, monkeypatch):
+        monkeypatch.setattr(image_variants, 'IMAGE_VARIANT_FORMATS', FORMATS)
+        client, supabase = admin_client
+        response = client.post('/api/upload', files={'file': ('photo.jpg', jpeg(800, 600), 'image/jpeg')})
+
+        body = response.json()
+        assert response.status_code == 200
+        card = body['variants']['card']
+        assert card['width'] == 640
+        assert card['webp'].split('cdn.test/')[1] in supabase.bucket.files
+        assert len(supabase.bucket.files) == 1 + 3
+
+
+class TestOtomotoVariants:
+
+    def test_ingestor_records_variants_of_stored_photos(self, image_pool, monkeypatch):
+        monkeypatch.setattr(image_variants, 'IMAGE_VARIANT_FORMATS', FORMATS)
+        supabase = FakeSupabase([])
+        urls, ingestor = ingest(supabase, FakeDownloads({'u': jpeg(400, 300)}), ['u'], variants=True)
+
+        variants = ingestor.variants_for(urls)
+        assert list(variants[urls[0]]) == ['thumb', 'card']
+        assert variants[urls[0]]['thumb']['webp'].split('cdn.test/')[1] in supabase.bucket.files
+
+
+class ProbeSupabase:
+    """`buses` table whose select(...).limit(1) fails with a given error"""
+
+    def __init__(self, error):
+        self.error = error
+        self.probes = 0
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def execute(self):
+        self.probes += 1
+        raise self.error
+
+
+class TestVariantsColumnProbe:
+
+    def probe(self, server):
+        try:
+            return asyncio.run(server.variants_column_available())
+        finally:
+            shutdown_db_pool()
+
+    def test_missing_column_is_remembered(self, monkeypatch):
+        import server
+
+        supabase = ProbeSupabase(APIError({"code": "42703", "message": 'column buses.zdjeciaWarianty does not exist'}))
+        monkeypatch.setattr(server, 'supabase', supabase)
+        monkeypatch.setattr(server, '_variants_column_available', None)
+
+        assert self.probe(server) is False and self.probe(server) is False
+        assert supabase.probes == 1
+
+    def test_transient_failure_is_probed_again(self, monkeypatch):
+        import server
+
+        supabase = ProbeSupabase(ConnectionError("timeout"))
+        monkeypatch.setattr(server, 'supabase', supabase)
+        monkeypatch.setattr(server, '_variants_column_available', None)
+
+        assert self.probe(server) is False and self.probe(server) is False
+        assert supabase.probes == 2 and server._variants_column_available is None
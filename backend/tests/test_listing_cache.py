@@ -0,0 +1,69 @@
+"""
+Unit tests for the listing TTL cache
+Run with: pytest backend/tests/test_listing_cache.py -v
+"""
+from listing_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    """Test TTL, eviction and invalidation"""
+
+    def test_hit_and_miss_counters(self):
+        cache = TTLCache(ttl=10, max_entries=10)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, max_entries=10, clock=clock)
+        cache.set("a", 1)
+        clock.now = 9.9
+        assert cache.get("a") == 1
+        clock.now = 10
+        assert cache.get("a") is None
+
+    def test_lru_eviction(self):
+        """Least recently used entry is evicted first"""
+        cache = TTLCache(ttl=10, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_invalidate_predicate(self):
+        cache = TTLCache(ttl=10, max_entries=10)
+        cache.set(("list", "all"), [])
+        cache.set(("listing", "x"), {})
+        cache.set(("listing", "y"), {})
+        assert cache.invalidate(lambda k: k[0] == "list" or k == ("listing", "x")) == 2
+        assert cache.get(("listing", "y")) == {}
+
+    def test_stale_generation_is_not_cached(self):
+        """A value read before an invalidation must not be stored"""
+        cache = TTLCache(ttl=10, max_entries=10)
+        generation = cache.generation
+        cache.clear()
+        cache.set("a", "stale", generation)
+        assert cache.get("a") is None
+
+    def test_modified_at_strictly_increases(self):
+        cache = TTLCache(ttl=10, max_entries=10)
+        first = cache.modified_at
+        cache.clear()
+        second = cache.modified_at
+        cache.invalidate(lambda k: False)
+        assert first < second < cache.modified_at
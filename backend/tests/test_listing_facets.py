@@ -0,0 +1,97 @@
+"""
+Unit tests for the facet index
+Run with: pytest backend/tests/test_listing_facets.py -v
+"""
+import asyncio
+
+from db import shutdown_db_pool
+from listing_facets import FACET_COLUMNS, FacetIndex
+from listing_query import ListingQuery
+from tests.fakes import FakeSupabase, FakeTable
+
+
+BUSES = [
+    {"id": "1", "marka": "Renault", "model": "Master", "paliwo": "Diesel", "rok": 2019, "cenaBrutto": 65900},
+    {"id": "2", "marka": "Renault", "model": "Trafic", "paliwo": "Diesel", "rok": 2021, "cenaBrutto": 89000},
+    {"id": "3", "marka": "Ford", "model": "Transit", "paliwo": "Benzyna", "rok": 2017, "cenaBrutto": 49000},
+    {"id": "4", "marka": "Iveco", "model": "Daily", "paliwo": "Diesel", "rok": 2022, "cenaBrutto": None},
+]
+
+
+def make_index():
+    index = FacetIndex()
+    index.load([dict(b) for b in BUSES])
+    return index
+
+
+class TestFacetCounts:
+    """Test value counts and ranges"""
+
+    def test_unfiltered(self):
+        facets = make_index().compute(ListingQuery())
+        assert facets["total"] == 4
+        assert facets["values"]["marka"] == {"Ford": 1, "Iveco": 1, "Renault": 2}
+        assert facets["ranges"]["rok"] == {"min": 2017, "max": 2022}
+        assert facets["ranges"]["cenaBrutto"] == {"min": 49000, "max": 89000}
+
+    def test_own_filter_is_ignored(self):
+        """Selecting a make keeps the other makes in the make dropdown"""
+        facets = make_index().compute(ListingQuery(marka="Renault"))
+        assert facets["total"] == 2
+        assert facets["values"]["marka"] == {"Ford": 1, "Iveco": 1, "Renault": 2}
+        assert facets["values"]["model"] == {"Master": 1, "Trafic": 1}
+
+    def test_other_filters_apply(self):
+        facets = make_index().compute(ListingQuery(paliwo="Diesel", rokOd=2020))
+        assert facets["total"] == 2
+        assert facets["values"]["marka"] == {"Iveco": 1, "Renault": 1}
+        assert facets["values"]["paliwo"] == {"Diesel": 2}
+        assert facets["ranges"]["rok"] == {"min": 2019, "max": 2022}
+
+    def test_flag_and_dimension_filters_on_projected_rows(self):
+        """The index holds only FACET_COLUMNS, as loaded from the database"""
+        rows = [dict(b, winda=b["id"] in ("1", "3"), wymiarL="L2" if b["id"] != "3" else "L3") for b in BUSES]
+        index = FacetIndex()
+        index.load([{c: row.get(c) for c in FACET_COLUMNS} for row in rows])
+
+        assert index.compute(ListingQuery(winda=True))["values"]["marka"] == {"Ford": 1, "Renault": 1}
+        facets = index.compute(ListingQuery(wymiarL="L2"))
+        assert facets["total"] == 3
+        assert facets["ranges"]["rok"] == {"min": 2019, "max": 2022}
+
+
+class TestIncrementalUpdates:
+    """Test row-level maintenance"""
+
+    def test_upsert_and_remove(self):
+        index = make_index()
+        index.upsert({"id": "5", "marka": "Ford", "model": "Custom", "rok": 2023})
+        index.remove("1")
+        facets = index.compute(ListingQuery())
+        assert facets["values"]["marka"] == {"Ford": 2, "Iveco": 1, "Renault": 1}
+        assert facets["ranges"]["rok"]["max"] == 2023
+
+    def test_stale_load_is_discarded(self):
+        index = FacetIndex()
+        generation = index.generation
+        index.upsert({"id": "x", "marka": "Ford"})
+        index.load(BUSES, generation)
+        assert not index.loaded
+
+
+class TestIndexLoad:
+    """Test loading from the database"""
+
+    def test_reads_every_page(self, monkeypatch):
+        import server
+
+        monkeypatch.setattr(FakeTable, 'max_rows', 3)
+        monkeypatch.setattr(server, 'supabase', FakeSupabase([dict(b, id=str(i)) for i, b in enumerate(BUSES * 2)]))
+        monkeypatch.setattr(server, 'facet_index', FacetIndex())
+        try:
+            asyncio.run(server.ensure_facet_index())
+        finally:
+            shutdown_db_pool()
+
+        facets = server.facet_index.compute(ListingQuery())
+        assert facets["total"] == 8 and facets["values"]["marka"]["Renault"] == 4
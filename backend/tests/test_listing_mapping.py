@@ -0,0 +1,119 @@
+"""
+Tests for the listing mappers (full mode must match the original map_bus_db_to_listing)
+Run with: pytest backend/tests/test_listing_mapping.py -v
+"""
+import random
+import re
+from pathlib import Path
+
+import pytest
+from listing_mapping import (
+    ALIASED_FIELDS, YOUTUBE_SOURCES,
+    map_bus_db_to_listing, map_buses_db_to_listings, listing_select_columns, CARD_COLUMNS,
+)
+from benchmarks.bench_listing_mapping import legacy_map_bus_db_to_listing, sample_rows
+
+
+def legacy_listing(row):
+    """Legacy output plus the main photo variants added for CarCard's srcset"""
+    return dict(legacy_map_bus_db_to_listing(row), zdjecieGlowneWarianty={})
+
+
+ROWS = [
+    sample_rows(1)[0],
+    {"id": "empty"},
+    {"id": "english", "price_pln": 1000, "make": "Ford", "model": "Transit", "title": "Ford Transit L2",
+     "color": "Czarny", "condition_status": "Nowy", "youtubeUrl": "https://youtu.be/x"},
+    {"id": "zero", "cenaBrutto": 0, "przebieg": 0, "marka": None, "model": None, "status": "sprzedane",
+     "hak": True, "video": "https://youtu.be/y", "zdjecia": None, "stan": "Uszkodzony"},
+]
+
+
+class TestFullMode:
+    """Full mode reproduces the legacy output key for key"""
+
+    @pytest.mark.parametrize("row", ROWS, ids=lambda r: r["id"])
+    def test_matches_legacy(self, row):
+        assert map_bus_db_to_listing(row) == legacy_listing(row)
+
+    def test_does_not_mutate_row(self):
+        row = dict(ROWS[0])
+        map_bus_db_to_listing(row)
+        assert row == ROWS[0]
+
+    def test_batch(self):
+        assert map_buses_db_to_listings(ROWS) == [legacy_listing(r) for r in ROWS]
+
+    def test_random_rows_match_legacy(self):
+        """Every source column missing, falsy or set, in random combinations"""
+        columns = [c for pair in ALIASED_FIELDS for c in pair]
+        columns += ['kolor', 'color', 'liczbaMiejsc', 'seats', 'dmc', 'gvw_kg',
+                    'krajPochodzenia', 'origin_country', 'stan', 'condition_status']
+        columns += list(YOUTUBE_SOURCES) + ['title', 'model', 'zdjecia', 'wyposazenie',
+                                            'sold', 'gwarancja', 'status', 'reserved', 'hak']
+        values = (None, '', 0, False, [], 'x', 7, True, 'sprzedane')
+        rng = random.Random(5)
+        for i in range(2000):
+            row = {c: rng.choice(values) for c in columns if rng.random() < 0.6}
+            row['id'] = str(i)
+            assert map_bus_db_to_listing(row) == legacy_listing(row), row
+
+
+class TestCompactMode:
+    """Compact mode keeps one key set"""
+
+    def test_no_aliases(self):
+        result = map_buses_db_to_listings(ROWS[:1], compact=True)[0]
+        for alias in ("price_pln", "make", "description_html", "isSold", "isReserved", "youtubeUrl", "video"):
+            assert alias not in result
+
+    @pytest.mark.parametrize("row", ROWS, ids=lambda r: r["id"])
+    def test_polish_values_match_full(self, row):
+        full = map_bus_db_to_listing(row)
+        compact = map_buses_db_to_listings([row], compact=True)[0]
+        for key, value in compact.items():
+            assert full[key] == value
+
+
+class TestCardView:
+    """Card projection selects and returns only summary fields"""
+
+    def test_select_columns(self):
+        assert listing_select_columns('full') == '*'
+        columns = listing_select_columns('card').split(',')
+        assert 'opis' not in columns
+        assert 'zdjecia' not in columns
+
+    def test_select_adds_sort_column(self):
+        columns = listing_select_columns('card', extra=('kubatura', 'rok')).split(',')
+        assert columns[-1] == 'kubatura'
+        assert columns.count('rok') == 1
+
+    def test_card_shape(self):
+        row = {c: None for c in CARD_COLUMNS}
+        row.update(id='x', marka='Iveco', status='sprzedane', hak=True, miasto='Smyków',
+                   zdjecieGlowne='https://example.com/1.jpg')
+        card = map_buses_db_to_listings([row], view='card')[0]
+        assert card['sold'] is True
+        assert card['reserved'] is True
+        assert card['hak'] is True and card['winda'] is False
+        assert card['lokalizacja'] == 'Smyków'
+        assert card['zdjecieGlowne'] == 'https://example.com/1.jpg'
+        assert 'opis' not in card
+
+    def test_variants_follow_the_main_photo_rule(self):
+        variants = {'a.jpg': {'card': {'width': 640, 'webp': 'a.webp'}}, 'b.jpg': {'card': {'width': 640, 'webp': 'b.webp'}}}
+        row = {'id': 'x', 'zdjecia': ['a.jpg', 'b.jpg'], 'zdjeciaWarianty': variants}
+        assert map_bus_db_to_listing(row)['zdjecieGlowneWarianty'] == variants['a.jpg']
+        row['zdjecieGlowne'] = 'b.jpg'
+        assert map_bus_db_to_listing(row)['zdjecieGlowneWarianty'] == variants['b.jpg']
+        assert map_buses_db_to_listings([row], view='card')[0]['zdjecieGlowneWarianty'] == variants['b.jpg']
+
+    def test_card_has_every_field_car_card_renders(self):
+        """Keys read as `bus.<field>` in CarCard.jsx; the gallery is only a full-view fallback"""
+        source = Path(__file__).resolve().parents[2] / 'frontend' / 'src' / 'components' / 'CarCard.jsx'
+        if not source.exists():
+            pytest.skip("frontend sources not available")
+        rendered = set(re.findall(r'\bbus\.(\w+)', source.read_text(encoding='utf-8'))) - {'zdjecia'}
+        card = map_buses_db_to_listings([{c: None for c in CARD_COLUMNS}], view='card')[0]
+        assert rendered <= set(card), rendered - set(card)
@@ -0,0 +1,97 @@
+"""
+Unit tests for listing query (filters, sorting, cursor pagination)
+Run with: pytest backend/tests/test_listing_query.py -v
+"""
+import pytest
+from listing_query import (
+    ListingQuery,
+    encode_cursor,
+    decode_cursor,
+    matches_listing_query,
+    query_listings_in_memory,
+    build_page,
+)
+
+
+BUSES = [
+    {"id": "a", "marka": "Renault", "rok": 2019, "cenaBrutto": 65900, "przebieg": 185000, "dataPublikacji": "2025-01-03"},
+    {"id": "b", "marka": "Ford", "rok": 2021, "cenaBrutto": 89000, "przebieg": 120000, "dataPublikacji": "2025-01-05"},
+    {"id": "c", "marka": "Renault", "rok": 2017, "cenaBrutto": 49000, "przebieg": 240000, "dataPublikacji": "2025-01-01"},
+    {"id": "d", "marka": "Iveco", "rok": 2020, "cenaBrutto": 89000, "przebieg": None, "dataPublikacji": "2025-01-04"},
+    {"id": "e", "marka": "Renault", "rok": 2022, "cenaBrutto": None, "przebieg": 30000, "dataPublikacji": "2025-01-02"},
+]
+
+
+def collect_pages(query: ListingQuery):
+    """Walk every page following next_cursor"""
+    ids = []
+    while True:
+        page = build_page(query_listings_in_memory(BUSES, query), query, lambda b: b)
+        ids.extend(b["id"] for b in page["items"])
+        if not page["next_cursor"]:
+            return ids
+        query = query.model_copy(update={"cursor": page["next_cursor"]})
+
+
+class TestListingQuery:
+    """Test query parameter model"""
+
+    def test_bare_query(self):
+        """No parameters means legacy full-list response"""
+        assert ListingQuery().is_bare()
+        assert not ListingQuery(marka="Renault").is_bare()
+        assert not ListingQuery(limit=10).is_bare()
+
+    def test_default_sort(self):
+        """Default sort is newest first"""
+        q = ListingQuery()
+        assert q.sort_column == "dataPublikacji"
+        assert q.sort_desc is True
+
+
+class TestFilters:
+    """Test in-memory filter matching"""
+
+    def test_eq_filter(self):
+        q = ListingQuery(marka="Renault")
+        assert [b["id"] for b in BUSES if matches_listing_query(b, q)] == ["a", "c", "e"]
+
+    def test_emission_standard_filter(self):
+        buses = [{"id": "a", "normaEmisji": "Euro 6"}, {"id": "b", "normaEmisji": "Euro 5"}, {"id": "c"}]
+        q = ListingQuery(normaEmisji="Euro 6")
+        assert [b["id"] for b in buses if matches_listing_query(b, q)] == ["a"]
+
+    def test_range_filter(self):
+        q = ListingQuery(rokOd=2019, cenaDo=70000)
+        assert [b["id"] for b in BUSES if matches_listing_query(b, q)] == ["a"]
+
+    def test_range_excludes_missing_values(self):
+        """Rows without a value never match a range filter"""
+        q = ListingQuery(przebiegDo=500000)
+        assert "d" not in [b["id"] for b in BUSES if matches_listing_query(b, q)]
+
+
+class TestCursorPagination:
+    """Test keyset cursor pagination"""
+
+    def test_cursor_roundtrip(self):
+        q = ListingQuery(sortBy="cena-asc")
+        assert decode_cursor(encode_cursor({"cenaBrutto": 100, "id": "x"}, q)) == (100, "x")
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError, match="kursor"):
+            decode_cursor("not-a-cursor")
+
+    def test_pages_cover_all_rows_once(self):
+        """Ties and NULLs are ordered by id and never repeated across pages"""
+        ids = collect_pages(ListingQuery(sortBy="cena-desc", limit=2))
+        assert ids == ["b", "d", "a", "c", "e"]
+
+    def test_pages_with_filter(self):
+        ids = collect_pages(ListingQuery(marka="Renault", sortBy="rok-asc", limit=1))
+        assert ids == ["c", "a", "e"]
+
+    def test_last_page_has_no_cursor(self):
+        page = build_page(query_listings_in_memory(BUSES, ListingQuery(limit=10)), ListingQuery(limit=10), lambda b: b)
+        assert page["next_cursor"] is None
+        assert len(page["items"]) == 5
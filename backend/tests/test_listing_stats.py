@@ -0,0 +1,122 @@
+"""
+Unit tests for listing statistics
+Run with: pytest backend/tests/test_listing_stats.py -v
+"""
+import asyncio
+
+import pytest
+from postgrest.exceptions import APIError
+
+from db import shutdown_db_pool
+from listing_stats import aggregate_stats, price_bucket
+from tests.fakes import FakeSupabase, FakeTable
+
+
+class TestPriceBucket:
+    """Test price bucket labels"""
+
+    def test_buckets(self):
+        assert price_bucket(0) == "0-49999"
+        assert price_bucket(49_999) == "0-49999"
+        assert price_bucket(50_000) == "50000-99999"
+        assert price_bucket(199_999) == "150000-199999"
+        assert price_bucket(250_000) == "200000+"
+
+    def test_missing_price(self):
+        assert price_bucket(None) == "brak"
+
+
+class TestAggregateStats:
+    """Test counters and facets"""
+
+    BUSES = [
+        {"marka": "Renault", "paliwo": "Diesel", "typNadwozia": "Furgon", "cenaBrutto": 65900, "wyrozniowane": True},
+        {"marka": "Renault", "paliwo": "Diesel", "typNadwozia": "Furgon", "cenaBrutto": 45000, "status": "sprzedane"},
+        {"marka": "Ford", "paliwo": "Benzyna", "typNadwozia": None, "cenaBrutto": None, "hak": True, "nowosc": True},
+        {"marka": "Iveco", "gwarancja": True, "reserved": True, "flotowy": True},
+    ]
+
+    def test_legacy_counters(self):
+        stats = aggregate_stats(self.BUSES)
+        assert stats["total"] == 4
+        assert stats["wyrozniowane"] == 1
+        assert stats["nowe"] == 1
+        assert stats["flotowe"] == 1
+
+    def test_status_counters(self):
+        """Reserved counts only listings that are not sold"""
+        stats = aggregate_stats(self.BUSES)
+        assert stats["sold"] == 2
+        assert stats["active"] == 2
+        assert stats["reserved"] == 1
+
+    def test_facets(self):
+        facets = aggregate_stats(self.BUSES)["facets"]
+        assert facets["marka"] == {"Renault": 2, "Ford": 1, "Iveco": 1}
+        assert facets["typNadwozia"] == {"Furgon": 2, "brak": 2}
+        assert facets["cena"] == {"50000-99999": 1, "0-49999": 1, "brak": 2}
+
+    def test_empty(self):
+        stats = aggregate_stats([])
+        assert stats["total"] == 0
+        assert stats["facets"]["marka"] == {}
+
+
+class FailingRpc:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, name):
+        self.calls += 1
+        raise self.error
+
+
+@pytest.fixture
+def stats_server(monkeypatch):
+    import server
+
+    supabase = FakeSupabase([{"marka": "Renault", "cenaBrutto": 65900}])
+    monkeypatch.setattr(server, 'supabase', supabase)
+    monkeypatch.setattr(server, '_stats_rpc_available', True)
+    return server, supabase
+
+
+def fetch_stats(server):
+    try:
+        return asyncio.run(server.fetch_listing_stats())
+    finally:
+        shutdown_db_pool()
+
+
+class TestStatsRpcFallback:
+    """The projection fallback and when the RPC is given up"""
+
+    def test_projection_reads_every_page(self, stats_server, monkeypatch):
+        server, supabase = stats_server
+        monkeypatch.setattr(FakeTable, 'max_rows', 4)
+        supabase.buses.rows[:] = [{"id": str(i), "marka": "Ford"} for i in range(10)]
+        supabase.rpc = FailingRpc(ConnectionError("timeout"))
+
+        stats = fetch_stats(server)
+        assert stats["total"] == 10 and stats["facets"]["marka"] == {"Ford": 10}
+
+    def test_transient_error_falls_back_once(self, stats_server):
+        server, supabase = stats_server
+        supabase.rpc = FailingRpc(ConnectionError("timeout"))
+
+        assert fetch_stats(server)["total"] == 1
+        assert fetch_stats(server)["total"] == 1
+        assert supabase.rpc.calls == 2 and server._stats_rpc_available
+
+    @pytest.mark.parametrize("error", [
+        APIError({"code": "PGRST202", "message": "Could not find the function public.bus_stats"}),
+        APIError({"code": 404, "message": "JSON could not be generated"}),
+    ])
+    def test_missing_function_disables_the_rpc(self, stats_server, error):
+        server, supabase = stats_server
+        supabase.rpc = FailingRpc(error)
+
+        fetch_stats(server)
+        fetch_stats(server)
+        assert supabase.rpc.calls == 1 and not server._stats_rpc_available
@@ -0,0 +1,93 @@
+"""
+Benchmarks for the Otomoto parse / extract / sync path (pytest-benchmark)
+Run with: pytest backend/tests/test_otomoto_benchmarks.py -v
+
+The inputs are the synthetic fixture pages (see tests/local_otomoto.py), so
+absolute numbers and ratios are indicative only, not live-page figures.
+
+Save a baseline and gate later runs against it:
+    pytest backend/tests/test_otomoto_benchmarks.py --benchmark-autosave
+    pytest backend/tests/test_otomoto_benchmarks.py --benchmark-compare --benchmark-compare-fail=min:20%
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from db import shutdown_db_pool
+from html_dom import available_backends, parse_html
+from otomoto_extractor import extract_offer, scan_parameters
+from otomoto_fingerprints import FingerprintStore
+from otomoto_sync import OtomotoSync, parse_dealer_cards
+from tests.fakes import FakeSupabase
+from tests.local_otomoto import LocalFetcher, LocalOtomoto, read_fixture
+
+OFFERS = ['offer_state.html', 'offer_legacy.html']
+
+
+@pytest.fixture(scope="module")
+def site():
+    with LocalOtomoto() as local:
+        yield local
+
+
+class TestExtractionBenchmarks:
+
+    @pytest.mark.benchmark(group="extract_offer")
+    @pytest.mark.parametrize("backend", available_backends())
+    @pytest.mark.parametrize("name", OFFERS)
+    def test_extract_offer(self, benchmark, name, backend):
+        html = read_fixture(name)
+        offer = benchmark(extract_offer, html, backend)
+        assert offer.title
+
+    @pytest.mark.benchmark(group="scan_parameters")
+    @pytest.mark.parametrize("name", OFFERS)
+    def test_scan_parameters(self, benchmark, name):
+        html = read_fixture(name)
+        values = benchmark(scan_parameters, html)
+        assert values['marka']
+
+
+class TestParseBenchmarks:
+
+    @pytest.mark.benchmark(group="parse_html")
+    @pytest.mark.parametrize("backend", available_backends())
+    def test_parse_offer(self, benchmark, backend):
+        html = read_fixture('offer_legacy.html')
+        document = benchmark(parse_html, html, backend)
+        assert document.heading()
+
+    @pytest.mark.benchmark(group="parse_dealer_cards")
+    @pytest.mark.parametrize("backend", available_backends())
+    def test_parse_dealer_cards(self, benchmark, backend):
+        content = read_fixture('dealer_page_1.html').encode('utf-8')
+        cards = benchmark(parse_dealer_cards, content, backend)
+        assert len(cards) == 32
+
+
+class TestSyncBenchmarks:
+
+    @pytest.mark.benchmark(group="sync")
+    def test_full_sync(self, benchmark, site):
+        """Full import of the 32 local offers into an empty database"""
+
+        def setup():
+            sync = OtomotoSync(
+                FakeSupabase([]),
+                fetcher=LocalFetcher(site),
+                dealer_url=site.dealer_url,
+                host_interval=0,
+                fingerprints=FingerprintStore(path=None),
+            )
+            return (sync,), {}
+
+        def run(sync):
+            try:
+                return asyncio.run(sync.run())
+            finally:
+                shutdown_db_pool()
+
+        report = benchmark.pedantic(run, setup=setup, rounds=3)
+        assert report['new'] == 32
@@ -0,0 +1,102 @@
+"""
+Tests for the shared Otomoto offer extractor (must match the original scrape endpoint)
+Run with: pytest backend/tests/test_otomoto_extractor.py -v
+"""
+import json
+
+import pytest
+from otomoto_extractor import extract_offer, extract_oto_value, offer_form_data, scan_parameters
+from otomoto_sync import offer_to_bus_fields
+from benchmarks.bench_otomoto_extractor import (
+    legacy_extract_oto_value, legacy_scan_parameters, legacy_scrape_offer, load_fixture,
+)
+
+
+FIXTURES = ['offer_state.html', 'offer_legacy.html']
+
+
+class TestExtractOffer:
+    """Test both extraction paths"""
+
+    def test_state_path(self):
+        offer = extract_offer(load_fixture('offer_state.html'))
+        assert offer.source == 'json'
+        assert offer.title == 'Renault Master L3H2 2.3 dCi 136KM Klima Tempomat'
+        assert offer.vin == 'VF1MA000X61234567'
+        assert (offer.rok, offer.przebieg, offer.moc, offer.kubatura) == (2019, 185000, 136, 2298)
+        assert offer.cenaBrutto == 89900
+        assert offer.bezwypadkowy and offer.serwisowanyWAso and not offer.maNumerRejestracyjny
+        assert len(offer.zdjecia) == 14 and all(url.endswith(';s=1080x720') for url in offer.zdjecia)
+        assert offer.youtube == 'https://www.youtube.com/watch?v=AbCdEf12345'
+        assert 'hak & bagażnik' in offer.opis
+
+    def test_fallback_path(self):
+        offer = extract_offer(load_fixture('offer_legacy.html'))
+        assert offer.source == 'html'
+        assert offer.vin == 'WF0XXXTTGXJA76543'
+        assert offer.model == 'Transit Custom'
+        assert offer.cenaBrutto == 72500
+
+    def test_state_without_advert_falls_back(self):
+        html = ('<script id="__NEXT_DATA__" type="application/json">{"props": {}}</script>'
+                '<h1>Iveco Daily</h1><div data-testid="advert-details-item"><p>VIN</p><p>ZCFC000000D123456</p></div>')
+        offer = extract_offer(html)
+        assert offer.source == 'html'
+        assert offer.title == 'Iveco Daily' and offer.vin == 'ZCFC000000D123456'
+
+    def test_consent_text_is_not_a_vin(self):
+        state = {"props": {"advert": {"title": "Bus", "details": [{"key": "vin", "value": "Zgadzam się na wyświetlenie"}]}}}
+        html = f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(state)}</script>'
+        assert extract_offer(html).vin == ''
+
+
+TRICKY = [
+    # displayValue dopiero w kolejnym obiekcie -> wartość z "value"
+    '{"key":"year","value":"2015"},{"key":"year","displayValue":"2016"}',
+    # pusty odstęp po kluczu i spacje wokół dwukropka
+    '{"key" : "make", "label":"Marka pojazdu", "displayValue" : "Fiat"}',
+    # tylko etykieta w JSON
+    '{"label":"Kolor","value":"Czerwony"}',
+    # tylko etykieta w HTML (i wartość za długa dla innej etykiety)
+    '<dt>Przebieg</dt>><dd>120 000 km<dd><span>Wersja</span>>' + 'x' * 50 + '<',
+    # klucz zagnieżdżony przed wartością innego klucza
+    '{"key":"model","x":{"key":"version","displayValue":"L2H2"}}',
+    '',
+]
+
+
+class TestScanParameters:
+    """The combined pass returns exactly what per-field lookups did"""
+
+    @pytest.mark.parametrize("name", FIXTURES)
+    def test_fixtures(self, name):
+        html = load_fixture(name)
+        assert scan_parameters(html) == legacy_scan_parameters(html)
+
+    @pytest.mark.parametrize("html", TRICKY)
+    def test_edge_cases(self, html):
+        assert scan_parameters(html) == legacy_scan_parameters(html)
+
+    def test_single_field(self):
+        html = TRICKY[1]
+        assert extract_oto_value(html, "make", "Marka pojazdu") == legacy_extract_oto_value(html, "make", "Marka pojazdu") == "Fiat"
+
+
+class TestLegacyCompatibility:
+    """The endpoint response is unchanged"""
+
+    @pytest.mark.parametrize("name", FIXTURES)
+    def test_form_data_matches_legacy(self, name):
+        html = load_fixture(name)
+        assert offer_form_data(extract_offer(html)) == legacy_scrape_offer(html)
+
+
+class TestBusFields:
+    """Test the sync's row defaults"""
+
+    def test_defaults_for_sparse_offer(self):
+        fields = offer_to_bus_fields(extract_offer('<h1>Mercedes Sprinter</h1>'))
+        assert fields['marka'] == 'Mercedes' and fields['model'] == 'Inny'
+        assert fields['rok'] == 2000 and fields['paliwo'] == 'Diesel'
+        assert fields['opis'] == 'Zaimportowano automatycznie.'
+        assert fields['naped'] == 'Mercedes Sprinter'
@@ -0,0 +1,168 @@
+"""
+Unit tests for Otomoto photo ingestion
+Run with: pytest backend/tests/test_otomoto_images.py -v
+"""
+import asyncio
+import io
+
+import requests
+
+from db import shutdown_db_pool
+from image_store import ImageStore, StoredImage
+from otomoto_images import ImageIngestor, image_hasher, image_path, is_duplicate, stream_to
+from tests.fakes import FakeSupabase
+
+
+def digest(data: bytes) -> str:
+    hasher = image_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+class FakeDownloads:
+    """url -> bytes, or a list of exceptions to raise before succeeding"""
+
+    def __init__(self, photos, failures=None, delay=0.01):
+        self.photos = photos
+        self.failures = failures or {}
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, url, out):
+        self.calls.append(url)
+        await asyncio.sleep(self.delay)
+        pending = self.failures.get(url)
+        if pending:
+            raise pending.pop(0)
+        return stream_to([self.photos[url][:3], self.photos[url][3:]], out)
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status}", response=response)
+
+
+def ingest(supabase, downloads, urls, concurrency=4, **kwargs):
+    async def run():
+        ingestor = ImageIngestor(supabase, downloads, concurrency, backoff=0, **kwargs)
+        return await ingestor.ingest(urls), ingestor
+
+    try:
+        return asyncio.run(run())
+    finally:
+        shutdown_db_pool()
+
+
+class TestStreamTo:
+
+    def test_writes_and_hashes_chunks(self):
+        out = io.BytesIO()
+        assert stream_to([b'ab', b'', b'cd'], out) == digest(b'abcd')
+        assert out.getvalue() == b'abcd'
+
+
+class TestImageIngestor:
+
+    def test_stores_photos_in_order(self):
+        supabase = FakeSupabase([])
+        photos = {f'u{i}': f'photo-{i}'.encode() for i in range(5)}
+        stored, ingestor = ingest(supabase, FakeDownloads(photos), list(photos))
+
+        assert stored == [f"https://cdn.test/{image_path(digest(photos[u]))}" for u in photos]
+        assert supabase.bucket.files[image_path(digest(b'photo-0'))] == b'photo-0'
+        assert ingestor.stats['uploaded'] == 5
+
+    def test_same_content_is_stored_once(self):
+        supabase = FakeSupabase([])
+        photos = {'a': b'same', 'b': b'same', 'c': b'other'}
+        stored, ingestor = ingest(supabase, FakeDownloads(photos), ['a', 'b', 'c'])
+
+        assert stored[0] == stored[1] != stored[2]
+        assert len(supabase.bucket.files) == 2
+        assert ingestor.stats == {"uploaded": 2, "reused": 1, "failed": 0, "retries": 0}
+
+    def test_reimport_reuses_stored_copy(self):
+        supabase = FakeSupabase([])
+        supabase.bucket.files[image_path(digest(b'old'))] = b'old'
+        stored, ingestor = ingest(supabase, FakeDownloads({'a': b'old'}), ['a'])
+
+        assert stored == [f"https://cdn.test/{image_path(digest(b'old'))}"]
+        assert ingestor.stats['uploaded'] == 0 and ingestor.stats['reused'] == 1
+
+    def test_reused_and_new_photos_are_claimed(self):
+        supabase = FakeSupabase([])
+        supabase.bucket.files[image_path(digest(b'old'))] = b'old'
+        store = ImageStore(supabase, delay=0)
+        stored, _ = ingest(supabase, FakeDownloads({'a': b'old', 'b': b'new'}), ['a', 'b'], store=store)
+
+        assert store.claimed() == {StoredImage('bucket', image_path(digest(d))) for d in (b'old', b'new')}
+        # Zbieranie przed zapisem ogłoszenia nie usuwa zdjęć, do których nic jeszcze nie odwołuje
+        store.release(stored, schedule=False)
+        try:
+            assert asyncio.run(store.collect())['removed'] == 0
+        finally:
+            shutdown_db_pool()
+        assert image_path(digest(b'old')) in supabase.bucket.files
+
+    def test_transient_download_errors_are_retried(self):
+        downloads = FakeDownloads({'a': b'x'}, failures={'a': [requests.ConnectionError(), http_error(503)]})
+        stored, ingestor = ingest(FakeSupabase([]), downloads, ['a'])
+
+        assert len(stored) == 1
+        assert downloads.calls == ['a', 'a', 'a']
+        assert ingestor.stats['retries'] == 2
+
+    def test_failed_photos_are_skipped(self):
+        downloads = FakeDownloads(
+            {'a': b'x', 'b': b'y', 'c': b'z'},
+            failures={'b': [http_error(404)], 'c': [requests.ConnectionError()] * 3},
+        )
+        stored, ingestor = ingest(FakeSupabase([]), downloads, ['a', 'b', 'c'], retries=2)
+
+        assert stored == [f"https://cdn.test/{image_path(digest(b'x'))}"]
+        assert downloads.calls.count('b') == 1  # 404 nie jest ponawiane
+        assert downloads.calls.count('c') == 3
+        assert ingestor.stats['failed'] == 2
+
+    def test_upload_errors_are_retried(self):
+        supabase = FakeSupabase([])
+        upload = supabase.bucket.upload
+        attempts = []
+
+        def flaky_upload(path, content, file_options=None):
+            attempts.append(path)
+            if len(attempts) == 1:
+                raise ConnectionError("reset")
+            return upload(path, content, file_options)
+
+        supabase.bucket.upload = flaky_upload
+        stored, _ = ingest(supabase, FakeDownloads({'a': b'x'}), ['a'])
+
+        assert len(stored) == 1 and len(attempts) == 2
+        assert supabase.bucket.files[image_path(digest(b'x'))] == b'x'
+
+    def test_concurrency_is_bounded(self):
+        active = []
+        peak = []
+
+        async def download(url, out):
+            active.append(url)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(url)
+            return stream_to([url.encode()], out)
+
+        stored, _ = ingest(FakeSupabase([]), download, [f'u{i}' for i in range(8)], concurrency=3)
+        assert len(stored) == 8
+        assert max(peak) == 3
+
+
+class TestIsDuplicate:
+
+    def test_recognizes_storage_conflicts(self):
+        from storage3.exceptions import StorageApiError
+
+        assert is_duplicate(StorageApiError('The resource already exists', 'Duplicate', 409))
+        assert is_duplicate(StorageApiError('The resource already exists', 'Duplicate', '409'))
+        assert not is_duplicate(StorageApiError('Bucket not found', 'NotFound', 404))
@@ -0,0 +1,60 @@
+"""
+Unit tests for the sync deduplication index
+Run with: pytest backend/tests/test_otomoto_index.py -v
+"""
+from otomoto_index import BusIndex, normalize_title
+
+
+ROWS = [
+    {'id': '1', 'vin': 'WF0XXXTTGXKA12345', 'naped': 'Ford Transit L3H2', 'cenaBrutto': 89000},
+    {'id': '2', 'vin': '', 'naped': 'Renault  Master 2.3', 'cenaBrutto': 65900},
+    {'id': '3', 'vin': None, 'title': 'Iveco Daily', 'cenaBrutto': '120000'},
+]
+
+
+class TestLookup:
+    """Test exists checks"""
+
+    def test_by_vin(self):
+        index = BusIndex(ROWS)
+        assert index.find('WF0XXXTTGXKA12345', 'cokolwiek', 1)['id'] == '1'
+        assert index.find('WF0XXXTTGXKA00000', 'Ford Transit L3H2', 89000) is None
+
+    def test_by_normalized_title_and_price(self):
+        index = BusIndex(ROWS)
+        assert index.find('', 'renault master 2.3 ', 65900)['id'] == '2'
+        assert index.find(None, 'Iveco Daily', 120000)['id'] == '3'
+        assert index.find(None, 'Renault Master 2.3', 60000) is None
+
+    def test_added_rows_are_found(self):
+        index = BusIndex(ROWS)
+        index.add({'id': '4', 'vin': 'VF1MA000000000001', 'naped': 'Renault Master'})
+        assert index.find('VF1MA000000000001', '', 0)['id'] == '4'
+
+    def test_claim_once(self):
+        index = BusIndex()
+        assert index.claim('VIN1', 'A', 1)
+        assert not index.claim('VIN1', 'B', 2)
+        assert index.claim(None, 'A', 1)
+        assert not index.claim('', ' a ', '1')
+
+    def test_normalize_title(self):
+        assert normalize_title('  Ford\tTransit  ') == 'ford transit'
+        assert normalize_title(None) == ''
+
+
+class TestMissing:
+    """Test the sold-marking predicate"""
+
+    def test_vin_rows_use_active_vins(self):
+        index = BusIndex(ROWS)
+        index.mark_active('WF0XXXTTGXKA12345', 'Ford Transit L3H2')
+        assert not index.is_missing(ROWS[0])
+        assert BusIndex(ROWS).is_missing(ROWS[0])
+
+    def test_rows_without_vin_use_titles(self):
+        index = BusIndex(ROWS)
+        index.mark_active(None, 'RENAULT MASTER 2.3')
+        assert not index.is_missing(ROWS[1])
+        # Bez VIN i bez `naped` nie da się stwierdzić, że auto zniknęło
+        assert not index.is_missing(ROWS[2])
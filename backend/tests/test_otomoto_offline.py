@@ -0,0 +1,105 @@
+"""
+Offline regression suite: synthetic Otomoto pages served by a local HTTP server
+Run with: pytest backend/tests/test_otomoto_offline.py -v
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from db import shutdown_db_pool
+from otomoto_extractor import extract_offer
+from otomoto_fingerprints import FingerprintStore
+from otomoto_sync import OtomotoSync
+from tests.fakes import FakeSupabase
+from tests.local_otomoto import FIXTURES, LocalFetcher, LocalOtomoto, offer_vin, read_fixture
+
+
+@pytest.fixture(scope="module")
+def site():
+    with LocalOtomoto() as local:
+        yield local
+
+
+def run_sync(site, supabase, fingerprints=None, **kwargs):
+    sync = OtomotoSync(
+        supabase,
+        fetcher=LocalFetcher(site),
+        dealer_url=site.dealer_url,
+        host_interval=0,
+        fingerprints=fingerprints or FingerprintStore(path=None),
+        **kwargs,
+    )
+    try:
+        return asyncio.run(sync.run())
+    finally:
+        shutdown_db_pool()
+
+
+class TestFixtureExtraction:
+    """Extraction of the fixture offers does not drift"""
+
+    @pytest.mark.parametrize("name", ['offer_state', 'offer_legacy'])
+    def test_matches_expected_result(self, name):
+        expected = json.loads((FIXTURES / 'expected' / f'{name}.json').read_text(encoding='utf-8'))
+        assert extract_offer(read_fixture(f'{name}.html')).model_dump() == expected
+
+
+class TestFullSync:
+    """The whole pipeline over real HTTP against the stand-in server"""
+
+    def test_imports_every_offer(self, site):
+        supabase = FakeSupabase([])
+        report = run_sync(site, supabase)
+
+        assert report['pages'] == 1 and report['offers'] == 32
+        assert report['new'] == 32 and report['failed'] == 0
+        rows = supabase.buses.rows
+        assert sorted(r['vin'] for r in rows) == sorted(offer_vin(i) for i in range(32))
+        renault = next(r for r in rows if r['vin'] == offer_vin(0))
+        assert renault['cenaBrutto'] == 89900 and renault['marka'] == 'Renault'
+        assert len(renault['zdjecia']) == 10
+        assert all(path.startswith('buses/') for path in supabase.bucket.files)
+        # Oferty z tego samego szablonu mają te same zdjęcia - w koszyku są raz
+        photos = {url for name in ('offer_state', 'offer_legacy') for url in extract_offer(read_fixture(f'{name}.html')).zdjecia[:10]}
+        assert len(supabase.bucket.files) == len(photos)
+        assert report['images'] == sum(len(r['zdjecia']) for r in rows)
+
+    def test_second_run_fetches_nothing(self, site, tmp_path):
+        supabase = FakeSupabase([])
+        path = str(tmp_path / 'fingerprints.json')
+        run_sync(site, supabase, FingerprintStore(path))
+
+        before = site.requests['otomoto']
+        report = run_sync(site, supabase, FingerprintStore(path))
+        assert site.requests['otomoto'] == before
+        assert report['delta']['skipped'] == 32 and report['new'] == 0
+
+    def test_stale_fingerprints_are_revalidated(self, site, tmp_path):
+        supabase = FakeSupabase([])
+        path = str(tmp_path / 'fingerprints.json')
+        run_sync(site, supabase, FingerprintStore(path))
+
+        not_modified = site.requests['not-modified']
+        report = run_sync(site, supabase, FingerprintStore(path, refetch_after_hours=0))
+        assert site.requests['not-modified'] - not_modified == 32
+        assert report['delta']['unchanged'] == 32 and report['marked_sold'] == 0
+
+
+class TestScrapeEndpoint:
+    """POST /api/scrape-otomoto against the stand-in server"""
+
+    def test_returns_form_data(self, site):
+        import server
+
+        client = TestClient(server.app)
+        client.cookies.set(server.ADMIN_COOKIE_NAME, server._sign('ok'))
+        url = site.local('https://www.otomoto.pl/' + next(iter(site.offers)))
+        response = client.post('/api/scrape-otomoto', json={'url': url})
+
+        assert response.status_code == 200
+        data = response.json()['data']
+        assert data['vin'] == offer_vin(0)
+        assert data['marka'] == 'Renault' and data['paliwo'] == 'Diesel'
+        assert data['zdjecieGlowne'] == data['zdjecia'][0]
@@ -0,0 +1,240 @@
+"""
+Unit tests for the pipelined Otomoto sync
+Run with: pytest backend/tests/test_otomoto_sync.py -v
+"""
+import asyncio
+import threading
+import time
+
+from db import shutdown_db_pool
+from otomoto_fingerprints import FingerprintStore
+from otomoto_images import stream_to
+from otomoto_sync import HostRateLimiter, OfferResponse, OtomotoSync, parse_dealer_cards, parse_dealer_page
+from tests.fakes import FakeSupabase, FakeTable
+
+
+def dealer_page(*ids, prices=None):
+    prices = prices or {}
+    return "".join(
+        f'<article><a href="https://www.otomoto.pl/oferta/{i}?ref=1">{i}</a><p>{prices.get(i, 1000)} PLN</p></article>'
+        for i in ids
+    ).encode()
+
+
+def offer_page(vin, title, price, images=()):
+    imgs = ",".join(f'"https://ireland.apollo.olxcdn.com/v1/files/{name}/image;s=200x100"' for name in images)
+    return (
+        f'<script>{{"title":"{title}","price":{{"value":{price}}},"images":[{imgs}]}}</script>'
+        f'<div data-testid="advert-details-item"><p>VIN</p><p>{vin}</p></div>'
+    )
+
+
+class FakeFetcher:
+    """Serves canned pages and records how many offer fetches overlap"""
+
+    def __init__(self, pages, offers, delay=0.02):
+        self.pages = pages
+        self.offers = offers
+        self.delay = delay
+        self.fetched_pages = []
+        self.fetched_offers = []
+        self.etags = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def fetch_page(self, url):
+        self.fetched_pages.append(url)
+        return self.pages.get(int(url.rsplit('=', 1)[1]), b"")
+
+    def fetch_offer(self, url, etag=None, last_modified=None):
+        with self._lock:
+            self.fetched_offers.append(url)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        html = self.offers[url.rsplit('/', 1)[1]]
+        current = '"%s"' % hash(html)
+        if url in self.etags and etag == current:
+            return OfferResponse(304, '', etag)
+        if url in self.etags:
+            return OfferResponse(200, html, current)
+        return OfferResponse(200, html)
+
+    def download_image(self, url, out):
+        return stream_to([url.encode()], out)
+
+
+def run_sync(supabase, fetcher, **kwargs):
+    kwargs.setdefault('host_interval', 0)
+    kwargs.setdefault('fingerprints', FingerprintStore(path=None))
+    try:
+        return asyncio.run(OtomotoSync(supabase, fetcher=fetcher, dealer_url="https://dealer.test/inventory", **kwargs).run())
+    finally:
+        # Semafor DB jest związany z pętlą zdarzeń danego asyncio.run
+        shutdown_db_pool()
+
+
+class TestParsing:
+    """Test dealer page parsing"""
+
+    def test_card_hash_follows_card_content(self):
+        before = parse_dealer_cards(dealer_page('a', 'b'))
+        after = parse_dealer_cards(dealer_page('a', 'b', prices={'b': 999}))
+        assert before["https://www.otomoto.pl/oferta/a"] == after["https://www.otomoto.pl/oferta/a"]
+        assert before["https://www.otomoto.pl/oferta/b"] != after["https://www.otomoto.pl/oferta/b"]
+
+    def test_links_without_query(self):
+        assert parse_dealer_page(dealer_page('a', 'b')) == [
+            "https://www.otomoto.pl/oferta/a",
+            "https://www.otomoto.pl/oferta/b",
+        ]
+
+
+class TestHostRateLimiter:
+    """Test per-host request spacing"""
+
+    def test_same_host_is_spaced(self):
+        limiter = HostRateLimiter(0.05)
+
+        async def burst():
+            start = time.monotonic()
+            await asyncio.gather(*(limiter.wait("https://a.test/x") for _ in range(3)))
+            return time.monotonic() - start
+
+        assert asyncio.run(burst()) >= 0.09
+
+    def test_other_hosts_do_not_wait(self):
+        limiter = HostRateLimiter(1.0)
+
+        async def burst():
+            start = time.monotonic()
+            await asyncio.gather(*(limiter.wait(f"https://h{i}.test/x") for i in range(5)))
+            return time.monotonic() - start
+
+        assert asyncio.run(burst()) < 0.5
+
+
+class TestOtomotoSync:
+    """Test the full pipeline against in-memory fakes"""
+
+    def test_inserts_new_and_marks_missing_as_sold(self):
+        supabase = FakeSupabase([
+            {'id': 'old', 'vin': 'WVWZZZ00000000001', 'status': 'aktywne'},
+            {'id': 'gone', 'vin': 'WVWZZZ00000000009', 'status': 'aktywne'},
+        ])
+        fetcher = FakeFetcher(
+            pages={1: dealer_page('o1', 'o2')},
+            offers={
+                'o1': offer_page('WVWZZZ00000000001', 'Renault Master', 65900),
+                'o2': offer_page('WVWZZZ00000000002', 'Ford Transit', 49000, images=('p1', 'p2', 'p3')),
+            },
+        )
+        report = run_sync(supabase, fetcher)
+
+        assert report['offers'] == 2 and report['new'] == 1 and report['marked_sold'] == 1
+        rows = {r['id']: r for r in supabase.buses.rows}
+        assert rows['gone']['status'] == 'sprzedane'
+        assert rows['old']['status'] == 'aktywne'
+        new = [r for r in rows.values() if r.get('vin') == 'WVWZZZ00000000002'][0]
+        assert new['cenaBrutto'] == 49000 and new['naped'] == 'Ford Transit'
+        assert len(new['zdjecia']) == 3
+        # Kolejność zdjęć jak na Otomoto, mimo równoległego pobierania
+        uploaded = [supabase.bucket.files[url.split('cdn.test/')[1]] for url in new['zdjecia']]
+        assert [u.decode().split('/files/')[1].split('/')[0] for u in uploaded] == ['p1', 'p2', 'p3']
+        assert new['zdjecieGlowne'] == new['zdjecia'][0]
+
+    def test_existing_buses_are_read_past_the_row_cap(self, monkeypatch):
+        monkeypatch.setattr(FakeTable, 'max_rows', 2)
+        supabase = FakeSupabase([
+            {'id': f'b{i}', 'vin': f'WVWZZZ0000000000{i}', 'status': 'aktywne'} for i in range(1, 6)
+        ])
+        fetcher = FakeFetcher(
+            pages={1: dealer_page(*(f'o{i}' for i in range(1, 6)))},
+            offers={f'o{i}': offer_page(f'WVWZZZ0000000000{i}', 'Renault Master', 65900) for i in range(1, 6)},
+        )
+        report = run_sync(supabase, fetcher)
+
+        assert report['new'] == 0 and report['marked_sold'] == 0
+        assert len(supabase.buses.rows) == 5
+
+    def test_offers_are_fetched_concurrently_within_limit(self):
+        ids = [f'o{i}' for i in range(8)]
+        fetcher = FakeFetcher(
+            pages={1: dealer_page(*ids)},
+            offers={i: offer_page(f'VIN0000000000{i}', i, 1) for i in ids},
+        )
+        run_sync(FakeSupabase([]), fetcher, offer_concurrency=3)
+        assert 1 < fetcher.max_in_flight <= 3
+
+    def test_duplicate_offers_are_inserted_once(self):
+        supabase = FakeSupabase([])
+        fetcher = FakeFetcher(
+            pages={1: dealer_page('o1', 'o2')},
+            offers={'o1': offer_page('VIN00000000001', 'A', 1), 'o2': offer_page('VIN00000000001', 'A', 1)},
+        )
+        report = run_sync(supabase, fetcher)
+        assert report['new'] == 1 and len(supabase.buses.rows) == 1
+
+    def test_stops_at_first_empty_page(self):
+        fetcher = FakeFetcher(
+            pages={1: dealer_page('o1'), 3: dealer_page('o3')},
+            offers={'o1': offer_page('VIN00000000001', 'A', 1), 'o3': offer_page('VIN00000000003', 'B', 1)},
+        )
+        report = run_sync(FakeSupabase([]), fetcher)
+        assert report['pages'] == 1 and report['offers'] == 1
+
+
+class TestIncrementalSync:
+    """Test fingerprint-based change detection"""
+
+    def setup_method(self):
+        self.supabase = FakeSupabase([])
+        self.offers = {
+            'o1': offer_page('VIN00000000001', 'Renault Master', 65900),
+            'o2': offer_page('VIN00000000002', 'Ford Transit', 49000),
+        }
+
+    def run(self, store, pages, etags=()):
+        fetcher = FakeFetcher(pages=pages, offers=self.offers)
+        fetcher.etags = {f"https://www.otomoto.pl/oferta/{i}": True for i in etags}
+        return run_sync(self.supabase, fetcher, fingerprints=store), fetcher
+
+    def test_unchanged_offers_are_not_fetched(self, tmp_path):
+        path = str(tmp_path / "fp.json")
+        report, _ = self.run(FingerprintStore(path), {1: dealer_page('o1', 'o2')})
+        assert len(report['delta']['added']) == 2 and report['new'] == 2
+
+        report, fetcher = self.run(FingerprintStore(path), {1: dealer_page('o1', 'o2')})
+        assert fetcher.fetched_offers == []
+        assert report['delta']['skipped'] == 2 and report['new'] == 0 and report['marked_sold'] == 0
+
+    def test_changed_card_is_revalidated(self, tmp_path):
+        store = FingerprintStore(str(tmp_path / "fp.json"))
+        self.run(store, {1: dealer_page('o1', 'o2')}, etags=('o1', 'o2'))
+
+        # Zmieniona cena na karcie o2, ale strona oferty bez zmian -> 304
+        report, fetcher = self.run(store, {1: dealer_page('o1', 'o2', prices={'o2': 45000})}, etags=('o1', 'o2'))
+        assert fetcher.fetched_offers == ["https://www.otomoto.pl/oferta/o2"]
+        assert report['delta']['unchanged'] == 1 and report['delta']['skipped'] == 1
+
+        self.offers['o2'] = offer_page('VIN00000000002', 'Ford Transit', 45000)
+        report, _ = self.run(store, {1: dealer_page('o1', 'o2', prices={'o2': 44000})}, etags=('o1', 'o2'))
+        assert report['delta']['changed'] == ["https://www.otomoto.pl/oferta/o2"]
+        assert store.get("https://www.otomoto.pl/oferta/o2")['price'] == 45000
+
+    def test_removed_offers_are_reported(self, tmp_path):
+        store = FingerprintStore(str(tmp_path / "fp.json"))
+        self.run(store, {1: dealer_page('o1', 'o2')})
+        report, _ = self.run(store, {1: dealer_page('o1')})
+        assert report['delta']['removed'] == ["https://www.otomoto.pl/oferta/o2"]
+        assert report['marked_sold'] == 1
+
+    def test_offer_deleted_from_database_is_reimported(self, tmp_path):
+        store = FingerprintStore(str(tmp_path / "fp.json"))
+        self.run(store, {1: dealer_page('o1')})
+        self.supabase.buses.rows.clear()
+        report, _ = self.run(store, {1: dealer_page('o1')})
+        assert report['new'] == 1
@@ -0,0 +1,198 @@
+"""
+Unit tests for the storage providers and local photo serving
+Run with: pytest backend/tests/test_storage.py -v
+"""
+import asyncio
+import io
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from db import shutdown_db_pool
+from image_store import ImageStore
+from storage import IMMUTABLE, UNSATISFIABLE, LocalFiles, LocalStorage, parse_range, shard_path, unshard_path
+from storage_migration import migrate_local_photos, rewrite_listing_urls
+from tests.conftest import PNG
+from tests.fakes import FakeSupabase
+
+URL = "https://cdn.test/"
+
+
+def run(coro):
+    try:
+        return asyncio.run(coro)
+    finally:
+        shutdown_db_pool()
+
+
+class TestSharding:
+
+    def test_photos_and_variants_share_a_shard(self):
+        assert shard_path('buses/abcd.jpg') == 'buses/ab/abcd.jpg'
+        assert shard_path('buses/abcd/card.webp') == 'buses/ab/abcd/card.webp'
+
+    def test_unshard(self):
+        assert unshard_path('buses/ab/abcd/card.webp') == 'buses/abcd/card.webp'
+        assert unshard_path('buses/legacy-uuid.jpg') == 'buses/legacy-uuid.jpg'
+
+
+class TestLocalStorage:
+
+    def test_atomic_sharded_write(self, tmp_path):
+        storage = LocalStorage(tmp_path)
+        url = run(storage.put('buses/abcd.jpg', b'photo', 'image/jpeg'))
+
+        assert url == '/uploads/buses/abcd.jpg'
+        assert (tmp_path / 'buses' / 'ab' / 'abcd.jpg').read_bytes() == b'photo'
+        assert [p.name for p in (tmp_path / 'buses' / 'ab').iterdir()] == ['abcd.jpg']
+
+    def test_existing_object_is_kept(self, tmp_path):
+        storage = LocalStorage(tmp_path)
+        run(storage.put('buses/abcd.jpg', b'first', 'image/jpeg'))
+        run(storage.put('buses/abcd.jpg', io.BytesIO(b'second'), 'image/jpeg'))
+        assert storage.file_path('buses/abcd.jpg').read_bytes() == b'first'
+
+    def test_pre_sharding_files_are_found(self, tmp_path):
+        (tmp_path / 'buses').mkdir()
+        (tmp_path / 'buses' / 'old-uuid.jpg').write_bytes(b'x')
+        assert LocalStorage(tmp_path).file_path('buses/old-uuid.jpg') == tmp_path / 'buses' / 'old-uuid.jpg'
+
+    def test_list_and_remove(self, tmp_path):
+        storage = LocalStorage(tmp_path)
+        run(storage.put('buses/abcd.jpg', b'12345', 'image/jpeg'))
+        run(storage.put('buses/abcd/card.webp', b'12', 'image/webp'))
+
+        listed = run(storage.list('buses'))
+        assert sorted((o.path, o.size) for o in listed) == [('buses/abcd.jpg', 5), ('buses/abcd/card.webp', 2)]
+        assert [o.path for o in run(storage.list('buses', descend=lambda folder: False))] == ['buses/abcd.jpg']
+
+        run(storage.remove(['buses/abcd.jpg', 'buses/abcd/card.webp']))
+        assert list((tmp_path / 'buses').iterdir()) == []
+
+    def test_upload_providers(self, tmp_path):
+        assert [p.location for p in ImageStore(FakeSupabase([]), tmp_path).upload_providers()] == ['bucket', 'local']
+        assert [p.location for p in ImageStore(FakeSupabase([]), tmp_path, backend='local').upload_providers()] == ['local']
+        assert [p.location for p in ImageStore(None, tmp_path).upload_providers()] == ['local']
+
+
+@pytest.fixture
+def files(tmp_path):
+    storage = LocalStorage(tmp_path)
+    run(storage.put('buses/abcd.png', PNG + b'0123456789', 'image/png'))
+    app = Starlette(routes=[Mount('/uploads', LocalFiles(storage))])
+    return TestClient(app), storage
+
+
+class TestLocalFiles:
+
+    def test_serves_with_immutable_caching(self, files):
+        client, _ = files
+        response = client.get('/uploads/buses/abcd.png')
+
+        assert response.status_code == 200
+        assert response.content == PNG + b'0123456789'
+        assert response.headers['content-type'] == 'image/png'
+        assert response.headers['cache-control'] == IMMUTABLE
+        assert response.headers['accept-ranges'] == 'bytes'
+
+    def test_etag_revalidation(self, files):
+        client, _ = files
+        etag = client.get('/uploads/buses/abcd.png').headers['etag']
+        response = client.get('/uploads/buses/abcd.png', headers={'If-None-Match': etag})
+        assert response.status_code == 304 and response.content == b''
+
+    def test_byte_range(self, files):
+        client, _ = files
+        response = client.get('/uploads/buses/abcd.png', headers={'Range': f'bytes={len(PNG)}-{len(PNG) + 3}'})
+
+        assert response.status_code == 206
+        assert response.content == b'0123'
+        assert response.headers['content-range'] == f'bytes {len(PNG)}-{len(PNG) + 3}/{len(PNG) + 10}'
+
+    def test_range_past_the_end(self, files):
+        client, _ = files
+        response = client.get('/uploads/buses/abcd.png', headers={'Range': 'bytes=999999-'})
+
+        assert response.status_code == 416 and response.content == b''
+        assert response.headers['content-range'] == f'bytes */{len(PNG) + 10}'
+
+    def test_missing_and_outside_files(self, files):
+        client, _ = files
+        assert client.get('/uploads/buses/nope.png').status_code == 404
+        assert client.get('/uploads/../test_storage.py').status_code == 404
+
+    def test_pathsend_when_the_server_offers_it(self, files):
+        _, storage = files
+        sent = []
+
+        async def receive():
+            return {"type": "http.request"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/buses/abcd.png", "root_path": "",
+                 "headers": [], "extensions": {"http.response.pathsend": {}}}
+        asyncio.run(LocalFiles(storage)(scope, receive, send))
+        assert sent[1] == {"type": "http.response.pathsend", "path": str(storage.file_path('buses/abcd.png'))}
+
+    @pytest.mark.parametrize("header,expected", [
+        ('bytes=0-3', (0, 3)), ('bytes=5-', (5, 9)), ('bytes=-2', (8, 9)), ('bytes=4-100', (4, 9)),
+        ('bytes=8-2', None), ('bytes=0-1,4-5', None), ('items=0-1', None), (None, None),
+        ('bytes=10-', UNSATISFIABLE), ('bytes=999999-1000000', UNSATISFIABLE), ('bytes=-0', UNSATISFIABLE),
+    ])
+    def test_parse_range(self, header, expected):
+        assert parse_range(header, 10) == expected
+
+
+class TestUploadFallback:
+
+    def test_bucket_failure_falls_back_to_local_disk(self, admin_client, monkeypatch, tmp_path):
+        import server
+
+        client, supabase = admin_client
+
+        def down(*args, **kwargs):
+            raise ConnectionError("bucket down")
+
+        monkeypatch.setattr(supabase.bucket, 'upload', down)
+        monkeypatch.setattr(server, '_image_store', ImageStore(supabase, tmp_path))
+        url = client.post('/api/upload', files={'file': ('a.png', PNG + b'local', 'image/png')}).json()['url']
+
+        assert url.startswith('/uploads/buses/') and url.endswith('.png')
+        path = url[len('/uploads/'):]
+        assert (tmp_path / shard_path(path)).read_bytes() == PNG + b'local'
+
+
+class TestMigration:
+
+    def test_rewrite_listing_urls(self):
+        urls = {'/uploads/buses/a.jpg': f'{URL}buses/a.jpg', '/uploads/buses/a/card.webp': f'{URL}buses/a/card.webp'}
+        row = {
+            'zdjecia': ['/uploads/buses/a.jpg', f'{URL}buses/b.jpg'],
+            'zdjecieGlowne': '/uploads/buses/a.jpg',
+            'zdjeciaWarianty': {'/uploads/buses/a.jpg': {'card': {'width': 640, 'webp': '/uploads/buses/a/card.webp'}}},
+        }
+        assert rewrite_listing_urls(row, urls) == {
+            'zdjecia': [f'{URL}buses/a.jpg', f'{URL}buses/b.jpg'],
+            'zdjecieGlowne': f'{URL}buses/a.jpg',
+            'zdjeciaWarianty': {f'{URL}buses/a.jpg': {'card': {'width': 640, 'webp': f'{URL}buses/a/card.webp'}}},
+        }
+        assert rewrite_listing_urls({'zdjecia': [f'{URL}buses/b.jpg']}, urls) == {}
+
+    def test_local_photos_move_to_the_bucket(self, tmp_path):
+        local = LocalStorage(tmp_path)
+        run(local.put('buses/abcd.jpg', b'photo', 'image/jpeg'))
+        run(local.put('buses/abcd/card.webp', b'variant', 'image/webp'))
+        supabase = FakeSupabase([{'id': '1', 'zdjecia': ['/uploads/buses/abcd.jpg'], 'zdjecieGlowne': '/uploads/buses/abcd.jpg'}])
+
+        report = run(migrate_local_photos(ImageStore(supabase, tmp_path, delay=0)))
+
+        assert report == {"uploaded": 2, "failed": 0, "listings": 1, "released": 1}
+        assert supabase.bucket.files == {'buses/abcd.jpg': b'photo', 'buses/abcd/card.webp': b'variant'}
+        assert supabase.buses.rows[0]['zdjecieGlowne'] == f'{URL}buses/abcd.jpg'
+        assert not any(p.is_file() for p in tmp_path.rglob('*'))
+        assert os.listdir(tmp_path / 'buses') == []
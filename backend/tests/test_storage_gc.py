@@ -0,0 +1,132 @@
+"""
+Unit tests for the background storage garbage collector
+Run with: pytest backend/tests/test_storage_gc.py -v
+"""
+import asyncio
+import os
+import time
+
+from db import shutdown_db_pool
+from image_store import ImageStore
+from storage_gc import StorageSweep, photo_stem
+from tests.fakes import FakeSupabase, FakeTable
+
+URL = "https://cdn.test/"
+USED = {'id': '0', 'zdjecia': [f"{URL}buses/used.jpg"]}
+
+
+def sweep(supabase, uploads_dir=None, dry_run=False, page_size=1000, **kwargs):
+    store = ImageStore(supabase, uploads_dir, delay=0, **kwargs)
+    store.providers['bucket'].page_size = page_size
+    try:
+        return asyncio.run(StorageSweep(store).run(dry_run=dry_run))
+    finally:
+        shutdown_db_pool()
+
+
+def bucket_with(rows, files):
+    supabase = FakeSupabase(rows)
+    supabase.bucket.files.update({path: b'x' * size for path, size in files.items()})
+    return supabase
+
+
+class TestPhotoStem:
+
+    def test_original_and_variants_share_a_stem(self):
+        assert photo_stem('buses/abc.jpg') == 'buses/abc'
+        assert photo_stem('buses/abc/card.webp') == 'buses/abc'
+
+
+class TestStorageSweep:
+
+    def test_deletes_orphans_and_reports_bytes(self):
+        supabase = bucket_with(
+            [{'id': '1', 'zdjecia': [f"{URL}buses/used.jpg"]}],
+            {'buses/used.jpg': 10, 'buses/used/card.webp': 5,
+             'buses/orphan.jpg': 100, 'buses/orphan/card.webp': 20, 'buses/lost/thumb.avif': 7},
+        )
+        report = sweep(supabase)
+
+        assert set(supabase.bucket.files) == {'buses/used.jpg', 'buses/used/card.webp'}
+        assert report['scanned'] == 4  # katalog wariantów używanego zdjęcia nie jest listowany
+        assert report['removed'] == 3 and report['bytes_reclaimed'] == 127
+
+    def test_dry_run_only_reports(self):
+        supabase = bucket_with([], {'buses/orphan.jpg': 100})
+        report = sweep(supabase, dry_run=True)
+
+        assert report['orphans'] == 1 and report['orphan_bytes'] == 100
+        assert report['removed'] == 0 and 'buses/orphan.jpg' in supabase.bucket.files
+
+    def test_recent_uploads_are_kept(self):
+        supabase = FakeSupabase([])
+        supabase.bucket.upload('buses/new.jpg', b'x')
+        assert sweep(supabase)['orphans'] == 0
+        assert 'buses/new.jpg' in supabase.bucket.files
+
+    def test_listing_is_paginated_and_deletes_are_batched(self, monkeypatch):
+        supabase = bucket_with([USED], {'buses/used.jpg': 1, **{f'buses/{i:02}.jpg': 1 for i in range(25)}})
+        batches = []
+        remove = supabase.bucket.remove
+        monkeypatch.setattr(supabase.bucket, 'remove', lambda paths: (batches.append(paths), remove(paths)))
+
+        report = sweep(supabase, page_size=10, batch_size=10)
+        assert report['scanned'] == 26 and report['removed'] == 25
+        assert [len(b) for b in batches] == [10, 10, 5]
+
+    def test_failed_deletes_are_counted(self, monkeypatch):
+        supabase = bucket_with([USED], {'buses/used.jpg': 1, 'buses/a.jpg': 1})
+
+        def fail(paths):
+            raise ConnectionError("storage down")
+
+        monkeypatch.setattr(supabase.bucket, 'remove', fail)
+        report = sweep(supabase)
+        assert report['failed'] == 1 and report['bytes_reclaimed'] == 0
+
+    def test_no_references_at_all_deletes_nothing(self):
+        supabase = bucket_with([{'id': '1', 'zdjecia': []}], {'buses/a.jpg': 1, 'buses/b.jpg': 1})
+        report = sweep(supabase)
+
+        assert report['orphans'] == 2 and report['removed'] == 0 and report['aborted']
+        assert set(supabase.bucket.files) == {'buses/a.jpg', 'buses/b.jpg'}
+
+    def test_references_are_read_past_the_row_cap(self, monkeypatch):
+        monkeypatch.setattr(FakeTable, 'max_rows', 7)
+        rows = [{'id': f'{i:03}', 'zdjecia': [f"{URL}buses/{i:03}.jpg"]} for i in range(30)]
+        supabase = bucket_with(rows, {f'buses/{i:03}.jpg': 1 for i in range(30)})
+
+        report = sweep(supabase)
+        assert report['referenced'] == 30 and report['removed'] == 0
+        assert len(supabase.bucket.files) == 30
+
+    def test_local_fallback_directory(self, tmp_path):
+        (tmp_path / 'buses' / 'old').mkdir(parents=True)
+        for name in ('buses/used.png', 'buses/old.png', 'buses/old/card.webp'):
+            (tmp_path / name).write_bytes(b'x' * 3)
+        old = time.time() - 7200
+        for name in ('buses/old.png', 'buses/old/card.webp'):
+            os.utime(tmp_path / name, (old, old))
+        (tmp_path / 'buses' / 'fresh.png').write_bytes(b'x')
+
+        supabase = FakeSupabase([{'id': '1', 'zdjecieGlowne': '/uploads/buses/used.png'}])
+        report = sweep(supabase, uploads_dir=tmp_path)
+
+        assert report['removed'] == 2 and report['bytes_reclaimed'] == 6
+        assert sorted(p.name for p in (tmp_path / 'buses').iterdir()) == ['fresh.png', 'used.png']
+
+
+class TestStorageGcEndpoint:
+
+    def test_admin_can_run_a_dry_run(self, admin_client):
+        client, supabase = admin_client
+        supabase.bucket.files['buses/orphan.jpg'] = b'x' * 4
+
+        report = client.post('/api/admin/storage/gc?dry_run=true').json()
+        assert report['orphans'] == 1 and report['dry_run'] is True
+        assert 'buses/orphan.jpg' in supabase.bucket.files
+
+    def test_requires_admin(self, admin_client):
+        client, _ = admin_client
+        client.cookies.clear()
+        assert client.post('/api/admin/storage/gc').status_code in (401, 403)
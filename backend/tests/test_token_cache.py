@@ -0,0 +1,129 @@
+"""
+Unit tests for the verified token cache and the admin auth checks
+Run with: pytest backend/tests/test_token_cache.py -v
+"""
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from token_cache import TokenCache
+
+SECRET = "test-secret-of-at-least-32-bytes!"
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class CountingVerify:
+    def __init__(self, claims=None, error=None):
+        self.claims = claims
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, token):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return dict(self.claims, token=token)
+
+
+class TestTokenCache:
+
+    def test_hits_skip_verification(self):
+        verify = CountingVerify({'email': 'a@b.pl', 'exp': 1_000_060})
+        cache = TokenCache(verify, clock=Clock())
+
+        assert cache.verify('t1') == cache.verify('t1')
+        assert verify.calls == 1
+        assert cache.stats()['hits'] == 1
+
+    def test_entries_expire_with_the_token(self):
+        clock = Clock()
+        verify = CountingVerify({'exp': 1_000_060})
+        cache = TokenCache(verify, clock=clock)
+
+        cache.verify('t1')
+        clock.now = 1_000_060
+        cache.verify('t1')
+        assert verify.calls == 2
+
+    def test_tokens_without_exp_are_not_cached(self):
+        verify = CountingVerify({'email': 'a@b.pl'})
+        cache = TokenCache(verify, clock=Clock())
+        cache.verify('t1')
+        cache.verify('t1')
+        assert verify.calls == 2
+
+    def test_failures_are_not_cached(self):
+        verify = CountingVerify(error=HTTPException(status_code=401, detail="Token expired"))
+        cache = TokenCache(verify, clock=Clock())
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                cache.verify('bad')
+        assert verify.calls == 2 and cache.stats()['entries'] == 0
+
+    def test_size_bound(self):
+        cache = TokenCache(CountingVerify({'exp': 1_000_060}), max_entries=2, clock=Clock())
+        for token in ('a', 'b', 'c'):
+            cache.verify(token)
+        assert cache.stats()['entries'] == 2 and cache.stats()['evictions'] == 1
+
+
+def token(email, exp_in=60):
+    return jwt.encode({'email': email, 'exp': int(time.time()) + exp_in}, SECRET, algorithm="HS256")
+
+
+@pytest.fixture
+def jwt_client(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, 'JWT_SECRET', SECRET)
+    monkeypatch.setattr(server, 'ADMIN_EMAILS', frozenset({'admin@frankobus.pl'}))
+    monkeypatch.setattr(server, 'jwt_users', TokenCache(server._jwt_user))
+    return TestClient(server.app), server
+
+
+class TestAdminAuth:
+
+    def test_admin_token_is_verified_once(self, jwt_client, monkeypatch):
+        client, server = jwt_client
+        decoded = []
+        decode = jwt.decode
+        monkeypatch.setattr(server.jwt, 'decode', lambda *a, **kw: (decoded.append(1), decode(*a, **kw))[1])
+        headers = {'Authorization': f"Bearer {token('Admin@Frankobus.pl')}"}
+
+        for _ in range(3):
+            assert client.get('/api/admin/cache-stats', headers=headers).status_code == 200
+        assert len(decoded) == 1
+        assert client.get('/api/admin/cache-stats', headers=headers).json()['tokens']['hits'] == 3
+
+    def test_non_admin_token_is_forbidden(self, jwt_client):
+        client, _ = jwt_client
+        headers = {'Authorization': f"Bearer {token('klient@example.com')}"}
+        assert client.get('/api/admin/cache-stats', headers=headers).status_code == 403
+
+    def test_expired_token_is_rejected(self, jwt_client):
+        client, _ = jwt_client
+        headers = {'Authorization': f"Bearer {token('admin@frankobus.pl', exp_in=-60)}"}
+        assert client.get('/api/admin/cache-stats', headers=headers).status_code == 401
+
+    @pytest.mark.parametrize("cookie,expected", [('ok', False), ('', False), ('żółć', False), (None, False)])
+    def test_admin_cookie_check(self, cookie, expected):
+        import server
+
+        assert server.is_admin_cookie(cookie) is expected
+        assert server.is_admin_cookie(server._sign('ok')) is True
+
+    def test_login_sets_the_precomputed_cookie(self, jwt_client):
+        client, server = jwt_client
+        response = client.post('/api/auth/login', json={'password': server.ADMIN_PASSWORD})
+        assert response.headers['set-cookie'].startswith(f"{server.ADMIN_COOKIE_NAME}={server._sign('ok')};")
+
@@ -0,0 +1,139 @@
+"""
+Unit tests for streaming image uploads
+Run with: pytest backend/tests/test_upload_stream.py -v
+"""
+import asyncio
+import io
+
+import pytest
+
+from tests.conftest import AVIF, BOUNDARY, JPEG, PNG, WEBP, multipart_body
+from upload_stream import SpooledUpload, StreamingUploadParser, UploadError, sniff_image_type
+
+async def chunked(body, size):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def parse(body, chunk=7, **kwargs):
+    parser = StreamingUploadParser(f'multipart/form-data; boundary={BOUNDARY}', **kwargs)
+    return asyncio.run(parser.parse(chunked(body, chunk)))
+
+
+class TestSniffImageType:
+
+    @pytest.mark.parametrize("head,expected", [
+        (JPEG, 'image/jpeg'), (PNG, 'image/png'), (WEBP, 'image/webp'), (AVIF, 'image/avif'),
+        (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff', None),
+        (b'<html><script>alert(1)</script>', None),
+        (b'', None),
+    ])
+    def test_signatures(self, head, expected):
+        assert sniff_image_type(head) == expected
+
+
+class TestStreamingUploadParser:
+
+    def test_parses_files_in_small_chunks(self):
+        png = PNG + b'p' * 1000
+        uploads = parse(multipart_body(('files', 'a.jpg', JPEG + b'j' * 500), ('files', 'b.jpg', png)))
+
+        assert [(u.filename, u.content_type, u.size, u.ext) for u in uploads] == [
+            ('a.jpg', 'image/jpeg', len(JPEG) + 500, 'jpg'),
+            ('b.jpg', 'image/png', len(png), 'png'),  # rozszerzenie i Content-Type nie mają znaczenia
+        ]
+        with uploads[1].payload() as payload:
+            assert payload == png
+
+    def test_plain_fields_are_ignored(self):
+        uploads = parse(multipart_body(('file', 'a.jpg', JPEG), fields=[('note', 'x')]))
+        assert [u.field for u in uploads] == ['file']
+
+    def test_size_limit_enforced_while_reading(self):
+        uploads = parse(multipart_body(('files', 'big.jpg', JPEG + b'x' * 5000), ('files', 'ok.jpg', JPEG)), max_size=1000)
+
+        big, ok = uploads
+        assert not big.ok and 'za duży' in big.error
+        assert big.size <= 1000 + 7  # przerwane w trakcie, nie po wczytaniu całości
+        assert ok.ok
+
+    def test_wrong_signature_rejected(self):
+        uploads = parse(multipart_body(('files', 'evil.jpg', b'<?php system($_GET[1]); ?>' * 10)))
+        assert not uploads[0].ok and 'format' in uploads[0].error
+
+    def test_tiny_file_is_sniffed_at_the_end(self):
+        uploads = parse(multipart_body(('file', 'a.jpg', b'\xff\xd8\xff\xd9')))
+        assert uploads[0].content_type == 'image/jpeg'
+        with uploads[0].payload() as payload:
+            assert payload == b'\xff\xd8\xff\xd9'
+
+    def test_large_files_spill_to_disk(self):
+        data = JPEG + b'x' * 4000
+        uploads = parse(multipart_body(('file', 'a.jpg', data)), chunk=512, spool_size=1024)
+
+        with uploads[0].payload() as payload:
+            assert isinstance(payload, io.BufferedReader)
+            assert payload.read() == data
+        assert not uploads[0].file.closed
+
+    def test_too_many_files(self):
+        with pytest.raises(UploadError):
+            parse(multipart_body(*[('files', f'{i}.jpg', JPEG) for i in range(3)]), max_files=2)
+
+    def test_missing_boundary(self):
+        with pytest.raises(UploadError):
+            StreamingUploadParser('multipart/form-data')
+
+
+class TestSpooledUpload:
+
+    def test_save_copies_to_disk(self, tmp_path):
+        upload = SpooledUpload('file', 'a.jpg', spool_size=8)
+        asyncio.run(upload.write(JPEG + b'abc'))
+        asyncio.run(upload.finish())
+        upload.save(tmp_path / 'a.jpg')
+        assert (tmp_path / 'a.jpg').read_bytes() == JPEG + b'abc'
+
+
+class TestUploadEndpoints:
+
+    def test_single_upload(self, admin_client):
+        client, supabase = admin_client
+        response = client.post('/api/upload', files={'file': ('photo.png', PNG + b'data', 'image/png')})
+
+        assert response.status_code == 200
+        path = response.json()['url'].split('cdn.test/')[1]
+        assert path.startswith('buses/') and path.endswith('.png')
+        assert supabase.bucket.files[path] == PNG + b'data'
+
+    def test_single_upload_rejects_non_images(self, admin_client):
+        client, supabase = admin_client
+        response = client.post('/api/upload', files={'file': ('photo.jpg', b'MZ\x90\x00' * 10, 'image/jpeg')})
+        assert response.status_code == 415
+        assert supabase.bucket.files == {}
+
+    def test_single_upload_rejects_oversized(self, admin_client, monkeypatch):
+        import upload_stream
+
+        monkeypatch.setattr(upload_stream, 'MAX_UPLOAD_SIZE', 100)
+        client, _ = admin_client
+        response = client.post('/api/upload', files={'file': ('photo.jpg', JPEG + b'x' * 500, 'image/jpeg')})
+        assert response.status_code == 413
+
+    def test_bulk_upload_reports_per_file(self, admin_client):
+        client, supabase = admin_client
+        response = client.post('/api/upload-bulk', files=[
+            ('files', ('a.jpg', JPEG + b'a', 'image/jpeg')),
+            ('files', ('b.txt', b'just some text here', 'image/jpeg')),
+            ('files', ('c.webp', WEBP + b'c', 'image/webp')),
+        ])
+
+        body = response.json()
+        assert body['success'] is True
+        assert [url.rsplit('.', 1)[1] for url in body['urls']] == ['jpg', 'webp']
+        assert len(body['errors']) == 1 and body['errors'][0].startswith('b.txt:')
+        assert len(supabase.bucket.files) == 2
+
+    def test_requires_multipart(self, admin_client):
+        client, _ = admin_client
+        assert client.post('/api/upload-bulk', json={}).status_code == 400
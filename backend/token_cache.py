@@ -0,0 +1,58 @@
+"""
+Cache of verified Supabase access tokens.
+
+The admin panel sends the same bearer token with every request, and each
+one used to pay a full `jwt.decode` (HMAC and claim checks). Verified
+claims are kept in an LRU (listing_cache.TTLCache) keyed by the SHA-256
+of the token, until the token's own `exp`. An expired token therefore
+drops out of the cache exactly when jwt.decode would start rejecting it.
+Tokens without `exp` and failed verifications are never cached.
+"""
+import hashlib
+import os
+import time
+from typing import Callable
+
+from listing_cache import TTLCache
+
+JWT_CACHE_MAX_ENTRIES = int(os.environ.get('JWT_CACHE_MAX_ENTRIES', '1024'))
+
+
+def token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+class TokenCache:
+    """verify(token) -> claims, served from the cache while the token is valid"""
+
+    def __init__(
+        self,
+        verify: Callable[[str], dict],
+        max_entries: int = JWT_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._verify = verify
+        self.clock = clock
+        # Zegar ścienny, bo `exp` jest znacznikiem czasu unixowego
+        self.cache = TTLCache(ttl=0, max_entries=max_entries, clock=clock)
+
+    def verify(self, token: str) -> dict:
+        key = token_key(token)
+        claims = self.cache.get(key)
+        if claims is not None:
+            return claims
+        claims = self._verify(token)
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):
+            ttl = exp - self.clock()
+            if ttl > 0:
+                self.cache.set(key, claims, ttl=ttl)
+        return claims
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats.pop("ttl_seconds")
+        return stats
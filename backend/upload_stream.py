@@ -0,0 +1,276 @@
+"""
+Streaming multipart parsing for the admin image uploads.
+
+The request body is parsed chunk by chunk as it arrives (no FormData
+buffering), and every file part is checked on the fly:
+- the first bytes are sniffed for a JPEG / PNG / WebP / AVIF signature;
+  the declared Content-Type and file extension are not trusted
+- the size limit is enforced while reading; the rest of a rejected part
+  is discarded without being stored
+Accepted files go to a spooled temp file that stays in memory only up to
+UPLOAD_SPOOL_SIZE, so peak memory per request does not depend on the
+number or size of the files.
+"""
+import asyncio
+import os
+import shutil
+from contextlib import contextmanager
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Callable, List, Optional
+
+from image_store import image_hasher
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', str(10 * 1024 * 1024)))
+MAX_UPLOAD_FILES = int(os.environ.get('MAX_UPLOAD_FILES', '50'))
+# Tyle bajtów pliku trzymamy w pamięci, reszta idzie na dysk
+UPLOAD_SPOOL_SIZE = int(os.environ.get('UPLOAD_SPOOL_SIZE', str(256 * 1024)))
+
+ALLOWED_IMAGE_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/avif': 'avif',
+}
+SNIFF_BYTES = 16
+
+
+class UploadError(Exception):
+    """Malformed multipart body"""
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Content type from the file signature; None when it is not an allowed image"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'):
+        return 'image/avif'
+    return None
+
+
+class SpooledUpload:
+    """One uploaded file: sniffed type, size and a spooled copy of the bytes"""
+
+    def __init__(self, field: str, filename: str, max_size: int = MAX_UPLOAD_SIZE, spool_size: int = UPLOAD_SPOOL_SIZE):
+        self.field = field
+        self.filename = filename
+        self.max_size = max_size
+        self.spool_size = spool_size
+        self.size = 0
+        self.content_type: Optional[str] = None
+        self.error: Optional[str] = None
+        self.file = SpooledTemporaryFile(max_size=spool_size)
+        self._head = b''
+        # Skrót treści liczony w locie - nazwa pliku w image_store
+        self._hasher = image_hasher()
+
+    @property
+    def digest(self) -> str:
+        return self._hasher.hexdigest()
+
+    @property
+    def ext(self) -> str:
+        return ALLOWED_IMAGE_TYPES.get(self.content_type, 'bin')
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.content_type is not None
+
+    def reject(self, error: str) -> None:
+        self.error = error
+        self.file.close()
+
+    async def write(self, data: bytes) -> None:
+        if self.error is not None or not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_size:
+            return self.reject(f"Plik za duży (Max {self.max_size // (1024 * 1024)}MB)")
+        if self.content_type is None:
+            self._head += data
+            if len(self._head) < SNIFF_BYTES:
+                return
+            data, self._head = self._head, b''
+            self.content_type = sniff_image_type(data)
+            if self.content_type is None:
+                return self.reject("Niewłaściwy format (Tylko JPG/PNG/WEBP/AVIF)")
+        self._hasher.update(data)
+        if self.size > self.spool_size:
+            # Plik jest już na dysku - zapis w wątku, nie w pętli zdarzeń
+            await asyncio.to_thread(self.file.write, data)
+        else:
+            self.file.write(data)
+
+    async def finish(self) -> None:
+        if self.error is None and self.content_type is None:
+            # Plik krótszy niż SNIFF_BYTES
+            head, self._head = self._head, b''
+            self.content_type = sniff_image_type(head)
+            if self.content_type is None:
+                return self.reject("Niewłaściwy format (Tylko JPG/PNG/WEBP/AVIF)")
+            self._hasher.update(head)
+            self.file.write(head)
+        if self.error is None:
+            self.file.seek(0)
+
+    @contextmanager
+    def payload(self):
+        """Bytes for small files, a read-only file object over the temp file otherwise"""
+        self.file.seek(0)
+        if self.size <= self.spool_size:
+            yield self.file.read()
+            return
+        # storage3 przyjmuje tylko bytes / BufferedReader - otwieramy ten sam plik do odczytu
+        reader = os.fdopen(os.dup(self.file.fileno()), 'rb')
+        try:
+            reader.seek(0)
+            yield reader
+        finally:
+            reader.close()
+
+    def read(self) -> bytes:
+        """Whole file as bytes (for image processing)"""
+        self.file.seek(0)
+        return self.file.read()
+
+    def save(self, path) -> None:
+        """Copy to a local file in chunks"""
+        self.file.seek(0)
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(self.file, f)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class StreamingUploadParser:
+    """multipart/form-data parser that spools file parts as they arrive.
+
+    With `on_file` every file is handed over as soon as its part ends (the
+    callback then owns it and must close it), while later parts are still
+    being received.
+    """
+
+    def __init__(self, content_type: str, max_size: Optional[int] = None, max_files: Optional[int] = None,
+                 spool_size: Optional[int] = None, on_file: Optional[Callable[[SpooledUpload], None]] = None):
+        _, params = parse_options_header(content_type or '')
+        self.boundary = params.get(b'boundary')
+        if not self.boundary:
+            raise UploadError("Missing boundary in multipart.")
+        self.max_size = max_size if max_size is not None else MAX_UPLOAD_SIZE
+        self.max_files = max_files if max_files is not None else MAX_UPLOAD_FILES
+        self.spool_size = spool_size if spool_size is not None else UPLOAD_SPOOL_SIZE
+        self.on_file = on_file
+        self.uploads: List[SpooledUpload] = []
+        self._handed_over = 0
+        self._header_name = b''
+        self._header_value = b''
+        self._disposition = b''
+        self._current: Optional[SpooledUpload] = None
+        self._chunks: List[tuple] = []
+        self._finished: List[SpooledUpload] = []
+
+    def on_part_begin(self) -> None:
+        self._disposition = b''
+        self._current = None
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b'content-disposition':
+            self._disposition = self._header_value
+        self._header_name = b''
+        self._header_value = b''
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        if b'filename' not in options:
+            # Zwykłe pola formularza są ignorowane
+            return
+        if len(self.uploads) >= self.max_files:
+            raise UploadError(f"Too many files. Maximum number of files is {self.max_files}.")
+        self._current = SpooledUpload(
+            options.get(b'name', b'').decode('utf-8', errors='replace'),
+            options[b'filename'].decode('utf-8', errors='replace'),
+            self.max_size,
+            self.spool_size,
+        )
+        self.uploads.append(self._current)
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._current is not None and self._current.error is None:
+            self._chunks.append((self._current, data[start:end]))
+
+    def on_part_end(self) -> None:
+        if self._current is not None:
+            self._finished.append(self._current)
+
+    async def parse(self, stream: AsyncIterator[bytes]) -> List[SpooledUpload]:
+        parser = multipart.MultipartParser(self.boundary, {
+            'on_part_begin': self.on_part_begin,
+            'on_part_data': self.on_part_data,
+            'on_part_end': self.on_part_end,
+            'on_header_field': self.on_header_field,
+            'on_header_value': self.on_header_value,
+            'on_header_end': self.on_header_end,
+            'on_headers_finished': self.on_headers_finished,
+        })
+        try:
+            async for chunk in stream:
+                parser.write(chunk)
+                # Callbacki parsera są synchroniczne - zapis plików odbywa się tutaj
+                for upload, data in self._chunks:
+                    await upload.write(data)
+                for upload in self._finished:
+                    await upload.finish()
+                    if self.on_file is not None:
+                        self._handed_over += 1
+                        self.on_file(upload)
+                self._chunks.clear()
+                self._finished.clear()
+            parser.finalize()
+        except Exception as e:
+            self.close()
+            if isinstance(e, UploadError):
+                raise
+            raise UploadError(str(e)) from e
+        if self.on_file is not None:
+            # Części bez zakończenia (ucięte żądanie) nie trafiły do callbacku
+            self.close()
+        return self.uploads
+
+    def close(self) -> None:
+        """Close the files this parser still owns"""
+        for upload in self.uploads[self._handed_over:]:
+            upload.close()
+
+
+async def parse_uploads(request, **kwargs) -> List[SpooledUpload]:
+    """Parse a multipart request body into spooled uploads (close them when done)"""
+    content_type = request.headers.get('content-type', '')
+    if not content_type.startswith('multipart/form-data'):
+        raise UploadError("Expected multipart/form-data.")
+    return await StreamingUploadParser(content_type, **kwargs).parse(request.stream())
+
+
+def multipart_openapi(field: str, many: bool = False) -> dict:
+    """OpenAPI request body for an endpoint that parses the stream itself"""
+    binary = {'type': 'string', 'format': 'binary'}
+    schema = {'type': 'array', 'items': binary} if many else binary
+    return {'requestBody': {'required': True, 'content': {'multipart/form-data': {'schema': {
+        'type': 'object', 'required': [field], 'properties': {field: schema},
+    }}}}}
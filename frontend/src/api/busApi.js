@@ -76,6 +76,55 @@ export const busApi = {
     return response.data;
   },
 
+  // Upload wielu zdjęć z postępem: procent wysłanych bajtów + zdarzenia NDJSON z serwera
+  uploadImagesBulkWithProgress(files, { onUploadProgress, onEvent } = {}) {
+    return new Promise((resolve, reject) => {
+      const formData = new FormData();
+      Array.from(files).forEach(file => {
+        formData.append('files', file);
+      });
+
+      const xhr = new XMLHttpRequest();
+      xhr.open('POST', `${API_URL}/api/upload-bulk?stream=true`);
+      xhr.withCredentials = true;
+
+      let parsed = 0;
+      let summary = null;
+      const readEvents = () => {
+        const end = xhr.responseText.lastIndexOf('\n') + 1;
+        if (end <= parsed) return;
+        xhr.responseText.slice(parsed, end).split('\n').filter(Boolean).forEach(line => {
+          const event = JSON.parse(line);
+          if (event.event === 'done') summary = event;
+          if (onEvent) onEvent(event);
+        });
+        parsed = end;
+      };
+
+      xhr.upload.onprogress = (e) => {
+        if (onUploadProgress && e.lengthComputable) onUploadProgress(Math.round((e.loaded / e.total) * 100));
+      };
+      xhr.onprogress = () => {
+        if (xhr.status === 200) readEvents();
+      };
+      xhr.onload = () => {
+        if (xhr.status === 401 && !window.location.pathname.includes('/login')) {
+          window.location.href = '/login';
+        }
+        if (xhr.status !== 200) {
+          let detail = null;
+          try { detail = JSON.parse(xhr.responseText).detail; } catch (e) { /* brak JSON */ }
+          reject(new Error(typeof detail === 'string' ? detail : `Błąd uploadu (${xhr.status})`));
+          return;
+        }
+        readEvents();
+        resolve(summary || { success: false, urls: [], errors: ['Przerwana odpowiedź serwera'] });
+      };
+      xhr.onerror = () => reject(new Error('Błąd połączenia podczas uploadu'));
+      xhr.send(formData);
+    });
+  },
+
   // Get stats
   async getStats() {
     const response = await axios.get(`${API_URL}/api/admin/stats`);
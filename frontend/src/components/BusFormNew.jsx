@@ -68,6 +68,7 @@ const BusFormNew = ({ editData, onSuccess, onCancel }) => {
 
   // Additional fields
   const [zdjecia, setZdjecia] = useState([]);
+  const [zdjeciaWarianty, setZdjeciaWarianty] = useState({});
   const [zdjecieGlowne, setZdjecieGlowne] = useState('');
   const [wyrozniowane, setWyrozniowane] = useState(false);
   const [nowosc, setNowosc] = useState(false);
@@ -75,6 +76,7 @@ const BusFormNew = ({ editData, onSuccess, onCancel }) => {
   const [gwarancja, setGwarancja] = useState(false);
   const [sold, setSold] = useState(false);
   const [uploadingImage, setUploadingImage] = useState(false);
+  const [uploadProgress, setUploadProgress] = useState(null);
 
   // Auto-generate title when make/model change
   useEffect(() => {
@@ -126,6 +128,7 @@ const BusFormNew = ({ editData, onSuccess, onCancel }) => {
       setLocationRegion(editData.location_region || 'Świętokrzyskie');
       
       setZdjecia(editData.zdjecia || []);
+      setZdjeciaWarianty(editData.zdjeciaWarianty || {});
       setZdjecieGlowne(editData.zdjecieGlowne || '');
       setWyrozniowane(editData.wyrozniowane || false);
       setNowosc(editData.nowosc || false);
@@ -212,8 +215,16 @@ const BusFormNew = ({ editData, onSuccess, onCancel }) => {
     if (!files || files.length === 0) return;
 
     setUploadingImage(true);
+    setUploadProgress({ sent: 0, done: 0, total: files.length });
     try {
-      const result = await busApi.uploadImagesBulk(files);
+      const result = await busApi.uploadImagesBulkWithProgress(files, {
+        onUploadProgress: (sent) => setUploadProgress(prev => ({ ...prev, sent })),
+        onEvent: (event) => {
+          if (event.event === 'stored' || event.event === 'failed') {
+            setUploadProgress(prev => ({ ...prev, done: prev.done + 1 }));
+          }
+        },
+      });
       
       if (result.urls && result.urls.length > 0) {
         setZdjecia(prev => {
@@ -223,6 +234,7 @@ const BusFormNew = ({ editData, onSuccess, onCancel }) => {
           }
           return newImages;
         });
+        setZdjeciaWarianty(prev => ({ ...prev, ...(result.variants || {}) }));
         toast.success(`Dodano ${result.urls.length} zdjęć.`);
       }
       
@@ -247,6 +259,7 @@ const BusFormNew = ({ editData, onSuccess, onCancel }) => {
       }
     } finally {
       setUploadingImage(false);
+      setUploadProgress(null);
       e.target.value = ''; 
     }
   };
@@ -358,6 +371,7 @@ const BusFormNew = ({ editData, onSuccess, onCancel }) => {
         // Additional
         zdjecia,
         zdjecieGlowne,
+        zdjeciaWarianty,
         wyrozniowane,
         nowosc,
         flotowy,
@@ -987,7 +1001,13 @@ const BusFormNew = ({ editData, onSuccess, onCancel }) => {
               disabled={uploadingImage}
               className="mb-2"
             />
-            {uploadingImage && <p className="text-blue-600">Przesyłanie...</p>}
+            {uploadingImage && (
+              <p className="text-blue-600">
+                {uploadProgress && uploadProgress.sent < 100
+                  ? `Przesyłanie... ${uploadProgress.sent}%`
+                  : `Zapisywanie zdjęć ${uploadProgress ? uploadProgress.done : 0}/${uploadProgress ? uploadProgress.total : 0}...`}
+              </p>
+            )}
             
             <div className="grid grid-cols-3 md:grid-cols-5 gap-2 mt-2">
               {zdjecia.map((img, idx) => (
@@ -4,6 +4,16 @@ import { Badge } from './ui/badge';
 import { Button } from './ui/button';
 import { Heart, MapPin, Fuel, Calendar, Gauge, Truck, Weight, Package } from 'lucide-react';
 
+// Szerokość karty w siatce (1 / 2 / 3 kolumny)
+const CARD_IMAGE_SIZES = '(min-width: 1024px) 33vw, (min-width: 640px) 50vw, 100vw';
+
+// "url 320w, url 640w, ..." z wariantów zdjęcia (zdjecieGlowneWarianty)
+const variantSrcSet = (variants, format) =>
+  Object.values(variants || {})
+    .filter(v => v[format])
+    .map(v => `${v[format]} ${v.width}w`)
+    .join(', ');
+
 export const BusCard = ({ bus, onCardClick, onSaveToggle, isSaved = false }) => {
   const handleSaveClick = (e) => {
     e.stopPropagation();
@@ -18,6 +28,9 @@ export const BusCard = ({ bus, onCardClick, onSaveToggle, isSaved = false }) =>
     return new Intl.NumberFormat('pl-PL').format(przebieg) + ' km';
   };
 
+  // Główne zdjęcie: zdjecieGlowne, a bez niego pierwsze z galerii (ta sama reguła co main_photo w API)
+  const mainPhoto = bus.zdjecieGlowne || (bus.zdjecia && bus.zdjecia[0]);
+
   return (
     <Card 
       className="group cursor-pointer transition-all duration-200 hover:shadow-lg hover:-translate-y-1 bg-white border border-gray-200"
@@ -25,13 +38,22 @@ export const BusCard = ({ bus, onCardClick, onSaveToggle, isSaved = false }) =>
     >
       <div className="relative">
         <div className="aspect-[4/3] overflow-hidden rounded-t-lg relative bg-gray-200">
-          {(bus.zdjecia && bus.zdjecia.length > 0) || bus.zdjecieGlowne ? (
-            <img
-              src={bus.zdjecia && bus.zdjecia.length > 0 ? bus.zdjecia[0] : bus.zdjecieGlowne}
-              alt={`${bus.marka} ${bus.model} ${bus.typNadwozia}`}
-              className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-200"
-              loading="lazy"
-            />
+          {mainPhoto ? (
+            <picture>
+              {['avif', 'webp'].map(format => {
+                const srcSet = variantSrcSet(bus.zdjecieGlowneWarianty, format);
+                return srcSet ? (
+                  <source key={format} type={`image/${format}`} srcSet={srcSet} sizes={CARD_IMAGE_SIZES} />
+                ) : null;
+              })}
+              <img
+                src={mainPhoto}
+                alt={`${bus.marka} ${bus.model} ${bus.typNadwozia}`}
+                className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-200"
+                loading="lazy"
+                decoding="async"
+              />
+            </picture>
           ) : (
             <div className="w-full h-full flex items-center justify-center text-gray-400">
               <span className="text-6xl">🚐</span>
@@ -71,7 +93,7 @@ export const BusCard = ({ bus, onCardClick, onSaveToggle, isSaved = false }) =>
         
         {/* Badges */}
         <div className="absolute top-3 left-3 flex flex-wrap gap-1">
-          {bus.wyroznialone && (
+          {bus.wyrozniowane && (
             <Badge className="bg-[#F3BC30] text-[#222122] hover:bg-[#E0AA2B] font-medium text-xs">
               Wyróżnione
             </Badge>